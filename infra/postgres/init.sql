@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS workflows (
   confidence_score NUMERIC NULL,
   decision TEXT NULL,
   reviewer TEXT NULL,
+  correlation_id UUID NULL,
   created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
   updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
@@ -30,8 +31,17 @@ CREATE TABLE IF NOT EXISTS audit_logs (
   created_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 
+CREATE TABLE IF NOT EXISTS agent_checkpoints (
+  workflow_id UUID PRIMARY KEY,
+  completed JSONB NOT NULL,
+  state JSONB NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
 CREATE INDEX IF NOT EXISTS idx_audit_ref ON audit_logs(ref_id);
 CREATE INDEX IF NOT EXISTS idx_audit_kind ON audit_logs(kind);
 CREATE INDEX IF NOT EXISTS idx_audit_correlation ON audit_logs(correlation_id);
 CREATE INDEX IF NOT EXISTS idx_workflows_status ON workflows(status);
 CREATE INDEX IF NOT EXISTS idx_workflows_decision ON workflows(decision);
+-- One order per workflow: oms.place_order uses workflow_id as its idempotency key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_workflow ON orders(workflow_id);
@@ -11,6 +11,7 @@ TOPICS = [
     "workflow.approved",
     "orders.filled",
     "audit.logged",
+    "events.dlq",
 ]
 
 async def main():
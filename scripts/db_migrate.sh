@@ -5,5 +5,7 @@ docker compose exec -T postgres sh -lc 'psql -U "$POSTGRES_USER" -d "$POSTGRES_D
 ALTER TABLE workflows ADD COLUMN IF NOT EXISTS confidence_score numeric;
 ALTER TABLE workflows ADD COLUMN IF NOT EXISTS decision text;
 ALTER TABLE workflows ADD COLUMN IF NOT EXISTS reviewer text;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS correlation_id uuid;
+CREATE TABLE IF NOT EXISTS agent_checkpoints (workflow_id uuid PRIMARY KEY, completed jsonb NOT NULL, state jsonb NOT NULL, updated_at timestamptz NOT NULL DEFAULT now());
 "'
 echo "DB migration OK"
@@ -0,0 +1,18 @@
+"""End-to-end load generator for workflow-api, agent-controller, market-data
+and the MCP server.
+
+The services run in this process (ASGI, no sockets) on stand-ins for
+Postgres, Kafka and the RAG API (see standins), with the Kafka workers
+consuming what the scenarios publish, so the whole pipeline can be measured
+on one box without containers. A service given with ``--url`` is driven over
+HTTP instead.
+
+Usage:
+    python -m scripts.loadgen [--scenarios workflow=3,agent,market,mcp]
+        [--concurrency 16 | --rate 200 [--poisson]] [--duration 10] [--warmup 2]
+        [--db-latency-ms 0.5] [--kafka-latency-ms 0.5] [--rag-latency-ms 5]
+        [--out report.json] [--baseline previous.json --tolerance 0.2]
+
+Client and services share one event loop and CPU: compare reports taken on
+the same machine with the same options, not absolute numbers across hosts.
+"""
@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import logging
+import platform
+import random
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from unittest.mock import patch
+
+from services.common import otel
+from services.common.config import settings
+
+from . import report as reports
+from .runner import Recorder, Runner, Session, SpanRecorder, parse_weights, summarize
+from .scenarios import SCENARIOS, service_stack
+from .standins import LocalKafka, LocalPostgres, installed
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+async def _drain(broker: LocalKafka, timeout: float = 5.0) -> None:
+    """Let the workers finish the events published by the last scenarios."""
+    deadline = time.perf_counter() + timeout
+    while broker.pending() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    weights = parse_weights(args.scenarios, list(SCENARIOS))
+    pg = LocalPostgres(rtt_ms=args.db_latency_ms, connect_ms=args.db_connect_ms)
+    broker = LocalKafka(latency_ms=args.kafka_latency_ms)
+    stages = SpanRecorder()
+    steps, results = Recorder(), Recorder()
+    urls = dict(u.split("=", 1) for u in args.url)
+
+    with ExitStack() as stack:
+        stack.enter_context(installed(pg, broker))
+        if args.stages:  # every span, whatever TRACE_SAMPLE_RATIO says
+            stack.enter_context(patch.object(otel, "_exporter", stages))
+            stack.enter_context(patch.object(settings, "TRACE_SAMPLE_RATIO", 1.0))
+        async with service_stack(broker, urls, args.rag_latency_ms, workers=args.workers) as clients:
+            session = Session(clients, steps, random.Random(args.seed))
+            runner = Runner(SCENARIOS, weights, session, results)
+
+            async def phase(seconds: float, iterations: int = 0) -> None:
+                if args.rate:
+                    await runner.open_loop(args.rate, seconds, iterations, args.max_in_flight,
+                                           args.poisson)
+                else:
+                    await runner.closed_loop(args.concurrency, seconds, iterations, args.think_ms)
+                await _drain(broker)
+
+            if args.warmup > 0:
+                await phase(args.warmup)
+                for recorder in (stages, steps, results):
+                    recorder.reset()
+                broker.lag_ms.clear()
+                runner.dropped = 0
+            start = time.perf_counter()
+            await phase(args.duration, args.requests)
+            elapsed = time.perf_counter() - start
+
+    return {
+        "meta": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "poisson": args.poisson,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "warmup_s": args.warmup,
+            "scenarios": weights,
+            "seed": args.seed,
+            "live_services": urls,
+            "stand_ins": {
+                "db_latency_ms": args.db_latency_ms,
+                "db_connect_ms": args.db_connect_ms,
+                "kafka_latency_ms": args.kafka_latency_ms,
+                "rag_latency_ms": args.rag_latency_ms,
+            },
+        },
+        "scenarios": results.summary(elapsed),
+        "steps": steps.summary(elapsed),
+        "stages": stages.summary(elapsed),
+        "stand_ins": {
+            "postgres": pg.stats(),
+            "kafka": {
+                **broker.stats(),
+                "delivery_lag_ms": {
+                    topic: summarize(lags, elapsed)["latency_ms"]
+                    for topic, lags in sorted(broker.lag_ms.items())
+                },
+            },
+        },
+        "dropped": runner.dropped,
+        "failures": runner.failures,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m scripts.loadgen",
+                                description="End-to-end load generator (in-process stand-ins)")
+    p.add_argument("--scenarios", default="workflow,agent,market,mcp",
+                   help="comma-separated scenario[=weight] (%s)" % ", ".join(SCENARIOS))
+    load = p.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=8, help="closed loop: virtual users")
+    load.add_argument("--rate", type=float, default=0.0, help="open loop: scenarios per second")
+    p.add_argument("--poisson", action="store_true", help="open loop: exponential inter-arrivals")
+    p.add_argument("--max-in-flight", type=int, default=1000, help="open loop: drop beyond this")
+    p.add_argument("--think-ms", type=float, default=0.0, help="closed loop: pause between scenarios")
+    p.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    p.add_argument("--requests", type=int, default=0, help="stop after N scenarios (0: duration only)")
+    p.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--db-latency-ms", type=float, default=0.5, help="Postgres round trip")
+    p.add_argument("--db-connect-ms", type=float, default=2.0, help="new Postgres connection")
+    p.add_argument("--kafka-latency-ms", type=float, default=0.5, help="Kafka send_and_wait")
+    p.add_argument("--rag-latency-ms", type=float, default=5.0, help="RAG /query")
+    p.add_argument("--url", action="append", default=[], metavar="SERVICE=URL",
+                   help="drive a live service instead of the in-process app")
+    p.add_argument("--no-workers", dest="workers", action="store_false",
+                   help="do not run the Kafka workers")
+    p.add_argument("--no-stages", dest="stages", action="store_false",
+                   help="no span breakdown (removes the tracing overhead)")
+    p.add_argument("--out", help="write the JSON report here")
+    p.add_argument("--baseline", help="JSON report to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2,
+                   help="allowed relative regression vs the baseline")
+    p.add_argument("--verbose", action="store_true", help="keep the services' INFO logs")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    report = asyncio.run(run(args))
+    reports.print_report(report)
+    if args.out:
+        reports.save(report, args.out)
+        print(f"\nreport written to {args.out}")
+    if args.baseline:
+        baseline = reports.load(args.baseline)
+        for change in reports.config_changes(report, baseline):
+            print(f"warning: run options differ from the baseline, {change}")
+        regressions = reports.compare(report, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) vs {args.baseline} "
+              f"(tolerance {args.tolerance:.0%})")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
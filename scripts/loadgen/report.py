@@ -0,0 +1,85 @@
+"""Report printing and baseline comparison.
+
+A report is JSON: ``meta`` (run configuration), ``scenarios`` (whole
+journeys), ``steps`` (each HTTP request of a journey), ``stages`` (spans:
+server, client, db, kafka, agent node and MCP tool timings) and
+``stand_ins`` (round trips, statements, messages, delivery lag). Every entry
+of the three latency sections has count, errors, throughput_rps and
+latency_ms {mean, p50, p90, p99, max}.
+"""
+
+import json
+from typing import Any, Dict, List
+
+SECTIONS = ("scenarios", "steps", "stages")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    load = (f"rate={meta['rate']}/s" if meta["mode"] == "open"
+            else f"concurrency={meta['concurrency']}")
+    print(f"=== loadgen {meta['mode']} loop, {load}, {meta['duration_s']} s ===")
+    for section in SECTIONS:
+        if not report[section]:
+            continue
+        print(f"\n{section:42s} {'count':>7s} {'err':>5s} {'rps':>9s} "
+              f"{'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+        for name, s in report[section].items():
+            lat = s["latency_ms"]
+            print(f"{name[:42]:42s} {s['count']:7d} {s['errors']:5d} {s['throughput_rps']:9.1f} "
+                  f"{lat['p50']:9.2f} {lat['p90']:9.2f} {lat['p99']:9.2f} {lat['max']:9.2f}")
+    if report.get("dropped"):
+        print(f"\ndropped arrivals (max in flight reached): {report['dropped']}")
+    for name, failure in report.get("failures", {}).items():
+        print(f"first failure in {name}: {failure}")
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2
+) -> List[str]:
+    """Regressions of ``report`` against ``baseline``, one line each.
+
+    A scenario or step regresses when its p50 or p99 latency grew, or its
+    throughput fell, by more than ``tolerance`` (a fraction), or when it
+    errors while the baseline did not. Stages are informational only.
+    """
+    regressions = []
+    for section in ("scenarios", "steps"):
+        for name, old in baseline.get(section, {}).items():
+            new = report[section].get(name)
+            if new is None or not old["count"]:
+                continue
+            for q in ("p50", "p99"):
+                before, after = old["latency_ms"][q], new["latency_ms"][q]
+                if before > 0 and after > before * (1 + tolerance):
+                    regressions.append(
+                        f"{section}/{name} {q} {before:.2f} -> {after:.2f} ms "
+                        f"(+{(after / before - 1) * 100:.0f}%)"
+                    )
+            before, after = old["throughput_rps"], new["throughput_rps"]
+            if before > 0 and after < before * (1 - tolerance):
+                regressions.append(
+                    f"{section}/{name} throughput {before:.1f} -> {after:.1f} rps "
+                    f"({(after / before - 1) * 100:.0f}%)"
+                )
+            if new["errors"] and not old["errors"]:
+                regressions.append(f"{section}/{name} errors 0 -> {new['errors']}")
+    return regressions
+
+
+def config_changes(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Run options that differ from the baseline's (the numbers are then not comparable)."""
+    keys = ("mode", "rate", "poisson", "concurrency", "scenarios", "stand_ins", "live_services")
+    old, new = baseline.get("meta", {}), report["meta"]
+    return [f"{k}: {old.get(k)} -> {new.get(k)}" for k in keys if old.get(k) != new.get(k)]
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(report: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,179 @@
+"""Load models and latency bookkeeping.
+
+Closed loop: ``concurrency`` virtual users each run one scenario after the
+other (plus ``think_ms``), so throughput adapts to latency. Open loop:
+scenarios start at ``rate`` per second whatever the latency, and a
+scenario's latency is measured from its scheduled start, so a stalled system
+shows up as queueing delay instead of silently lowering the offered load
+(coordinated omission). Arrivals beyond ``max_in_flight`` are dropped and
+counted.
+"""
+
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+Scenario = Callable[["Session"], Awaitable[None]]
+
+
+def summarize(values: List[float], seconds: float, errors: int = 0) -> Dict[str, Any]:
+    """count, errors, throughput and latency percentiles (ms) of ``values``."""
+    values = sorted(values)
+    n = len(values)
+
+    def pct(q: float) -> float:
+        return round(values[min(n - 1, int(q * n))], 3) if n else 0.0
+
+    return {
+        "count": n,
+        "errors": errors,
+        "throughput_rps": round(n / seconds, 2) if seconds > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(values) / n, 3) if n else 0.0,
+            "p50": pct(0.50),
+            "p90": pct(0.90),
+            "p99": pct(0.99),
+            "max": round(values[-1], 3) if n else 0.0,
+        },
+    }
+
+
+class Recorder:
+    """Latencies (ms) and error counts per name."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def add(self, name: str, ms: float, error: bool = False) -> None:
+        self.latencies[name].append(ms)
+        if error:
+            self.errors[name] += 1
+
+    def summary(self, seconds: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        seconds = seconds if seconds is not None else time.perf_counter() - self.started
+        return {
+            name: summarize(values, seconds, self.errors.get(name, 0))
+            for name, values in sorted(self.latencies.items())
+        }
+
+
+class SpanRecorder(Recorder):
+    """Tracing exporter (see services.common.otel) recording span durations:
+    the per-stage breakdown (db.*, kafka.*, agent.node *, mcp.tool *, ...)."""
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self.add(span["name"], span["durationMs"], span["status"]["code"] == "ERROR")
+
+    def flush(self) -> None:
+        pass
+
+
+class Session:
+    """What a scenario sees: HTTP clients per service and a timed ``call``."""
+
+    def __init__(self, clients: Dict[str, Any], steps: Recorder, rng: random.Random):
+        self.clients = clients
+        self.steps = steps
+        self.rng = rng
+
+    async def call(self, step: str, service: str, method: str, path: str, **kwargs: Any) -> Any:
+        """Send a request, record its latency under ``step``; raise on HTTP errors."""
+        start = time.perf_counter()
+        error = True
+        try:
+            resp = await self.clients[service].request(method, path, **kwargs)
+            resp.raise_for_status()
+            error = False
+            return resp.json()
+        finally:
+            self.steps.add(step, (time.perf_counter() - start) * 1000, error)
+
+
+class Runner:
+    def __init__(
+        self,
+        scenarios: Dict[str, Scenario],
+        weights: Dict[str, float],
+        session: Session,
+        results: Recorder,
+    ):
+        self.scenarios = scenarios
+        self.names = list(weights)
+        self.weights = [weights[n] for n in self.names]
+        self.session = session
+        self.results = results
+        self.dropped = 0
+        self.failures: Dict[str, str] = {}
+
+    def _pick(self) -> str:
+        return self.session.rng.choices(self.names, self.weights)[0]
+
+    async def _one(self, name: str, scheduled: float) -> None:
+        error = False
+        try:
+            await self.scenarios[name](self.session)
+        except Exception as e:
+            error = True
+            self.failures.setdefault(name, repr(e))  # first failure, for the report
+        self.results.add(name, (time.perf_counter() - scheduled) * 1000, error)
+
+    async def closed_loop(
+        self, concurrency: int, seconds: float, max_iterations: int = 0, think_ms: float = 0.0
+    ) -> None:
+        deadline = time.perf_counter() + seconds
+        budget = [max_iterations or float("inf")]
+
+        async def user() -> None:
+            while time.perf_counter() < deadline and budget[0] > 0:
+                budget[0] -= 1
+                await self._one(self._pick(), time.perf_counter())
+                if think_ms:
+                    await asyncio.sleep(think_ms / 1000.0)
+
+        await asyncio.gather(*(user() for _ in range(max(1, concurrency))))
+
+    async def open_loop(
+        self,
+        rate: float,
+        seconds: float,
+        max_iterations: int = 0,
+        max_in_flight: int = 1000,
+        poisson: bool = False,
+    ) -> None:
+        start = time.perf_counter()
+        in_flight: set = set()
+        scheduled, i = start, 0
+        while scheduled - start < seconds and (not max_iterations or i < max_iterations):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self._one(self._pick(), scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            i += 1
+            scheduled += self.session.rng.expovariate(rate) if poisson else 1.0 / rate
+        if in_flight:
+            await asyncio.wait(list(in_flight))
+
+
+def parse_weights(spec: str, known: Sequence[str]) -> Dict[str, float]:
+    """``"workflow=3,agent"`` -> ``{"workflow": 3.0, "agent": 1.0}``."""
+    weights: Dict[str, float] = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in known:
+            raise ValueError(f"unknown scenario {name!r} (known: {', '.join(known)})")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("no scenario selected")
+    return weights
@@ -0,0 +1,143 @@
+"""Scenarios and the in-process service stack they run against.
+
+Each scenario is one user journey; every request in it is a timed step:
+
+  workflow  POST /trade-requests → POST …/approve → GET …  (workflow-api)
+  agent     POST /agent/trade  (agent-controller → rag stand-in + mcp-server)
+  market    POST /publish/{symbol} → GET /prices/{symbol}  (market-data)
+  mcp       POST /call risk.check_trade, POST /call/batch of reads  (mcp-server)
+
+The Kafka workers downstream of these topics (signal-engine, risk-engine,
+paper-oms) consume from the local broker, so published events are processed
+too and their stages show up in the report.
+"""
+
+import asyncio
+import importlib
+from contextlib import ExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from unittest.mock import patch
+
+import httpx
+
+from services.common.http import ServiceClient
+from services.common.kafka import consume_forever
+
+from .runner import Scenario, Session
+from .standins import LocalKafka, rag_app
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "TSLA", "GOOGL", "META", "JPM"]
+
+APPS = {
+    "workflow-api": "services.workflow_api.main",
+    "agent-controller": "services.agent_controller.main",
+    "market-data": "services.market_data.main",
+    "mcp-server": "services.mcp_server.main",
+}
+WORKERS = {
+    "signal-engine": ("services.signal_engine.worker", ["market.prices"]),
+    "risk-engine": ("services.risk_engine.worker", ["signals.generated"]),
+    "paper-oms": ("services.paper_oms.worker", ["workflow.approved"]),
+}
+
+
+def _trade(s: Session) -> Dict[str, Any]:
+    return {
+        "symbol": s.rng.choice(SYMBOLS),
+        "side": s.rng.choice(("BUY", "SELL")),
+        "qty": s.rng.choice((10, 100, 250, 1000, 5000)),
+        "reason": "load test order",
+    }
+
+
+async def workflow(s: Session) -> None:
+    created = await s.call("workflow.create", "workflow-api", "POST", "/trade-requests",
+                           json=_trade(s))
+    path = f"/trade-requests/{created['workflow_id']}"
+    await s.call("workflow.approve", "workflow-api", "POST", f"{path}/approve",
+                 json={"approver": "loadgen"})
+    await s.call("workflow.get", "workflow-api", "GET", path)
+
+
+async def agent(s: Session) -> None:
+    await s.call("agent.trade", "agent-controller", "POST", "/agent/trade", json=_trade(s))
+
+
+async def market(s: Session) -> None:
+    symbol = s.rng.choice(SYMBOLS)
+    await s.call("market.publish", "market-data", "POST", f"/publish/{symbol}")
+    await s.call("market.price", "market-data", "GET", f"/prices/{symbol}")
+
+
+async def mcp(s: Session) -> None:
+    trade = _trade(s)
+    del trade["reason"]
+    await s.call("mcp.call risk.check_trade", "mcp-server", "POST", "/call",
+                 json={"tool": "risk.check_trade", "arguments": trade})
+    await s.call("mcp.batch reads", "mcp-server", "POST", "/call/batch", json={"calls": [
+        {"tool": "market.get_last_price", "arguments": {"symbol": trade["symbol"]}},
+        {"tool": "db.list_audit", "arguments": {"limit": 20}},
+    ]})
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "workflow": workflow,
+    "agent": agent,
+    "market": market,
+    "mcp": mcp,
+}
+
+
+def _transport(name: str, urls: Dict[str, str], app) -> Dict[str, Any]:
+    if name in urls:
+        return {"base_url": urls[name]}
+    return {"base_url": f"http://{name}", "transport": httpx.ASGITransport(app=app)}
+
+
+@asynccontextmanager
+async def service_stack(
+    broker: LocalKafka,
+    urls: Optional[Dict[str, str]] = None,
+    rag_latency_ms: float = 5.0,
+    workers: bool = True,
+) -> AsyncIterator[Dict[str, httpx.AsyncClient]]:
+    """HTTP clients per service, in-process unless ``urls`` names a live one.
+
+    The agent controller's RAG and MCP clients are pointed at the stand-in
+    RAG app and the in-process MCP server for the duration; in-process apps
+    get their startup and shutdown handlers run.
+    """
+    urls = urls or {}
+    apps = {name: importlib.import_module(module).app for name, module in APPS.items()}
+    apps["rag-api"] = rag_app(rag_latency_ms)
+    graph = importlib.import_module("services.agent_controller.graph")
+    clients: Dict[str, httpx.AsyncClient] = {}
+    tasks: List[asyncio.Task] = []
+    with ExitStack() as stack:
+        for attr, name in (("rag_client", "rag-api"), ("mcp_client", "mcp-server")):
+            stack.enter_context(patch.object(
+                graph, attr, ServiceClient(name, **_transport(name, urls, apps[name]))
+            ))
+        if workers:
+            for group, (module, topics) in WORKERS.items():
+                handler = importlib.import_module(module).handler
+                tasks.append(asyncio.create_task(
+                    consume_forever(broker.consumer(topics, group), handler)
+                ))
+        local = [name for name in APPS if name not in urls]
+        for name in APPS:
+            clients[name] = httpx.AsyncClient(timeout=30.0, **_transport(name, urls, apps[name]))
+        for name in local:  # ASGITransport sends no lifespan events
+            await apps[name].router.startup()
+        try:
+            yield clients
+        finally:
+            for client in clients.values():
+                await client.aclose()
+            for name in local:  # flushes MCP audit rows, stops loop monitors
+                await apps[name].router.shutdown()
+            await graph.rag_client.aclose()
+            await graph.mcp_client.aclose()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,316 @@
+"""In-process stand-ins for Postgres, Kafka and the RAG API.
+
+They replace the I/O under the services, not the services: `LocalPostgres`
+sits under ``services.common.db`` (its connection/cursor helpers), so every
+query still goes through fetchone / execute_values / execute_transaction /
+the pool and its spans; `LocalKafka` replaces the producer and consumers of
+``services.common.kafka``, so publish() and consume_forever() still validate,
+encode, trace and decode every event. Latencies are simulated per round
+trip (``time.sleep`` for the blocking database, ``asyncio.sleep`` for Kafka)
+so batching and blocking calls show up the way they would against the real
+systems.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from services.common import db, kafka
+
+# Columns Postgres returns as jsonb (decoded), not text
+JSON_COLUMNS = frozenset({"payload", "data", "state", "completed"})
+TABLE_KEYS = {"audit_logs": "audit_id"}
+
+_INSERT = re.compile(r"INSERT INTO (\w+)\s*\(([^)]*)\)\s*VALUES", re.I)
+_UPDATE = re.compile(r"UPDATE (\w+)(?: AS \w+)? SET (.*?)(?: FROM \(VALUES .*?\) AS \w+\(([^)]*)\))? WHERE", re.I)
+_SELECT = re.compile(r"SELECT (.*?) FROM (\w+)(?: WHERE (\w+)\s*=\s*%s)?", re.I)
+_DELETE = re.compile(r"DELETE FROM (\w+) WHERE (\w+)\s*=\s*%s", re.I)
+_TOKEN = re.compile(rb"\x1f(\d+)\x1f")
+
+
+def _columns(text: str) -> List[str]:
+    return [c.strip() for c in text.split(",")]
+
+
+class LocalPostgres:
+    """Dict-backed tables understanding the statements the services send.
+
+    Rows are keyed by their first column (``workflow_id``, ``order_id``...);
+    ``audit_logs`` gets a serial ``audit_id``. Unknown statements are counted
+    and ignored. ``rtt_ms`` is paid per round trip, ``connect_ms`` per new
+    (non-pooled) connection.
+    """
+
+    def __init__(self, rtt_ms: float = 0.5, connect_ms: float = 2.0):
+        self.rtt = rtt_ms / 1000.0
+        self.connect_cost = connect_ms / 1000.0
+        self.tables: Dict[str, Dict[Any, Dict[str, Any]]] = defaultdict(dict)
+        self.round_trips = 0
+        self.connections = 0
+        self.statements: Counter = Counter()
+        self._serial = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # ── statements ──
+    def run(self, sql: str, params: Sequence[Any] = (), rows: Optional[List[Sequence[Any]]] = None):
+        """Apply one statement; ``rows`` are the VALUES of an execute_values()."""
+        sql = " ".join(sql.split())
+        verb = sql.split(" ", 1)[0].upper()
+        with self._lock:
+            self.statements[verb] += 1
+            if verb == "INSERT":
+                return self._insert(sql, rows if rows is not None else [params])
+            if verb == "UPDATE":
+                return self._update(sql, params, rows)
+            if verb == "SELECT":
+                return self._select(sql, params)
+            if verb == "DELETE":
+                m = _DELETE.match(sql)
+                if m:
+                    self.tables[m.group(1)].pop(str(params[0]), None)
+            return []
+
+    def _insert(self, sql, rows):
+        m = _INSERT.match(sql)
+        if m is None:
+            return []
+        table, cols = m.group(1), _columns(m.group(2))
+        now = datetime.now(timezone.utc)
+        for values in rows:
+            row = {"created_at": now, "updated_at": now}
+            for col, value in zip(cols, values):
+                row[col] = json.loads(value) if col in JSON_COLUMNS and isinstance(value, str) else value
+            key_col = TABLE_KEYS.get(table)
+            if key_col is not None:
+                row[key_col] = next(self._serial)
+            key = row[key_col or cols[0]]
+            self.tables[table][key if key_col else str(key)] = row
+        return []
+
+    def _update(self, sql, params, rows):
+        m = _UPDATE.match(sql)
+        if m is None:
+            return []
+        table, assignments, value_cols = m.group(1), m.group(2), m.group(3)
+        now = datetime.now(timezone.utc)
+        if value_cols:  # UPDATE ... FROM (VALUES ...) AS v(key, cols...)
+            cols = _columns(value_cols)
+            flat = list(params)
+            for i in range(0, len(flat), len(cols)):
+                values = dict(zip(cols, flat[i:i + len(cols)]))
+                row = self.tables[table].get(str(values.pop(cols[0])))
+                if row is not None:
+                    row.update(values, updated_at=now)
+            return []
+        cols = [a.split("=")[0].strip() for a in assignments.split(",") if "%s" in a]
+        row = self.tables[table].get(str(params[-1]))
+        if row is not None:
+            row.update(zip(cols, params), updated_at=now)
+        return []
+
+    def _select(self, sql, params):
+        m = _SELECT.match(sql)
+        if m is None:
+            return []
+        cols, table, where = _columns(m.group(1)), m.group(2), m.group(3)
+        if where:
+            row = self.tables[table].get(str(params[0]))
+            found = [row] if row is not None else []
+        else:  # ORDER BY <serial> DESC LIMIT %s
+            found = list(self.tables[table].values())[::-1][: int(params[-1]) if params else None]
+        return [{c: r.get(c) for c in cols} for r in found]
+
+    # ── psycopg2 surface ──
+    @contextmanager
+    def conn_cursor(self, dict_cursor: bool = True):
+        with self._lock:
+            self.connections += 1
+        time.sleep(self.connect_cost)
+        yield SimpleNamespace(encoding="UTF8"), _Cursor(self)
+
+    @contextmanager
+    def pooled_cursor(self, dict_cursor: bool = True):
+        with db._pool_slots:  # same wait-for-a-slot behaviour as the real pool
+            yield SimpleNamespace(encoding="UTF8"), _Cursor(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "round_trips": self.round_trips,
+            "connections": self.connections,
+            "statements": dict(self.statements),
+            "rows": {t: len(rows) for t, rows in self.tables.items()},
+        }
+
+
+class _Cursor:
+    """psycopg2 cursor look-alike: mogrify() returns a token the next
+    execute() resolves, so execute_values / execute_transaction work."""
+
+    def __init__(self, store: LocalPostgres):
+        self.store = store
+        self.connection = SimpleNamespace(encoding="UTF8")
+        self._mogrified: List[Tuple[Any, Sequence[Any]]] = []
+        self._result: List[Dict[str, Any]] = []
+
+    def mogrify(self, sql, params=None):
+        self._mogrified.append((sql, tuple(params or ())))
+        return b"\x1f%d\x1f" % (len(self._mogrified) - 1)
+
+    def execute(self, sql, params=None):
+        with self.store._lock:
+            self.store.round_trips += 1
+        time.sleep(self.store.rtt)
+        if isinstance(sql, str):
+            self._result = self.store.run(sql, params or ())
+            return
+        for part in sql.split(b";"):
+            tokens = [self._mogrified[int(i)] for i in _TOKEN.findall(part)]
+            text = _TOKEN.sub(b"", part).decode("utf-8")
+            if text.strip() == "" and len(tokens) == 1:  # execute_transaction statement
+                stmt, stmt_params = tokens[0]
+                self._result = self.store.run(_text(stmt), stmt_params)
+            elif tokens:  # execute_values page: one token per row
+                self._result = self.store.run(text.rstrip(", "), rows=[p for _, p in tokens])
+        self._mogrified = []
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _text(sql) -> str:
+    return sql.decode("utf-8") if isinstance(sql, bytes) else sql
+
+
+class LocalKafka:
+    """Topics fanned out to the consumer groups subscribed to them.
+
+    ``latency_ms`` is paid by every send_and_wait(). Each delivered record
+    remembers when it was sent, so consumers report the publish-to-handler
+    delay per topic (``delivery_lag_ms``).
+    """
+
+    def __init__(self, latency_ms: float = 0.5):
+        self.latency = latency_ms / 1000.0
+        self.messages: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self.lag_ms: Dict[str, List[float]] = defaultdict(list)
+        self._groups: Dict[str, Tuple[List[str], asyncio.Queue]] = {}
+        self._offsets: Counter = Counter()
+
+    async def get_producer(self) -> "_Producer":
+        return _Producer(self)
+
+    def consumer(self, topics: List[str], group_id: str) -> "_Consumer":
+        queue: asyncio.Queue = asyncio.Queue()
+        self._groups[group_id] = (list(topics), queue)
+        return _Consumer(self, queue)
+
+    async def send(self, topic: str, value: bytes, key=None, headers=None) -> None:
+        await asyncio.sleep(self.latency)
+        offset = self._offsets[topic]
+        self._offsets[topic] += 1
+        self.messages[topic] += 1
+        self.bytes[topic] += len(value)
+        record = SimpleNamespace(
+            topic=topic, partition=0, offset=offset, key=key, value=value,
+            headers=list(headers or ()), sent_at=time.perf_counter(),
+        )
+        for topics, queue in self._groups.values():
+            if topic in topics:
+                queue.put_nowait(record)
+
+    def pending(self) -> int:
+        return sum(queue.qsize() for _, queue in self._groups.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"messages": dict(self.messages), "bytes": dict(self.bytes)}
+
+
+class _Producer:
+    def __init__(self, broker: LocalKafka):
+        self.broker = broker
+
+    async def send_and_wait(self, topic, value, key=None, headers=None):
+        await self.broker.send(topic, value, key, headers)
+
+    async def stop(self):
+        pass
+
+
+class _Consumer:
+    def __init__(self, broker: LocalKafka, queue: asyncio.Queue):
+        self.broker = broker
+        self.queue = queue
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        record = await self.queue.get()
+        self.broker.lag_ms[record.topic].append((time.perf_counter() - record.sent_at) * 1000)
+        return record
+
+
+class _Query(BaseModel):
+    question: str
+    top_k: int = 3
+
+
+def rag_app(latency_ms: float = 5.0) -> FastAPI:
+    """RAG API stand-in: fixed policy passages after ``latency_ms``."""
+    app = FastAPI(title="RAG API (stand-in)")
+    hits = [
+        {"text": "Max single order notional is 1,000,000 USD.", "score": 0.82,
+         "source": "risk_policy.md"},
+        {"text": "Trades above 10,000 shares require human approval.", "score": 0.77,
+         "source": "risk_policy.md"},
+        {"text": "Restricted symbols may not be traded.", "score": 0.61,
+         "source": "compliance.md"},
+    ]
+
+    @app.post("/query")
+    async def query(q: _Query):
+        await asyncio.sleep(latency_ms / 1000.0)
+        return {"question": q.question, "hits": hits[: q.top_k]}
+
+    return app
+
+
+@contextmanager
+def installed(pg: LocalPostgres, broker: LocalKafka) -> Iterator[None]:
+    """Route services.common.db and services.common.kafka to the stand-ins."""
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(db, "conn_cursor", pg.conn_cursor))
+        stack.enter_context(patch.object(db, "pooled_cursor", pg.pooled_cursor))
+        stack.enter_context(patch.object(kafka, "get_producer", broker.get_producer))
+        yield
@@ -0,0 +1,543 @@
+"""Microbenchmarks of the hot paths, with a stored baseline and a regression check.
+
+Each case times one operation (auto-scaled to ``--min-time`` per repeat,
+``--repeats`` times, garbage collector off) offline, in process: audit
+hashing and row serialization, JSON/msgpack encode/decode of market.prices
+and orders.filled (with the encoded size), schema validation per topic,
+SimpleRAG.query, _chunk_text, VectorStore.search on an in-memory Qdrant with
+a hashing encoder (skipped without qdrant-client), MCP argument validation,
+risk_check_trade, execute_tool dispatch, the HTTP metrics middleware (vs a
+bare ASGI app) and node_evaluate.
+
+Times are compared as multiples of a fixed pure-Python ``calibration`` loop:
+every repeat of a case is paired with a calibration run and the median ratio
+is kept, which absorbs most of the difference between machines and the CPU
+frequency drift during the run. A case regresses when that relative cost grew
+by more than ``--tolerance`` (50% by default: run-to-run spread measured up to
+~30% on a shared machine), or when its encoded size grew. The exit status is 1 on regression, 0 otherwise
+(also with ``--update`` or without a baseline file); ``make bench`` fails
+with it.
+
+Usage:
+    python -m scripts.microbench [-k filter] [--tolerance 0.5] [--json out.json]
+    python -m scripts.microbench --update   # rewrite scripts/microbench_baseline.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "scripts", "microbench_baseline.json")
+CALIBRATION = "calibration"
+
+
+class Unavailable(Exception):
+    """Raised by a case setup when an optional dependency is missing."""
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], Any]]  # returns the operation to time
+    is_async: bool
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, is_async: bool = False):
+    def register(setup):
+        CASES.append(Case(name, setup, is_async))
+        return setup
+    return register
+
+
+# ── Fixtures ─────────────────────────────────────────────────────────
+
+TOOL_CALL = {
+    "tool": "risk.check_trade",
+    "arguments": {"symbol": "AAPL", "side": "BUY", "qty": 100},
+    "result": {"symbol": "AAPL", "side": "BUY", "qty": 100, "notional": 18730.0,
+               "passed": True, "violations": []},
+    "timestamp": "2025-01-01T00:00:00+00:00",
+}
+WORKFLOW_ID = "3f2b6c1e-0000-4000-8000-000000000000"
+PAYLOADS = {
+    "market.prices": {"symbol": "AAPL", "last": 187.3},
+    "workflow.requested": {
+        "workflow_id": WORKFLOW_ID, "symbol": "AAPL", "side": "BUY", "qty": 100,
+        "reason": "Momentum signal detected, risk within limits.",
+    },
+    "workflow.approved": {"workflow_id": WORKFLOW_ID, "approver": "alice", "comment": "ok"},
+    "genai.review.created": {
+        "workflow_id": WORKFLOW_ID, "summary": "x" * 600, "risk_notes": "see summary",
+        "sources": ["trading_policies.md", "runbook_incident.md", "limits.md"],
+    },
+    "orders.filled": {
+        "order_id": "5f0c2d7e-1a3b-4c5d-8e9f-0a1b2c3d4e5f", "workflow_id": WORKFLOW_ID,
+        "symbol": "AAPL", "side": "BUY", "qty": 100.0, "fill_price": 187.31,
+    },
+    "audit.logged": {
+        "kind": "order.filled", "ref_id": WORKFLOW_ID, "hash": "0" * 64,
+        "data": {"order_id": "5f0c2d7e-1a3b-4c5d-8e9f-0a1b2c3d4e5f", "qty": 100.0},
+    },
+}
+
+
+def _event(topic: str) -> Dict[str, Any]:
+    return {
+        "event_id": "8a1e7c52-4f3b-4d8e-9c61-2b7f0e5d3a19",
+        "event_type": topic,
+        "occurred_at": "2025-01-01T00:00:00+00:00",
+        "correlation_id": "0af76519-16cd-43dd-8448-eb211c80319c",
+        "payload": PAYLOADS[topic],
+    }
+
+
+QUESTION = "What is the maximum position size per symbol and who approves large trades?"
+
+
+def _corpus() -> str:
+    texts = []
+    for folder in ("docs/knowledge_base", "rag_corpus"):
+        path = os.path.join(ROOT, folder)
+        for fn in sorted(os.listdir(path)):
+            if fn.endswith(".md"):
+                with open(os.path.join(path, fn), encoding="utf-8") as f:
+                    texts.append(f.read())
+    return "\n\n".join(texts)
+
+
+class _HashingEncoder:
+    """Deterministic bag-of-words embeddings (stands in for the model)."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts):
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+
+# ── Cases ────────────────────────────────────────────────────────────
+
+@case(CALIBRATION)
+def _calibration():
+    def op():
+        x = 0
+        for i in range(1000):
+            x += i
+        return x
+    return op
+
+
+@case("audit._hash")
+def _audit_hash():
+    from services.common.audit import _hash
+
+    return lambda: _hash({"kind": "mcp.tool_call", "ref_id": "wf", "data": TOOL_CALL})
+
+
+@case("audit.audit_row (log_audit serialization)")
+def _audit_row():
+    from services.common.audit import audit_row
+
+    return lambda: audit_row("mcp.tool_call", "wf", TOOL_CALL, "corr")
+
+
+def _sized(op: Callable[[], Any], size: int) -> Callable[[], Any]:
+    """Attach an encoded size (bytes), reported and compared with the timings."""
+    op.bytes = size  # type: ignore[attr-defined]
+    return op
+
+
+def _codec_case(topic: str, encoding: str, decode: bool):
+    def setup():
+        from services.common import codec
+
+        if encoding == "msgpack" and not codec.MSGPACK_AVAILABLE:
+            raise Unavailable("msgpack not installed")
+        event = _event(topic)
+        raw = codec.encode(event, encoding)
+        assert codec.decode(raw) == event
+        if decode:
+            return _sized(lambda: codec.decode(raw), len(raw))
+        return _sized(lambda: codec.encode(event, encoding), len(raw))
+    return setup
+
+
+for _topic in ("market.prices", "orders.filled"):
+    for _encoding in ("json", "msgpack"):
+        case(f"event.encode {_encoding} {_topic}")(_codec_case(_topic, _encoding, False))
+        case(f"event.decode {_encoding} {_topic}")(_codec_case(_topic, _encoding, True))
+
+
+def _validate_case(topic: str):
+    def setup():
+        from services.common.schemas import SchemaRegistry
+
+        registry = SchemaRegistry()
+        event = _event(topic)
+        assert registry.validate(topic, event) == [], topic
+        return lambda: registry.validate(topic, event)
+    return setup
+
+
+for _topic in PAYLOADS:
+    if _topic != "market.prices":  # no schema: published as is
+        case(f"event.validate {_topic}")(_validate_case(_topic))
+
+
+@case("rag.SimpleRAG.query")
+def _simple_rag():
+    try:
+        from services.genai_api.rag import SimpleRAG
+    except ImportError as e:
+        raise Unavailable(str(e))
+    rag = SimpleRAG(os.path.join(ROOT, "rag_corpus"))
+    rag.load()
+    return lambda: rag.query(QUESTION, top_k=3)
+
+
+@case("rag._chunk_text")
+def _chunk_text():
+    from services.rag_api.main import _chunk_text
+
+    text = _corpus()
+    return lambda: _chunk_text(text, max_tokens=256, overlap=32)
+
+
+def _vector_store():
+    try:
+        from qdrant_client import QdrantClient
+    except ImportError:
+        raise Unavailable("qdrant-client not installed")
+    from services.rag_api import vectorstore
+    from services.rag_api.main import _chunk_text
+
+    # No model download, no server: local Qdrant and a hashing encoder
+    with patch.object(vectorstore, "_EMBEDDINGS_AVAILABLE", False), \
+            patch.object(vectorstore, "_QDRANT_AVAILABLE", False):
+        store = vectorstore.VectorStore(collection="microbench")
+    store._client = QdrantClient(location=":memory:")
+    store._model = _HashingEncoder(store.vector_size)
+    store.ensure_collection()
+    store.upsert_many([
+        (str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk-{i}")), chunk, {"source": "corpus"})
+        for i, chunk in enumerate(_chunk_text(_corpus(), max_tokens=128))
+    ])
+    return store
+
+
+@case("rag.VectorStore.search (result cache hit)")
+def _vs_search_cached():
+    store = _vector_store()
+    store.search(QUESTION)
+    return lambda: store.search(QUESTION)
+
+
+@case("rag.VectorStore.search (Qdrant query)")
+def _vs_search_miss():
+    store = _vector_store()
+
+    def op():
+        store.invalidate()  # drops cached results; the embedding stays cached
+        return store.search(QUESTION)
+    return op
+
+
+@case("mcp.risk_check_trade")
+def _risk_check():
+    from services.mcp_server.tools import risk_check_trade
+
+    return lambda: risk_check_trade("AAPL", "BUY", 100)
+
+
+def _mcp_validation(tool: str, arguments: Dict[str, Any]):
+    from services.mcp_server.tools import _validators
+    from services.mcp_server.validation import ArgumentError
+
+    validator = _validators[tool]
+
+    def op():
+        try:
+            return validator(arguments)
+        except ArgumentError:
+            return None
+    return op
+
+
+@case("mcp.validate risk.check_trade (coerced)")
+def _validate_risk():
+    return _mcp_validation("risk.check_trade", {"symbol": "AAPL", "side": "buy", "qty": "100"})
+
+
+@case("mcp.validate oms.place_order (rejected)")
+def _validate_rejected():
+    return _mcp_validation("oms.place_order", {"symbol": "AAPL", "side": "HOLD", "extra": 1})
+
+
+@case("mcp.execute_tool risk.check_trade", is_async=True)
+def _execute_tool():
+    from services.mcp_server.tools import execute_tool
+
+    args = {"symbol": "AAPL", "side": "BUY", "qty": 100}
+    return lambda: execute_tool("risk.check_trade", args)
+
+
+@case("mcp.execute_tool market.get_last_price (cache hit)", is_async=True)
+def _execute_tool_cached():
+    from services.mcp_server.tools import execute_tool
+
+    args = {"symbol": "AAPL"}
+    return lambda: execute_tool("market.get_last_price", args)
+
+
+async def _asgi_app(scope, receive, send):
+    from types import SimpleNamespace
+
+    scope["route"] = SimpleNamespace(path="/trade-requests/{workflow_id}")  # as the router does
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"status":"ok"}'})
+
+
+async def _asgi_receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def _asgi_send(message):
+    pass
+
+
+def _asgi_request(asgi):
+    def op():
+        scope = {"type": "http", "method": "GET", "path": "/trade-requests/42"}
+        return asgi(scope, _asgi_receive, _asgi_send)
+    return op
+
+
+@case("http.request bare ASGI app", is_async=True)
+def _http_bare():
+    return _asgi_request(_asgi_app)
+
+
+@case("http.request MetricsMiddleware", is_async=True)
+def _http_metrics():
+    from services.common.metrics import MetricsMiddleware
+
+    # The difference with the bare app is the middleware's cost per request
+    return _asgi_request(MetricsMiddleware(_asgi_app, service="microbench"))
+
+
+@case("agent.node_evaluate")
+def _node_evaluate():
+    from services.agent_controller.graph import AgentState, node_evaluate
+
+    state = AgentState("AAPL", "BUY", 100, "benchmark", "wf", "corr")
+    state.risk_result = TOOL_CALL["result"]
+    state.price_result = {"symbol": "AAPL", "last": 187.3}
+    state.rag_hits = [{"text": "Max position 10,000 shares.", "score": 0.8, "source": "a.md"}] * 3
+
+    def op():
+        state.pending_writes = []  # node_evaluate queues its audit row
+        return node_evaluate(state)
+    return op
+
+
+# ── Runner ───────────────────────────────────────────────────────────
+
+def _timer(c: Case, op: Callable[[], Any], loop: asyncio.AbstractEventLoop):
+    if c.is_async:
+        async def batch(n):
+            start = time.perf_counter()
+            for _ in range(n):
+                await op()
+            return time.perf_counter() - start
+
+        def run_async(n):
+            return _without_gc(lambda: loop.run_until_complete(batch(n)))
+        return run_async
+
+    def run(n):
+        start = time.perf_counter()
+        for _ in range(n):
+            op()
+        return time.perf_counter() - start
+    return lambda n: _without_gc(lambda: run(n))
+
+
+def _without_gc(fn: Callable[[], float]) -> float:
+    # Like timeit: a collection landing in one repeat is noise, not cost
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return fn()
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _scaled(timer: Callable[[int], float], min_time: float) -> int:
+    """Batch size for which one timing takes at least ``min_time``."""
+    n = 1
+    while True:
+        seconds = timer(n)
+        if seconds >= min_time:
+            return n
+        n = n * 10 if seconds < min_time / 10 else n * 2
+
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def measure(
+    c: Case,
+    min_time: float,
+    repeats: int,
+    loop,
+    calibrate: Optional[Callable[[], float]] = None,
+) -> Dict[str, Any]:
+    """Time ``c``; with ``calibrate`` (seconds per calibration op), each repeat
+    is paired with a calibration run and ``relative`` is the median ratio, so
+    CPU frequency drift during the suite cancels out."""
+    op = c.setup()
+    timer = _timer(c, op, loop)
+    n = _scaled(timer, min_time)
+    per_op, ratios = [], []
+    for _ in range(max(1, repeats)):
+        seconds = timer(n) / n
+        per_op.append(seconds)
+        if calibrate is not None:
+            ratios.append(seconds / calibrate())
+    result = {
+        "ns_per_op": round(min(per_op) * 1e9, 1),
+        "median_ns": round(_median(per_op) * 1e9, 1),
+        "ops_per_s": round(1 / _median(per_op)),
+        "iterations": n,
+    }
+    result["relative"] = round(_median(ratios), 5) if ratios else 1.0
+    if hasattr(op, "bytes"):
+        result["bytes"] = op.bytes
+    return result
+
+
+def run_suite(pattern: str = "", min_time: float = 0.05, repeats: int = 7) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    loop = asyncio.new_event_loop()
+    try:
+        calibration = next(c for c in CASES if c.name == CALIBRATION)
+        cal_timer = _timer(calibration, calibration.setup(), loop)
+        cal_n = _scaled(cal_timer, min_time)
+        results[CALIBRATION] = measure(calibration, min_time, repeats, loop)
+        for c in CASES:
+            if c.name == CALIBRATION or (pattern and pattern not in c.name):
+                continue
+            try:
+                results[c.name] = measure(c, min_time, repeats, loop,
+                                          calibrate=lambda: cal_timer(cal_n) / cal_n)
+            except Unavailable as e:
+                skipped[c.name] = str(e)
+    finally:
+        loop.close()
+    return {
+        "meta": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "min_time": min_time,
+            "repeats": repeats,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Cases whose relative cost grew by more than ``tolerance`` (a fraction),
+    or whose encoded size grew at all (sizes are deterministic)."""
+    regressions = []
+    for name, new in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if name == CALIBRATION or old is None:
+            continue
+        if "bytes" in old and new.get("bytes", 0) > old["bytes"]:
+            regressions.append(f"{name}: {old['bytes']} -> {new['bytes']} bytes")
+        if new["relative"] > old["relative"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {old['relative']:.3f} -> {new['relative']:.3f} x calibration "
+                f"(+{(new['relative'] / old['relative'] - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    old = (baseline or {}).get("results", {})
+    print(f"{'case':52s} {'ns/op':>12s} {'ops/s':>12s} {'x calib':>9s} {'vs base':>8s} "
+          f"{'bytes':>6s}")
+    for name, r in report["results"].items():
+        delta = ""
+        if name in old and name != CALIBRATION:
+            delta = f"{(r['relative'] / old[name]['relative'] - 1) * 100:+.0f}%"
+        print(f"{name[:52]:52s} {r['median_ns']:12,.0f} {r['ops_per_s']:12,d} "
+              f"{r['relative']:9.3f} {delta:>8s} {r.get('bytes', ''):>6}")
+    for name, reason in report["skipped"].items():
+        print(f"{name[:52]:52s} skipped: {reason}")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m scripts.microbench", description=__doc__.splitlines()[0])
+    p.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    p.add_argument("--min-time", type=float, default=0.05, help="seconds per repeat")
+    p.add_argument("--repeats", type=int, default=7)
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--tolerance", type=float, default=0.5,
+                   help="allowed growth of the relative cost")
+    p.add_argument("--update", action="store_true", help="write the results as the baseline")
+    p.add_argument("--json", help="also write the results here")
+    args = p.parse_args(argv)
+
+    logging.disable(logging.WARNING)  # node logs, missing optional-dependency warnings
+    report = run_suite(args.pattern, args.min_time, args.repeats)
+    baseline = None
+    if not args.update and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    for path in filter(None, (args.json, args.baseline if args.update else None)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"results written to {path}")
+    if baseline is None:
+        return 0
+    regressions = compare(report, baseline, args.tolerance)
+    print(f"\n{len(regressions)} regression(s) vs {os.path.relpath(args.baseline)} "
+          f"(tolerance {args.tolerance:.0%})")
+    for line in regressions:
+        print(f"  {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
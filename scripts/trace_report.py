@@ -0,0 +1,94 @@
+"""Report: traces exported with TRACE_EXPORTER=file.
+
+Groups the spans of a JSON-lines trace file by trace, prints each trace as a
+tree (offset from the trace start, duration, service, span name) and a latency
+summary per span name, which shows where a slow workflow spent its time.
+
+Usage:
+    python -m scripts.trace_report [traces.jsonl] [--trace <trace_id|correlation_id>] [--limit N]
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from services.common.otel import trace_id_for
+
+
+def load(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                s = json.loads(line)
+                traces[s["traceId"]].append(s)
+    return traces
+
+
+def print_trace(trace_id: str, spans: List[Dict[str, Any]]) -> None:
+    spans.sort(key=lambda s: s["startTimeUnixNano"])
+    t0 = spans[0]["startTimeUnixNano"]
+    ids = {s["spanId"] for s in spans}
+    children: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        # Parents outside the file (unsampled, other exporter) become roots
+        parent = s["parentSpanId"] if s["parentSpanId"] in ids else None
+        children[parent].append(s)
+    end = max(s["endTimeUnixNano"] for s in spans)
+    print(f"trace {trace_id}  {len(spans)} spans  {(end - t0) / 1e6:.1f} ms")
+
+    def walk(parent, depth):
+        for s in children.get(parent, ()):
+            flag = " ERROR" if s["status"]["code"] == "ERROR" else ""
+            print(f"  +{(s['startTimeUnixNano'] - t0) / 1e6:9.1f} ms {s['durationMs']:9.1f} ms  "
+                  f"{s['service']:14s} {'  ' * depth}{s['name']}{flag}")
+            walk(s["spanId"], depth + 1)
+
+    walk(None, 0)
+
+
+def _pct(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def print_summary(traces: Dict[str, List[Dict[str, Any]]]) -> None:
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    for spans in traces.values():
+        for s in spans:
+            by_name[s["name"]].append(s["durationMs"])
+    print(f"{'span':44s} {'count':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}")
+    for name, values in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        print(f"{name[:44]:44s} {len(values):7d} {_pct(values, 0.5):9.1f} "
+              f"{_pct(values, 0.95):9.1f} {values[-1]:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--trace", help="trace id or correlation_id to print")
+    parser.add_argument("--limit", type=int, default=5, help="slowest traces to print")
+    args = parser.parse_args()
+
+    traces = load(args.path)
+    if args.trace:
+        trace_id = trace_id_for(args.trace) or args.trace
+        if trace_id not in traces:
+            raise SystemExit(f"trace {args.trace} not found in {args.path}")
+        print_trace(trace_id, traces[trace_id])
+        return
+
+    def span_ms(spans):
+        return (max(s["endTimeUnixNano"] for s in spans)
+                - min(s["startTimeUnixNano"] for s in spans)) / 1e6
+
+    print(f"=== {len(traces)} traces in {args.path} ===")
+    for trace_id, spans in sorted(traces.items(), key=lambda kv: -span_ms(kv[1]))[:args.limit]:
+        print_trace(trace_id, spans)
+    print()
+    print_summary(traces)
+
+
+if __name__ == "__main__":
+    main()
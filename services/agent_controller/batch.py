@@ -0,0 +1,171 @@
+"""Running many agent graphs in one request (basket trades).
+
+Trades of a batch share a `BatchContext`: price and RAG lookups are done once
+per symbol (concurrent graphs asking for the same key wait on the same call),
+and the workflows are created by a single bulk INSERT. A leg's commits (its
+decision at DECIDE, its fill at EXECUTE) are written before the graph moves
+on, so no order is placed for a decision that is not stored; legs committing
+at the same time share one transaction and one bulk UPDATE of the workflows
+(group commit).
+"""
+
+import asyncio
+import json
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import Counter
+
+from services.common.db import execute_transaction, execute_values
+from services.common.logging import setup_logging
+from .graph import AgentState, run_state
+
+log = setup_logging("agent-controller.batch")
+
+agent_batch_shared_lookups_total = Counter(
+    "agent_batch_shared_lookups_total",
+    "Lookups served by a call already made for another trade of the batch",
+    ["kind"],
+)
+
+
+@dataclass
+class _Commit:
+    """One leg's commit, waiting for (or written by) a group flush."""
+
+    workflow_id: str
+    update: Optional[Tuple[str, float, str]]
+    writes: List[List[Any]]
+    error: Optional[Exception] = None
+
+
+class BatchContext:
+    """State shared by the graphs of one batch."""
+
+    def __init__(self):
+        self._shared: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+        self.workflow_updates: Dict[str, Tuple[str, float, str]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._queue: List[_Commit] = []
+
+    async def shared(self, kind: str, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return ``factory()``'s result, calling it once per (kind, key) in the batch."""
+        fut = self._shared.get((kind, key))
+        if fut is None:
+            fut = asyncio.ensure_future(factory())
+            self._shared[(kind, key)] = fut
+        else:
+            agent_batch_shared_lookups_total.labels(kind=kind).inc()
+        # shield: a timed-out graph must not cancel a lookup other graphs wait on
+        return await asyncio.shield(fut)
+
+    def record(self, state: AgentState, status: str) -> None:
+        """Set the workflow row update written by the next commit() of ``state``."""
+        with self._lock:
+            self.workflow_updates[state.workflow_id] = (
+                status, state.confidence_score, state.decision,
+            )
+
+    def commit(self, state: AgentState) -> None:
+        """Write the queued statements and workflow update of ``state`` (blocking).
+
+        Legs committing while a flush is running are written together by the
+        next one. Raises the error of the transaction that held this leg's
+        writes; its workflow update is then kept for a later commit.
+        """
+        with self._lock:
+            entry = _Commit(state.workflow_id, self.workflow_updates.pop(state.workflow_id, None),
+                            list(state.pending_writes))
+            self._queue.append(entry)
+        with self._flush_lock:
+            with self._lock:
+                group, self._queue = self._queue, []
+            if group:
+                self._flush(group)
+        if entry.error is not None:
+            raise entry.error
+
+    def _flush(self, group: List[_Commit]) -> None:
+        try:
+            execute_transaction(self._statements(group))
+        except Exception as e:
+            if len(group) == 1:
+                group[0].error = e
+                with self._lock:
+                    if group[0].update is not None:
+                        self.workflow_updates.setdefault(group[0].workflow_id, group[0].update)
+                return
+            # Retry leg by leg: only the legs whose own writes fail get the error
+            log.warning("batch group commit failed (%d legs), retrying per leg: %r", len(group), e)
+            for entry in group:
+                self._flush([entry])
+
+    @staticmethod
+    def _statements(group: List[_Commit]) -> List[Any]:
+        statements: List[Any] = []
+        updates = [(c.workflow_id, *c.update) for c in group if c.update is not None]
+        if updates:
+            values = ", ".join(["(%s::uuid, %s, %s::numeric, %s)"] * len(updates))
+            statements.append((
+                "UPDATE workflows AS w SET status = v.status, "
+                "confidence_score = v.confidence_score, decision = v.decision, "
+                "reviewer = 'agent_controller', updated_at = now() "
+                f"FROM (VALUES {values}) AS v(workflow_id, status, confidence_score, decision) "
+                "WHERE w.workflow_id = v.workflow_id",
+                [p for update in updates for p in update],
+            ))
+        for c in group:
+            statements.extend(c.writes)
+        return statements
+
+
+async def run_agent_batch(
+    trades: Sequence[Dict[str, Any]],
+    concurrency: int,
+) -> List[Tuple[AgentState, Optional[str]]]:
+    """Run one graph per trade, at most ``concurrency`` at a time.
+
+    Returns ``(state, error)`` per trade, in input order; ``error`` is None
+    for graphs that completed.
+    """
+    ctx = BatchContext()
+    states = []
+    for trade in trades:
+        state = AgentState(
+            symbol=trade["symbol"],
+            side=trade["side"],
+            qty=trade["qty"],
+            reason=trade["reason"],
+            workflow_id=str(uuid.uuid4()),
+            correlation_id=str(uuid.uuid4()),
+        )
+        state.batch = ctx
+        states.append(state)
+
+    await asyncio.to_thread(
+        execute_values,
+        "INSERT INTO workflows(workflow_id, status, payload, correlation_id) VALUES %s",
+        [
+            (s.workflow_id, "REQUESTED", json.dumps(t), s.correlation_id)
+            for s, t in zip(states, trades)
+        ],
+    )
+    log.info("batch workflows created n=%d", len(states))
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(state: AgentState) -> Optional[str]:
+        async with sem:
+            try:
+                await run_state(state)
+            except Exception as e:
+                log.warning("batch trade failed wf=%s: %r", state.workflow_id, e)
+                return repr(e)
+        return None
+
+    # Each leg commits as it goes: a failed commit is that leg's error
+    errors = await asyncio.gather(*(run_one(s) for s in states))
+    return list(zip(states, errors))
@@ -0,0 +1,265 @@
+"""Minimal declarative graph engine for the agent controller.
+
+A graph is a list of `Node`s. Each node declares the nodes it runs after
+(``deps``), the state fields it reads (``inputs``) and writes (``outputs``), and
+an optional ``when`` predicate: a node whose predicate is false is skipped
+(conditional edge). `run_graph()` starts every node as soon as its dependencies
+are settled, times each one into a Prometheus histogram and, after each
+completed node marked ``checkpoint``, hands the state to a `Checkpointer` so an
+interrupted run can resume from the last completed node instead of replaying
+it from the start.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from services.common.logging import setup_logging
+from services.common.otel import span
+
+log = setup_logging("agent-controller.engine")
+
+agent_node_duration_seconds = Histogram(
+    "agent_node_duration_seconds",
+    "Agent graph node latency",
+    ["node", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+agent_nodes_skipped_total = Counter(
+    "agent_nodes_skipped_total",
+    "Nodes skipped by a false condition or restored from a checkpoint",
+    ["node", "reason"],
+)
+
+
+@dataclass(frozen=True)
+class Node:
+    """A graph node: runs once every node in ``deps`` has completed.
+
+    A failing or timed-out node aborts the run (cancelling whatever else is
+    running) unless ``required`` is False, in which case the graph carries on
+    with whatever the node left in the state.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    deps: Tuple[str, ...] = ()
+    timeout: float = 10.0
+    required: bool = True
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    when: Optional[Callable[[Any], bool]] = None
+    checkpoint: bool = True
+
+
+def validate(nodes: Sequence[Node], initial: Iterable[str]) -> None:
+    """Check that dependencies exist and every input is produced upstream.
+
+    Raises ValueError on unknown dependencies, cycles, or inputs that neither
+    belong to the initial state nor are an output of a (transitive) dependency.
+    """
+    by_name = {n.name: n for n in nodes}
+    initial = set(initial)
+    upstream: Dict[str, Set[str]] = {}
+
+    def ancestors(name: str, path: Tuple[str, ...] = ()) -> Set[str]:
+        if name in path:
+            raise ValueError(f"dependency cycle: {' -> '.join(path + (name,))}")
+        if name not in upstream:
+            found: Set[str] = set()
+            for dep in by_name[name].deps:
+                if dep not in by_name:
+                    raise ValueError(f"node {name} depends on unknown node {dep}")
+                found |= {dep} | ancestors(dep, path + (name,))
+            upstream[name] = found
+        return upstream[name]
+
+    for node in nodes:
+        available = set(initial)
+        for dep in ancestors(node.name):
+            available.update(by_name[dep].outputs)
+        missing = [f for f in node.inputs if f not in available]
+        if missing:
+            raise ValueError(f"node {node.name} reads {missing} that no upstream node writes")
+
+
+# ── Checkpointing ────────────────────────────────────────────────────
+
+class Checkpointer:
+    """Stores ``(completed node names, state dict)`` per run id."""
+
+    def load(self, run_id: str) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+        return None
+
+    def save(self, run_id: str, completed: List[str], state: Dict[str, Any]) -> None:
+        pass
+
+    def clear(self, run_id: str) -> None:
+        pass
+
+
+class MemoryCheckpointer(Checkpointer):
+    """In-process store: survives a failed run, not a restart."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[List[str], Dict[str, Any]]] = {}
+
+    def load(self, run_id):
+        entry = self._data.get(run_id)
+        if entry is None:
+            return None
+        # Round-trip through JSON like the Postgres backend does
+        return list(entry[0]), json.loads(json.dumps(entry[1]))
+
+    def save(self, run_id, completed, state):
+        self._data[run_id] = (list(completed), json.loads(json.dumps(state)))
+
+    def clear(self, run_id):
+        self._data.pop(run_id, None)
+
+
+class PostgresCheckpointer(Checkpointer):
+    """One row per run in ``agent_checkpoints``, deleted when the run completes."""
+
+    def load(self, run_id):
+        from services.common.db import fetchone
+
+        row = fetchone(
+            "SELECT completed, state FROM agent_checkpoints WHERE workflow_id = %s",
+            (run_id,),
+        )
+        if row is None:
+            return None
+        return list(row["completed"]), dict(row["state"])
+
+    def save(self, run_id, completed, state):
+        from services.common.db import execute
+
+        execute(
+            "INSERT INTO agent_checkpoints(workflow_id, completed, state) VALUES (%s, %s, %s) "
+            "ON CONFLICT (workflow_id) DO UPDATE SET completed = EXCLUDED.completed, "
+            "state = EXCLUDED.state, updated_at = now()",
+            (run_id, json.dumps(completed), json.dumps(state)),
+        )
+
+    def clear(self, run_id):
+        from services.common.db import execute
+
+        execute("DELETE FROM agent_checkpoints WHERE workflow_id = %s", (run_id,))
+
+
+def make_checkpointer(backend: str) -> Checkpointer:
+    backend = backend.lower()
+    if backend == "postgres":
+        return PostgresCheckpointer()
+    if backend == "memory":
+        return MemoryCheckpointer()
+    if backend in ("", "none", "off"):
+        return Checkpointer()
+    raise ValueError(f"unknown checkpoint backend: {backend}")
+
+
+# ── Runner ───────────────────────────────────────────────────────────
+
+async def _save(checkpointer, run_id, by_name, done, snapshot, state) -> None:
+    fields = [f for name in done for f in by_name[name].outputs]
+    await asyncio.to_thread(checkpointer.save, run_id, list(done), snapshot(state, fields))
+
+
+async def _run_node(node: Node, state: Any) -> None:
+    with span(f"agent.node {node.name}"):
+        if asyncio.iscoroutinefunction(node.fn):
+            work = node.fn(state)
+        else:
+            # DB/CPU-only nodes: keep them off the event loop
+            work = asyncio.to_thread(node.fn, state)
+        await asyncio.wait_for(work, node.timeout)
+
+
+async def run_graph(
+    nodes: Sequence[Node],
+    state: Any,
+    run_id: str,
+    snapshot: Callable[[Any, Iterable[str]], Dict[str, Any]],
+    checkpointer: Optional[Checkpointer] = None,
+    completed: Iterable[str] = (),
+) -> Any:
+    """Run ``nodes`` over ``state``; nodes in ``completed`` are not run again.
+
+    ``snapshot(state, fields)`` serializes the initial fields plus the given
+    output fields; it is saved after every completed node marked ``checkpoint``
+    (nodes that are not are saved with the next one).
+    """
+    checkpointer = checkpointer or Checkpointer()
+    by_name = {n.name: n for n in nodes}
+    done: List[str] = [name for name in completed if name in by_name]
+    for name in done:
+        agent_nodes_skipped_total.labels(node=name, reason="checkpoint").inc()
+    pending = {n.name: n for n in nodes if n.name not in done}
+    running: Dict["asyncio.Task[None]", Tuple[Node, float]] = {}
+    dirty = False
+
+    try:
+        while pending or running:
+            skipped = False
+            for name, node in list(pending.items()):
+                if not all(dep in done for dep in node.deps):
+                    continue
+                del pending[name]
+                if node.when is not None and not node.when(state):
+                    log.info("node %s skipped run=%s", name, run_id)
+                    agent_nodes_skipped_total.labels(node=name, reason="condition").inc()
+                    done.append(name)
+                    skipped = True
+                    dirty = dirty or node.checkpoint
+                    continue
+                log.info("Running node %s for run=%s", name, run_id)
+                task = asyncio.create_task(_run_node(node, state))
+                running[task] = (node, time.perf_counter())
+            if dirty:
+                # Written while the newly started nodes run
+                await _save(checkpointer, run_id, by_name, done, snapshot, state)
+                dirty = False
+            if not running:
+                if pending and not skipped:
+                    raise RuntimeError(f"unsatisfiable node dependencies: {sorted(pending)}")
+                continue  # a skipped node may have released others
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            # Include tasks that finished since the wakeup: the snapshot must not
+            # hold writes of a node that is not recorded as completed
+            finished = [task for task in running if task.done()]
+            failure: Optional[BaseException] = None
+            for task in finished:
+                node, started = running.pop(task)
+                exc = task.exception()
+                status = "ok"
+                if exc is not None:
+                    status = "timeout" if isinstance(exc, asyncio.TimeoutError) else "error"
+                agent_node_duration_seconds.labels(node=node.name, status=status).observe(
+                    time.perf_counter() - started
+                )
+                if exc is not None:
+                    reason_txt = "timeout" if status == "timeout" else repr(exc)
+                    if node.required:
+                        log.error("node %s failed run=%s: %s", node.name, run_id, reason_txt)
+                        failure = failure or exc
+                        continue
+                    log.warning("node %s failed run=%s (continuing): %s",
+                                node.name, run_id, reason_txt)
+                done.append(node.name)
+                dirty = dirty or node.checkpoint
+            if failure is not None:
+                # Keep what did complete so a retry resumes after it
+                if dirty:
+                    await _save(checkpointer, run_id, by_name, done, snapshot, state)
+                raise failure
+    finally:
+        for task in running:
+            task.cancel()
+
+    await asyncio.to_thread(checkpointer.clear, run_id)
+    return state
@@ -1,22 +1,33 @@
 """LangGraph-style agent graph for trade processing.
 
 Implements the state machine:
-  PLAN → RETRIEVE (RAG) → TOOL_CALLS (MCP) → EVALUATE → DECIDE
+  PLAN → { RETRIEVE (RAG) ∥ TOOL_CALLS (MCP) } → EVALUATE → DECIDE → EXECUTE
 
-Uses a simple dict-based state and sequential node execution
+Uses a simple dict-based state and the declarative executor in `engine`
 (compatible with langgraph StateGraph pattern but implemented
-without the langgraph dependency for portability).
+without the langgraph dependency for portability): a node starts as soon as
+the nodes it depends on are done, so RETRIEVE and TOOL_CALLS – and the two MCP
+calls inside TOOL_CALLS – run concurrently. Network-bound nodes are coroutines;
+DB/CPU-only nodes stay plain functions and run in a worker thread. EXECUTE only
+runs on APPROVE, and the state is checkpointed after the expensive nodes so a
+failed run can be resumed without replaying RAG and tool calls.
+
+The workflow row is created before the graph runs. Nodes do not write to the
+database themselves: workflow updates and audit rows are queued on the state
+and committed in one transaction at DECIDE and, for approved trades, at EXECUTE.
 """
 
+import asyncio
+import json
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import httpx
-
-from services.common.audit import log_audit
-from services.common.db import execute
+from services.common.audit import AUDIT_INSERT_SQL, audit_row
+from services.common.db import execute, execute_transaction, fetchone
+from services.common.http import CircuitBreaker, ServiceClient
 from services.common.logging import setup_logging
+from .engine import Checkpointer, Node, make_checkpointer, run_graph, validate
 
 log = setup_logging("agent-controller.graph")
 
@@ -25,6 +36,35 @@ log = setup_logging("agent-controller.graph")
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
 RAG_API_URL = os.getenv("RAG_API_URL", "http://rag-api:8014")
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://mcp-server:8016")
+NODE_TIMEOUT_S = float(os.getenv("AGENT_NODE_TIMEOUT_S", "10"))
+CHECKPOINT_BACKEND = os.getenv("AGENT_CHECKPOINT_BACKEND", "memory")
+HTTP_TIMEOUT_S = float(os.getenv("AGENT_HTTP_TIMEOUT_S", "10"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("AGENT_HTTP_CONNECT_TIMEOUT_S", "2"))
+HTTP_RETRIES = int(os.getenv("AGENT_HTTP_RETRIES", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("AGENT_HTTP_MAX_CONNECTIONS", "100"))
+BREAKER_FAILURES = int(os.getenv("AGENT_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("AGENT_BREAKER_RESET_S", "30"))
+
+# Read-only MCP tools, safe to retry
+IDEMPOTENT_TOOLS = frozenset(
+    {"market.get_last_price", "risk.check_trade", "db.get_workflow", "db.list_audit"}
+)
+
+
+def _client(name: str, base_url: str) -> ServiceClient:
+    return ServiceClient(
+        name,
+        base_url,
+        timeout=HTTP_TIMEOUT_S,
+        connect_timeout=HTTP_CONNECT_TIMEOUT_S,
+        retries=HTTP_RETRIES,
+        max_connections=HTTP_MAX_CONNECTIONS,
+        breaker=CircuitBreaker(name, BREAKER_FAILURES, BREAKER_RESET_S),
+    )
+
+
+rag_client = _client("rag-api", RAG_API_URL)
+mcp_client = _client("mcp-server", MCP_SERVER_URL)
 
 
 # ── State ────────────────────────────────────────────────────────────
@@ -58,6 +98,44 @@ class AgentState:
         self.decision: str = "DENY"  # APPROVE / DENY / NEEDS_HUMAN
         self.evaluation: Dict[str, Any] = {}
 
+        # [sql, params] not yet committed; see write() and commit()
+        self.pending_writes: List[List[Any]] = []
+
+        # BatchContext when run as part of POST /agent/trades (not checkpointed)
+        self.batch: Optional[Any] = None
+        # Set by resume_agent_graph(): DECIDE may already have been committed
+        self.resumed = False
+
+    INITIAL_FIELDS = ("symbol", "side", "qty", "reason", "workflow_id", "correlation_id")
+
+    def to_dict(self, fields: Iterable[str] = ()) -> Dict[str, Any]:
+        """Initial fields plus ``fields`` (node outputs), JSON-serializable."""
+        return {f: getattr(self, f) for f in (*self.INITIAL_FIELDS, *fields)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentState":
+        state = cls(**{f: data[f] for f in cls.INITIAL_FIELDS})
+        for key, value in data.items():
+            if key not in cls.INITIAL_FIELDS and hasattr(state, key):
+                setattr(state, key, value)
+        return state
+
+    def write(self, sql: str, params: Iterable[Any]) -> None:
+        """Queue a statement for the next commit()."""
+        self.pending_writes.append([sql, list(params)])
+
+    def audit(self, kind: str, ref_id: str, data: Dict[str, Any]) -> None:
+        self.write(AUDIT_INSERT_SQL, audit_row(kind, ref_id, data, self.correlation_id))
+
+    def commit(self) -> None:
+        """Write the queued statements in one transaction (grouped with other legs in a batch)."""
+        if self.batch is not None:
+            self.batch.commit(self)
+        else:
+            execute_transaction(self.pending_writes)
+        # Kept queued (and checkpointed) if the commit fails
+        self.pending_writes = []
+
 
 # ── Graph Nodes ──────────────────────────────────────────────────────
 
@@ -78,61 +156,70 @@ def node_plan(state: AgentState) -> AgentState:
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
-    log_audit(
-        kind="agent.plan",
-        ref_id=state.workflow_id,
-        data=state.plan,
-        correlation_id=state.correlation_id,
-    )
+    state.audit("agent.plan", state.workflow_id, state.plan)
     log.info("PLAN completed wf=%s", state.workflow_id)
     return state
 
 
-def node_retrieve(state: AgentState) -> AgentState:
-    """RETRIEVE – Query RAG for relevant context."""
-    query_text = (
-        f"Trade request: {state.side} {state.qty} {state.symbol}. "
-        f"Reason: {state.reason}. "
-        f"What are the relevant risk rules and policies?"
+async def _rag_query(question: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    resp = await rag_client.post(
+        "/query",
+        idempotent=True,
+        json={"question": question, "top_k": top_k},
     )
+    resp.raise_for_status()
+    return resp.json().get("hits", [])
+
+
+async def node_retrieve(state: AgentState) -> AgentState:
+    """RETRIEVE – Query RAG for relevant context."""
     try:
-        resp = httpx.post(
-            f"{RAG_API_URL}/query",
-            json={"question": query_text, "top_k": 3},
-            timeout=10.0,
-        )
-        resp.raise_for_status()
-        state.rag_hits = resp.json().get("hits", [])
+        if state.batch is not None:
+            # One query per symbol for the whole basket
+            query_text = (
+                f"Trade request on {state.symbol}. "
+                f"What are the relevant risk rules and policies?"
+            )
+            hits = await state.batch.shared(
+                "rag", state.symbol, lambda: _rag_query(query_text, top_k=3)
+            )
+            state.rag_hits = list(hits)
+        else:
+            query_text = (
+                f"Trade request: {state.side} {state.qty} {state.symbol}. "
+                f"Reason: {state.reason}. "
+                f"What are the relevant risk rules and policies?"
+            )
+            state.rag_hits = await _rag_query(query_text, top_k=3)
     except Exception as e:
         log.warning("RAG query failed (continuing without context): %s", e)
         state.rag_hits = []
 
-    log_audit(
-        kind="rag.retrieve",
-        ref_id=state.workflow_id,
-        data={
+    state.audit(
+        "rag.retrieve",
+        state.workflow_id,
+        {
             "query": query_text,
             "hits_count": len(state.rag_hits),
             "hits": state.rag_hits[:3],
         },
-        correlation_id=state.correlation_id,
     )
     log.info("RETRIEVE completed wf=%s hits=%d", state.workflow_id, len(state.rag_hits))
     return state
 
 
-def _mcp_call(tool: str, arguments: Dict[str, Any], state: AgentState) -> Dict[str, Any]:
-    """Helper to call an MCP tool."""
+async def _mcp_call(tool: str, arguments: Dict[str, Any], state: AgentState) -> Dict[str, Any]:
+    """Helper to call an MCP tool (retried only for read-only tools)."""
     try:
-        resp = httpx.post(
-            f"{MCP_SERVER_URL}/call",
+        resp = await mcp_client.post(
+            "/call",
+            idempotent=tool in IDEMPOTENT_TOOLS,
             json={
                 "tool": tool,
                 "arguments": arguments,
                 "correlation_id": state.correlation_id,
                 "workflow_id": state.workflow_id,
             },
-            timeout=10.0,
         )
         resp.raise_for_status()
         return resp.json().get("result", {})
@@ -141,18 +228,41 @@ def _mcp_call(tool: str, arguments: Dict[str, Any], state: AgentState) -> Dict[s
         return {"error": str(e)}
 
 
-def node_tool_calls(state: AgentState) -> AgentState:
-    """TOOL_CALLS – Execute MCP tools (price + risk check)."""
-    state.price_result = _mcp_call(
-        "market.get_last_price",
-        {"symbol": state.symbol},
-        state,
-    )
-    state.risk_result = _mcp_call(
-        "risk.check_trade",
-        {"symbol": state.symbol, "side": state.side, "qty": state.qty},
-        state,
-    )
+async def _mcp_calls(
+    calls: List[Tuple[str, Dict[str, Any]]], state: AgentState
+) -> List[Dict[str, Any]]:
+    """Several MCP tools in one /call/batch round trip; results in call order."""
+    try:
+        resp = await mcp_client.post(
+            "/call/batch",
+            idempotent=all(tool in IDEMPOTENT_TOOLS for tool, _ in calls),
+            json={
+                "calls": [{"tool": tool, "arguments": args} for tool, args in calls],
+                "correlation_id": state.correlation_id,
+                "workflow_id": state.workflow_id,
+            },
+        )
+        resp.raise_for_status()
+        return [item.get("result", {}) for item in resp.json().get("results", [])]
+    except Exception as e:
+        log.warning("MCP batch %s failed: %s", [tool for tool, _ in calls], e)
+        return [{"error": str(e)} for _ in calls]
+
+
+async def node_tool_calls(state: AgentState) -> AgentState:
+    """TOOL_CALLS – Execute MCP tools (price + risk check) concurrently."""
+    risk = ("risk.check_trade", {"symbol": state.symbol, "side": state.side, "qty": state.qty})
+    price = ("market.get_last_price", {"symbol": state.symbol})
+
+    if state.batch is None:
+        # Both tools run concurrently server-side, in a single round trip
+        state.price_result, state.risk_result = await _mcp_calls([price, risk], state)
+    else:
+        # Price shared by every leg on the symbol, risk check per leg
+        state.price_result, state.risk_result = await asyncio.gather(
+            state.batch.shared("price", state.symbol, lambda: _mcp_call(*price, state)),
+            _mcp_call(*risk, state),
+        )
     log.info("TOOL_CALLS completed wf=%s", state.workflow_id)
     return state
 
@@ -187,12 +297,7 @@ def node_evaluate(state: AgentState) -> AgentState:
         "threshold": CONFIDENCE_THRESHOLD,
     }
 
-    log_audit(
-        kind="agent.evaluate",
-        ref_id=state.workflow_id,
-        data=state.evaluation,
-        correlation_id=state.correlation_id,
-    )
+    state.audit("agent.evaluate", state.workflow_id, state.evaluation)
     log.info(
         "EVALUATE completed wf=%s confidence=%.4f threshold=%.2f",
         state.workflow_id,
@@ -203,7 +308,24 @@ def node_evaluate(state: AgentState) -> AgentState:
 
 
 def node_decide(state: AgentState) -> AgentState:
-    """DECIDE – Make final decision based on confidence score."""
+    """DECIDE – Make final decision based on confidence score.
+
+    Commits everything queued so far (audits) with the decision. A resumed run
+    first checks whether that commit already happened – the previous attempt
+    may have died before its checkpoint, or timed out while the commit was
+    still running – and then keeps the stored decision instead of committing
+    the same audits twice.
+    """
+    if state.resumed:
+        row = fetchone("SELECT decision FROM workflows WHERE workflow_id = %s",
+                       (state.workflow_id,))
+        if row is not None and row["decision"] is not None:
+            state.decision = row["decision"]
+            state.pending_writes = []
+            log.info("DECIDE already committed wf=%s decision=%s",
+                     state.workflow_id, state.decision)
+            return state
+
     if state.confidence_score >= CONFIDENCE_THRESHOLD:
         if state.risk_result.get("passed", False):
             state.decision = "APPROVE"
@@ -212,31 +334,28 @@ def node_decide(state: AgentState) -> AgentState:
     else:
         state.decision = "NEEDS_HUMAN"
 
-    # Update workflow in DB
-    execute(
-        "UPDATE workflows SET status = %s, updated_at = now() WHERE workflow_id = %s",
-        (state.decision, state.workflow_id),
-    )
-
-    # Update new columns
-    execute(
-        "UPDATE workflows SET confidence_score = %s, decision = %s, reviewer = %s "
-        "WHERE workflow_id = %s",
-        (state.confidence_score, state.decision, "agent_controller", state.workflow_id),
-    )
+    if state.batch is not None:
+        state.batch.record(state, state.decision)
+    else:
+        state.write(
+            "UPDATE workflows SET status = %s, confidence_score = %s, decision = %s, "
+            "reviewer = %s, updated_at = now() WHERE workflow_id = %s",
+            (state.decision, state.confidence_score, state.decision, "agent_controller",
+             state.workflow_id),
+        )
 
-    log_audit(
-        kind="agent.decision",
-        ref_id=state.workflow_id,
-        data={
+    state.audit(
+        "agent.decision",
+        state.workflow_id,
+        {
             "decision": state.decision,
             "confidence_score": state.confidence_score,
             "symbol": state.symbol,
             "side": state.side,
             "qty": state.qty,
         },
-        correlation_id=state.correlation_id,
     )
+    state.commit()
     log.info(
         "DECIDE completed wf=%s decision=%s confidence=%.4f",
         state.workflow_id,
@@ -246,29 +365,43 @@ def node_decide(state: AgentState) -> AgentState:
     return state
 
 
-def node_execute_order(state: AgentState) -> AgentState:
-    """EXECUTE – If APPROVE, place the order via MCP/OMS."""
-    if state.decision != "APPROVE":
-        return state
-
-    state.order_result = _mcp_call(
-        "oms.place_order",
-        {"symbol": state.symbol, "side": state.side, "qty": state.qty},
-        state,
-    )
+async def node_execute_order(state: AgentState) -> AgentState:
+    """EXECUTE – Place the order via MCP/OMS (the graph runs it on APPROVE only).
+
+    The workflow_id is the order's idempotency key: if a previous attempt was
+    accepted by the OMS but its response was lost (timeout, cancellation), the
+    OMS returns that order instead of placing a second one. The order is also
+    checkpointed as soon as it is placed, so a resumed run that already has
+    ``order_result`` only records the fill.
+    """
+    if not state.order_result.get("order_id"):
+        state.order_result = await _mcp_call(
+            "oms.place_order",
+            {"symbol": state.symbol, "side": state.side, "qty": state.qty,
+             "workflow_id": state.workflow_id},
+            state,
+        )
+        if state.order_result.get("order_id"):
+            await asyncio.to_thread(
+                checkpointer.save, state.workflow_id, list(_BEFORE_EXECUTE),
+                _snapshot(state, _ORDER_FIELDS),
+            )
 
     order_id = state.order_result.get("order_id", "")
     if order_id:
         # Update workflow status to FILLED
-        execute(
-            "UPDATE workflows SET status = %s, updated_at = now() WHERE workflow_id = %s",
-            ("FILLED", state.workflow_id),
-        )
+        if state.batch is not None:
+            state.batch.record(state, "FILLED")
+        else:
+            state.write(
+                "UPDATE workflows SET status = %s, updated_at = now() WHERE workflow_id = %s",
+                ("FILLED", state.workflow_id),
+            )
         # Audit the fill
-        log_audit(
-            kind="order.filled",
-            ref_id=order_id,
-            data={
+        state.audit(
+            "order.filled",
+            order_id,
+            {
                 "workflow_id": state.workflow_id,
                 "order_id": order_id,
                 "symbol": state.symbol,
@@ -276,8 +409,8 @@ def node_execute_order(state: AgentState) -> AgentState:
                 "qty": state.qty,
                 "fill_price": state.order_result.get("fill_price"),
             },
-            correlation_id=state.correlation_id,
         )
+        await asyncio.to_thread(state.commit)
 
     log.info(
         "EXECUTE completed wf=%s order_id=%s",
@@ -290,24 +423,57 @@ def node_execute_order(state: AgentState) -> AgentState:
 # ── Graph Runner ─────────────────────────────────────────────────────
 
 GRAPH_NODES = [
-    ("PLAN", node_plan),
-    ("RETRIEVE", node_retrieve),
-    ("TOOL_CALLS", node_tool_calls),
-    ("EVALUATE", node_evaluate),
-    ("DECIDE", node_decide),
-    ("EXECUTE", node_execute_order),
+    # Cheap nodes are not checkpointed on their own: a resume simply reruns them
+    Node("PLAN", node_plan, timeout=NODE_TIMEOUT_S, outputs=("plan",), checkpoint=False),
+    Node(
+        "RETRIEVE", node_retrieve, deps=("PLAN",), timeout=NODE_TIMEOUT_S, required=False,
+        outputs=("rag_hits",),
+    ),
+    Node(
+        "TOOL_CALLS", node_tool_calls, deps=("PLAN",), timeout=NODE_TIMEOUT_S, required=False,
+        outputs=("price_result", "risk_result"),
+    ),
+    Node(
+        "EVALUATE", node_evaluate, deps=("RETRIEVE", "TOOL_CALLS"), timeout=NODE_TIMEOUT_S,
+        inputs=("rag_hits", "price_result", "risk_result"),
+        outputs=("confidence_score", "evaluation"), checkpoint=False,
+    ),
+    Node(
+        "DECIDE", node_decide, deps=("EVALUATE",), timeout=NODE_TIMEOUT_S,
+        inputs=("confidence_score", "risk_result"), outputs=("decision",),
+    ),
+    Node(
+        "EXECUTE", node_execute_order, deps=("DECIDE",), timeout=2 * NODE_TIMEOUT_S,
+        inputs=("decision",), outputs=("order_result",),
+        when=lambda state: state.decision == "APPROVE", checkpoint=False,
+    ),
 ]
+validate(GRAPH_NODES, AgentState.INITIAL_FIELDS)
+# What EXECUTE checkpoints once the order is placed (see node_execute_order)
+_BEFORE_EXECUTE = tuple(n.name for n in GRAPH_NODES if n.name != "EXECUTE")
+_ORDER_FIELDS = tuple(f for n in GRAPH_NODES for f in n.outputs)
+
+checkpointer: Checkpointer = make_checkpointer(CHECKPOINT_BACKEND)
+
 
+def _snapshot(state: AgentState, fields: Iterable[str]) -> Dict[str, Any]:
+    return state.to_dict((*fields, "pending_writes"))
 
-def run_agent_graph(
+
+async def run_agent_graph(
     symbol: str,
     side: str,
     qty: float,
     reason: str,
     workflow_id: str,
     correlation_id: str,
+    payload: Optional[Dict[str, Any]] = None,
 ) -> AgentState:
-    """Execute the full agent graph and return the final state."""
+    """Execute the full agent graph and return the final state.
+
+    With ``payload``, the workflow row is created first, so a run failing
+    before DECIDE still leaves a ``REQUESTED`` workflow behind.
+    """
     state = AgentState(
         symbol=symbol,
         side=side,
@@ -316,9 +482,30 @@ def run_agent_graph(
         workflow_id=workflow_id,
         correlation_id=correlation_id,
     )
+    if payload is not None:
+        await asyncio.to_thread(
+            execute,
+            "INSERT INTO workflows(workflow_id, status, payload, correlation_id) "
+            "VALUES (%s, %s, %s, %s) ON CONFLICT (workflow_id) DO NOTHING",
+            (workflow_id, "REQUESTED", json.dumps(payload), correlation_id),
+        )
+    return await run_state(state)
 
-    for node_name, node_fn in GRAPH_NODES:
-        log.info("Running node %s for wf=%s", node_name, workflow_id)
-        state = node_fn(state)
 
-    return state
+async def run_state(state: AgentState, completed: Iterable[str] = ()) -> AgentState:
+    """Run the graph over ``state``, skipping the ``completed`` nodes."""
+    return await run_graph(
+        GRAPH_NODES, state, state.workflow_id, _snapshot, checkpointer, completed=completed
+    )
+
+
+async def resume_agent_graph(workflow_id: str) -> Optional[AgentState]:
+    """Resume an interrupted run from its checkpoint; None if there is none."""
+    saved = await asyncio.to_thread(checkpointer.load, workflow_id)
+    if saved is None:
+        return None
+    completed, data = saved
+    log.info("resuming wf=%s after %s", workflow_id, completed)
+    state = AgentState.from_dict(data)
+    state.resumed = True
+    return await run_state(state, completed)
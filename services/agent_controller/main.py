@@ -1,29 +1,46 @@
 """Agent Controller – FastAPI service implementing an Agentic AI trade processor.
 
-POST /agent/trade  – submit a trade for autonomous agent processing
-GET  /health       – liveness probe
+POST /agent/trade                      – submit a trade for autonomous agent processing
+POST /agent/trades                     – process a basket of trades in one call
+POST /agent/trade/{workflow_id}/resume – resume an interrupted run from its checkpoint
+GET  /health                           – liveness probe
 """
 
-import json
+import os
 import uuid
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
-from services.common.db import execute
 from services.common.logging import setup_logging
 from services.common.metrics import install
-from services.agent_controller.graph import run_agent_graph
+from services.common.otel import new_correlation_id, span
+from services.agent_controller.batch import run_agent_batch
+from services.agent_controller.graph import (
+    AgentState,
+    mcp_client,
+    rag_client,
+    resume_agent_graph,
+    run_agent_graph,
+)
 
 log = setup_logging("agent-controller")
 
+BATCH_CONCURRENCY = int(os.getenv("AGENT_BATCH_CONCURRENCY", "16"))
+
 app = FastAPI(title="Agent Controller", version="0.1")
 install(app, "agent-controller")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await rag_client.aclose()
+    await mcp_client.aclose()
+
+
 # ── Schemas ──────────────────────────────────────────────────────────
 
 class AgentTradeRequest(BaseModel):
@@ -43,6 +60,18 @@ class AgentTradeResponse(BaseModel):
     status: str
 
 
+class AgentTradesRequest(BaseModel):
+    trades: List[AgentTradeRequest] = Field(..., min_length=1, max_length=500)
+
+
+class AgentTradeResult(AgentTradeResponse):
+    error: Optional[str] = None
+
+
+class AgentTradesResponse(BaseModel):
+    results: List[AgentTradeResult]
+
+
 # ── Endpoints ────────────────────────────────────────────────────────
 
 @app.get("/health")
@@ -59,37 +88,73 @@ def metrics():
 
 
 @app.post("/agent/trade", response_model=AgentTradeResponse)
-def agent_trade(req: AgentTradeRequest):
+async def agent_trade(req: AgentTradeRequest):
     """Submit a trade for autonomous agent processing.
 
     The agent controller:
-    1. Creates a workflow (status=REQUESTED)
-    2. Runs the LangGraph: PLAN → RETRIEVE → TOOL_CALLS → EVALUATE → DECIDE
-    3. If APPROVE: places the order via MCP/OMS
+    1. Creates the workflow, then runs the LangGraph:
+       PLAN → {RETRIEVE ∥ TOOL_CALLS} → EVALUATE → DECIDE
+    2. Commits the decision and the audit trail in one transaction
+    3. If APPROVE: places the order via MCP/OMS and commits the fill
     4. Returns the full result
     """
     workflow_id = str(uuid.uuid4())
-    correlation_id = str(uuid.uuid4())
+    correlation_id = new_correlation_id()
     payload = req.model_dump()
 
-    # Create workflow
-    execute(
-        "INSERT INTO workflows(workflow_id, status, payload) VALUES (%s, %s, %s)",
-        (workflow_id, "REQUESTED", json.dumps(payload)),
-    )
-    log.info("workflow created wf=%s corr=%s", workflow_id, correlation_id)
-
-    # Run the agent graph
-    state = run_agent_graph(
-        symbol=req.symbol,
-        side=req.side,
-        qty=req.qty,
-        reason=req.reason,
-        workflow_id=workflow_id,
-        correlation_id=correlation_id,
-    )
+    log.info("workflow started wf=%s corr=%s", workflow_id, correlation_id)
+
+    # Run the agent graph in the workflow's trace (linked to the caller's)
+    with span("agent.trade", correlation_id=correlation_id, workflow_id=workflow_id):
+        state = await run_agent_graph(
+            symbol=req.symbol,
+            side=req.side,
+            qty=req.qty,
+            reason=req.reason,
+            workflow_id=workflow_id,
+            correlation_id=correlation_id,
+            payload=payload,
+        )
 
-    # Build response
+    return _response(state)
+
+
+@app.post("/agent/trades", response_model=AgentTradesResponse)
+async def agent_trades(req: AgentTradesRequest):
+    """Run the agent graph for every trade of a basket, ``AGENT_BATCH_CONCURRENCY`` at a time.
+
+    Price and RAG lookups are shared per symbol; workflows are created with a
+    bulk INSERT and each decision is committed before its order is placed
+    (legs committing together share a bulk UPDATE). Results are in request
+    order; a trade whose graph or commit failed has status ERROR and an ``error``.
+    """
+    outcomes = await run_agent_batch([t.model_dump() for t in req.trades], BATCH_CONCURRENCY)
+    results = []
+    for state, error in outcomes:
+        if error is None:
+            results.append(AgentTradeResult(**_response(state).model_dump()))
+        else:
+            results.append(AgentTradeResult(
+                workflow_id=state.workflow_id,
+                correlation_id=state.correlation_id,
+                decision=state.decision,
+                confidence_score=state.confidence_score,
+                status="ERROR",
+                error=error,
+            ))
+    return AgentTradesResponse(results=results)
+
+
+@app.post("/agent/trade/{workflow_id}/resume", response_model=AgentTradeResponse)
+async def agent_trade_resume(workflow_id: str):
+    """Resume a run that failed or was interrupted, skipping the nodes it completed."""
+    state = await resume_agent_graph(workflow_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="no checkpoint for this workflow")
+    return _response(state)
+
+
+def _response(state: AgentState) -> AgentTradeResponse:
     order_id = state.order_result.get("order_id") if state.order_result else None
     fill_price = state.order_result.get("fill_price") if state.order_result else None
 
@@ -103,15 +168,15 @@ def agent_trade(req: AgentTradeRequest):
 
     log.info(
         "agent trade completed wf=%s decision=%s confidence=%.4f order=%s",
-        workflow_id,
+        state.workflow_id,
         state.decision,
         state.confidence_score,
         order_id,
     )
 
     return AgentTradeResponse(
-        workflow_id=workflow_id,
-        correlation_id=correlation_id,
+        workflow_id=state.workflow_id,
+        correlation_id=state.correlation_id,
         decision=state.decision,
         confidence_score=state.confidence_score,
         order_id=order_id,
@@ -1 +1 @@
-__all__ = ["config", "logging", "kafka", "db", "otel", "audit"]
+__all__ = ["config", "logging", "kafka", "db", "otel", "audit", "cache", "http"]
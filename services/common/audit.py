@@ -1,22 +1,158 @@
+import asyncio
 import hashlib
 import json
-from typing import Any, Dict
-from .db import execute
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+from .db import execute, execute_values
 from .kafka import publish
-from datetime import datetime, timezone
+from .logging import setup_logging
+from datetime import date, datetime, time, timezone
 import uuid
 
+log = setup_logging("audit")
+
+audit_buffer_pending = Gauge("audit_buffer_pending", "Audit rows waiting to be written")
+audit_flush_rows = Histogram(
+    "audit_flush_rows",
+    "Audit rows written per flush",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+audit_write_failures_total = Counter("audit_write_failures_total", "Failed audit flushes")
+
+def _json_default(value: Any) -> Any:
+    # Values found in DB rows and tool results; one spelling each, so hashes are stable
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# The C-accelerated stdlib encoder. Its output (sorted keys, ", " / ": "
+# separators, UTF-8) is what audit hashes have always been computed on, so
+# compact encoders like orjson cannot be swapped in without breaking them.
+_canonical = json.JSONEncoder(sort_keys=True, ensure_ascii=False, default=_json_default).encode
+
+def canonical_json(value: Any) -> str:
+    """Deterministic JSON of ``value``: what is stored and hashed for audit records."""
+    return _canonical(value)
+
 def _hash(data: Dict[str, Any]) -> str:
-    raw = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
-    return hashlib.sha256(raw).hexdigest()
+    return hashlib.sha256(canonical_json(data).encode("utf-8")).hexdigest()
+
+AUDIT_INSERT_SQL = (
+    "INSERT INTO audit_logs(kind, ref_id, data, hash, correlation_id) VALUES (%s,%s,%s,%s,%s)"
+)
+
+def audit_row(kind: str, ref_id: str, data: Dict[str, Any], correlation_id: str) -> Tuple[str, ...]:
+    """Parameters of AUDIT_INSERT_SQL, for callers writing it in their own transaction.
+
+    ``data`` is serialized once: the same string is stored and spliced into the
+    hashed document, which is byte-identical to ``canonical_json({"kind": ...,
+    "ref_id": ..., "data": data})`` (keys in sorted order: data, kind, ref_id).
+    """
+    data_json = _canonical(data)
+    doc = f'{{"data": {data_json}, "kind": {_canonical(kind)}, "ref_id": {_canonical(ref_id)}}}'
+    h = hashlib.sha256(doc.encode("utf-8")).hexdigest()
+    return (kind, ref_id, data_json, h, correlation_id)
 
 def log_audit(kind: str, ref_id: str, data: Dict[str, Any], correlation_id: str):
-    h = _hash({"kind": kind, "ref_id": ref_id, "data": data})
-    execute(
-        "INSERT INTO audit_logs(kind, ref_id, data, hash, correlation_id) VALUES (%s,%s,%s,%s,%s)",
-        (kind, ref_id, json.dumps(data), h, correlation_id),
-    )
-    return h
+    row = audit_row(kind, ref_id, data, correlation_id)
+    execute(AUDIT_INSERT_SQL, row)
+    return row[3]
+
+def log_audit_many(rows: Sequence[Tuple[str, ...]]) -> List[str]:
+    """Insert audit_row() tuples with one statement; returns their hashes."""
+    if rows:
+        execute_values(
+            "INSERT INTO audit_logs(kind, ref_id, data, hash, correlation_id) VALUES %s", rows
+        )
+    return [row[3] for row in rows]
+
+class BufferedAuditWriter:
+    """Takes audit rows off the request path and writes them in bulk.
+
+    ``submit()`` computes the hash immediately (callers return it) and queues
+    the row; rows are written with log_audit_many() every ``max_wait_ms`` or as
+    soon as ``max_batch`` are queued. Failed flushes keep their rows for the
+    next one. Beyond ``max_pending`` queued rows, submit() waits for a flush.
+    Rows still queued when the process dies are lost: call stop() on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 500,
+        max_wait_ms: float = 50.0,
+        max_pending: int = 10_000,
+        writer: Callable[[Sequence[Tuple[str, ...]]], Any] = log_audit_many,
+    ):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max(self.max_batch, max_pending)
+        self._writer = writer
+        self._pending: List[Tuple[str, ...]] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # The loop only keeps weak references to tasks: hold the flushes until done
+        self._flushes: Set["asyncio.Task[None]"] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop, self._lock = loop, asyncio.Lock()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, kind: str, ref_id: str, data: Dict[str, Any], correlation_id: str) -> str:
+        row = audit_row(kind, ref_id, data, correlation_id)
+        self._ensure_running()
+        if len(self._pending) >= self.max_pending:
+            await self.flush()  # back-pressure while the database lags
+        self._pending.append(row)
+        audit_buffer_pending.set(len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            task = self._loop.create_task(self._flush_logged())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return row[3]
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self._pending:
+                rows = self._pending[: self.max_batch]
+                del self._pending[: len(rows)]
+                try:
+                    await asyncio.to_thread(self._writer, rows)
+                except Exception:
+                    self._pending[:0] = rows
+                    audit_write_failures_total.inc()
+                    raise
+                finally:
+                    audit_buffer_pending.set(len(self._pending))
+                audit_flush_rows.observe(len(rows))
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            log.warning("audit flush failed pending=%d err=%r", len(self._pending), e)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.max_wait)
+            await self._flush_logged()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
 
 async def publish_audit(kind: str, ref_id: str, data: Dict[str, Any], correlation_id: str):
     h = log_audit(kind, ref_id, data, correlation_id)
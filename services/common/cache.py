@@ -0,0 +1,163 @@
+"""Small in-process LRU cache with TTL and byte-size bounds.
+
+Used by services that repeatedly compute the same expensive values
+(embeddings, retrieval results, ...). Thread-safe: FastAPI sync endpoints
+run on a threadpool, so every access goes through a lock.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+cache_requests_total = Counter(
+    "cache_requests_total",
+    "Cache lookups by outcome",
+    ["cache", "result"],
+)
+cache_evictions_total = Counter(
+    "cache_evictions_total",
+    "Cache evictions by reason",
+    ["cache", "reason"],
+)
+cache_bytes = Gauge(
+    "cache_bytes",
+    "Approximate size of cached values in bytes",
+    ["cache"],
+)
+cache_entries = Gauge(
+    "cache_entries",
+    "Number of entries currently cached",
+    ["cache"],
+)
+
+_MISSING = object()
+
+
+def approx_sizeof(value: Any) -> int:
+    """Rough recursive size estimate, good enough to bound memory."""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if hasattr(value, "nbytes"):  # numpy arrays
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            approx_sizeof(k) + approx_sizeof(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(approx_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Bounded by ``max_entries`` and/or ``max_bytes`` (0 disables a bound).
+    ``ttl`` of 0 disables expiry.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        max_bytes: int = 0,
+        ttl: float = 300.0,
+        sizeof: Callable[[Any], int] = approx_sizeof,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = cache_requests_total.labels(cache=name, result="hit")
+        self._miss_counter = cache_requests_total.labels(cache=name, result="miss")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires_at, _ = item
+                if expires_at and expires_at <= self._clock():
+                    self._remove(key, "expired")
+                    self._publish()
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    self._hit_counter.inc()
+                    return value
+            self.misses += 1
+            self._miss_counter.inc()
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return  # would evict everything else; not worth caching
+        expires_at = self._clock() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if key in self._data:
+                self._remove(key, None)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (
+                (self.max_entries and len(self._data) > self.max_entries)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest, "capacity")
+            self._publish()
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return None
+            self._remove(key, "invalidated")
+            self._publish()
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._data:
+                cache_evictions_total.labels(cache=self.name, reason="invalidated").inc(
+                    len(self._data)
+                )
+            self._data.clear()
+            self._bytes = 0
+            self._publish()
+
+    def _remove(self, key: Hashable, reason: Optional[str]) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+        if reason:
+            cache_evictions_total.labels(cache=self.name, reason=reason).inc()
+
+    def _publish(self) -> None:
+        cache_bytes.labels(cache=self.name).set(self._bytes)
+        cache_entries.labels(cache=self.name).set(len(self._data))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -11,8 +11,29 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "tradeops"
     POSTGRES_USER: str = "tradeops"
     POSTGRES_PASSWORD: str = "tradeops"
+    DB_POOL_MIN: int = 1
+    DB_POOL_MAX: int = 10
+
+    AUDIT_FLUSH_MS: float = 50.0
+    AUDIT_BATCH_MAX: int = 500
+    AUDIT_MAX_PENDING: int = 10000
+
+    MCP_TOOL_CONCURRENCY: int = 16
+
+    LOOP_LAG_INTERVAL_MS: float = 250.0  # 0 disables the event-loop monitor
+    LOOP_BLOCK_THRESHOLD_MS: float = 100.0
+    LOOP_WATCHDOG: bool = False  # log the loop thread's stack on stalls
+
+    TRACE_EXPORTER: str = "none"  # none | file | memory
+    TRACE_FILE: str = "traces.jsonl"
+    TRACE_SAMPLE_RATIO: float = 0.1
+    TRACE_TAIL_LATENCY_MS: float = 500.0  # 0 disables tail sampling
 
     KAFKA_BOOTSTRAP: str = "redpanda:9092"
+    EVENT_VALIDATION: str = "all"  # off | sample | all
+    EVENT_VALIDATION_SAMPLE_RATE: float = 0.1
+    EVENT_DLQ_TOPIC: str = "events.dlq"
+    EVENT_ENCODING: str = "json"  # json | msgpack
 
     LLM_PROVIDER: str = "mock"
     OPENAI_API_KEY: str = ""
@@ -22,4 +43,21 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_KEY: str = ""
     AZURE_OPENAI_DEPLOYMENT: str = ""
 
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_S: float = 3600.0
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_DIR: str = ""
+
+    LLM_PROMPT_TOKEN_BUDGET: int = 1500
+    LLM_MAX_OUTPUT_TOKENS: int = 300
+    MOCK_LLM_FIRST_TOKEN_DELAY_MS: float = 0.0
+    MOCK_LLM_TOKEN_DELAY_MS: float = 0.0
+
+    LLM_TIMEOUT_S: float = 30.0
+    LLM_RPM: int = 0
+    LLM_TPM: int = 0
+    REVIEW_CONCURRENCY: int = 4
+    REVIEW_QUEUE_MAX: int = 1000
+    REVIEW_BATCH_SIZE: int = 8
+
 settings = Settings()
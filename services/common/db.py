@@ -1,7 +1,11 @@
+import asyncio
+import threading
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from contextlib import contextmanager
 from .config import settings
+from .otel import span
 
 def dsn() -> str:
     return (
@@ -24,16 +28,86 @@ def conn_cursor(dict_cursor: bool = True):
         cur.close()
         conn.close()
 
+def _span(op: str, statement: str):
+    return span(f"db.{op}", "client", **{"db.system": "postgresql", "db.statement": statement[:500]})
+
 def fetchone(sql: str, params=None):
-    with conn_cursor() as (_, cur):
+    with _span("fetchone", sql), conn_cursor() as (_, cur):
         cur.execute(sql, params or ())
         return cur.fetchone()
 
 def fetchall(sql: str, params=None):
-    with conn_cursor() as (_, cur):
+    with _span("fetchall", sql), conn_cursor() as (_, cur):
         cur.execute(sql, params or ())
         return cur.fetchall()
 
 def execute(sql: str, params=None):
-    with conn_cursor(dict_cursor=False) as (_, cur):
+    with _span("execute", sql), conn_cursor(dict_cursor=False) as (_, cur):
+        cur.execute(sql, params or ())
+
+def execute_values(sql: str, rows, template=None, page_size: int = 500):
+    """Run ``sql`` with its ``VALUES %s`` expanded to ``rows`` in one statement per page."""
+    with _span("execute_values", sql), conn_cursor(dict_cursor=False) as (_, cur):
+        psycopg2.extras.execute_values(cur, sql, rows, template=template, page_size=page_size)
+
+def execute_transaction(statements):
+    """Run ``(sql, params)`` statements in one transaction, sent in a single round trip."""
+    if not statements:
+        return
+    statement = "; ".join(sql for sql, _ in statements)
+    with _span("transaction", statement), conn_cursor(dict_cursor=False) as (_, cur):
+        cur.execute(b";".join(cur.mogrify(sql, tuple(params or ())) for sql, params in statements))
+
+
+# ── Connection pool (for request paths) ─────────────────────────────
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted: make callers wait instead
+_pool_slots = threading.BoundedSemaphore(max(1, settings.DB_POOL_MAX))
+
+def get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                settings.DB_POOL_MIN, max(1, settings.DB_POOL_MAX), dsn()
+            )
+        return _pool
+
+@contextmanager
+def pooled_cursor(dict_cursor: bool = True):
+    """Like conn_cursor() but on a connection borrowed from the pool."""
+    with _pool_slots:
+        pool = get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            cur_factory = psycopg2.extras.RealDictCursor if dict_cursor else None
+            with conn.cursor(cursor_factory=cur_factory) as cur:
+                yield conn, cur
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+def _pooled(method: str, sql: str, params, dict_cursor: bool = True):
+    # Runs in a worker thread: asyncio.to_thread carries the caller's span over
+    with _span(method or "execute", sql), pooled_cursor(dict_cursor=dict_cursor) as (_, cur):
         cur.execute(sql, params or ())
+        return getattr(cur, method)() if method else None
+
+async def afetchone(sql: str, params=None):
+    """fetchone() on a pooled connection, run in a worker thread."""
+    return await asyncio.to_thread(_pooled, "fetchone", sql, params)
+
+async def afetchall(sql: str, params=None):
+    return await asyncio.to_thread(_pooled, "fetchall", sql, params)
+
+async def aexecute(sql: str, params=None):
+    await asyncio.to_thread(_pooled, "", sql, params, False)
@@ -0,0 +1,245 @@
+"""Shared outbound HTTP clients for service-to-service calls.
+
+`ServiceClient` keeps one pooled `httpx.AsyncClient` per downstream service
+(keep-alive, HTTP/2 when the ``h2`` package is installed) instead of opening a
+connection per call. Idempotent requests are retried on transport errors and
+502/503/504 with jittered exponential backoff, and every client has a
+`CircuitBreaker` so calls fail fast while a dependency is down instead of each
+one waiting for its timeout.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+from .logging import setup_logging
+from .otel import inject, span
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    HTTP2_AVAILABLE = False
+
+log = setup_logging("http-client")
+
+http_client_requests_total = Counter(
+    "http_client_requests_total",
+    "Outbound HTTP requests by target and outcome",
+    ["target", "outcome"],
+)
+http_client_retries_total = Counter(
+    "http_client_retries_total",
+    "Outbound HTTP request retries",
+    ["target"],
+)
+http_client_request_duration_seconds = Histogram(
+    "http_client_request_duration_seconds",
+    "Outbound HTTP request duration, retries included",
+    ["target"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+http_client_in_flight = Gauge(
+    "http_client_in_flight",
+    "Outbound HTTP requests in flight",
+    ["target"],
+)
+http_client_pool_connections = Gauge(
+    "http_client_pool_connections",
+    "Open connections in the client pool",
+    ["target"],
+)
+circuit_breaker_state = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0=closed, 1=half-open, 2=open)",
+    ["target"],
+)
+
+RETRY_STATUS = frozenset({502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected for ``reset_timeout`` seconds; then a single
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self.state = self.CLOSED
+        circuit_breaker_state.labels(target=name).set(self.state)
+
+    def _set(self, state: int) -> None:
+        if state != self.state:
+            log.warning("circuit %s: %d -> %d", self.name, self.state, state)
+        self.state = state
+        circuit_breaker_state.labels(target=self.name).set(state)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._set(self.HALF_OPEN)
+            self._trial = False
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                return False
+            self._trial = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial = False
+        self._set(self.CLOSED)
+
+    def record_abandoned(self) -> None:
+        """The call ended without an outcome (cancelled, unexpected error): a
+        pending trial counts as a failure, so a later trial can go through."""
+        if self.state == self.HALF_OPEN and self._trial:
+            self.record_failure()
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            self._set(self.OPEN)
+
+
+class ServiceClient:
+    """Pooled client for one downstream service, created lazily on first use."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 2.0,
+        retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(name)
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive
+        )
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        http_client_pool_connections.labels(target=name).set_function(self._pool_size)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=HTTP2_AVAILABLE and self._transport is None,
+                transport=self._transport,
+            )
+        return self._client
+
+    def _pool_size(self) -> float:
+        # httpx does not expose pool stats; read httpcore's pool when present
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        return float(len(getattr(pool, "connections", ()) or ()))
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries of concurrent callers
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def request(
+        self, method: str, path: str, idempotent: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request; only ``idempotent`` ones are retried.
+
+        Raises CircuitOpenError while the breaker is open, the last transport
+        error, or returns the last response (which may be an error status).
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        with span(f"{method} {self.name}{path}", "client", **{"http.target": path}) as s:
+            kwargs["headers"] = inject(dict(kwargs.get("headers") or {}))
+            resp = await self._attempts(method, path, attempts, kwargs)
+            s.set_attribute("http.status_code", resp.status_code)
+            return resp
+
+    async def _attempts(
+        self, method: str, path: str, attempts: int, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        http_client_in_flight.labels(target=self.name).inc()
+        try:
+            for attempt in range(attempts):
+                if not self.breaker.allow():
+                    http_client_requests_total.labels(target=self.name, outcome="rejected").inc()
+                    raise CircuitOpenError(f"circuit open for {self.name}")
+                last = attempt == attempts - 1
+                try:
+                    resp = await self.client.request(method, path, **kwargs)
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    http_client_requests_total.labels(target=self.name, outcome="error").inc()
+                    if last:
+                        raise
+                except BaseException:  # cancelled (wait_for, node timeout) or unexpected
+                    self.breaker.record_abandoned()
+                    raise
+                else:
+                    if resp.status_code < 500:
+                        self.breaker.record_success()
+                        http_client_requests_total.labels(target=self.name, outcome="ok").inc()
+                        return resp
+                    self.breaker.record_failure()
+                    http_client_requests_total.labels(target=self.name, outcome="error").inc()
+                    if last or resp.status_code not in RETRY_STATUS:
+                        return resp
+                http_client_retries_total.labels(target=self.name).inc()
+                await asyncio.sleep(self._backoff(attempt))
+            raise AssertionError("unreachable")  # pragma: no cover
+        finally:
+            http_client_in_flight.labels(target=self.name).dec()
+            http_client_request_duration_seconds.labels(target=self.name).observe(
+                time.perf_counter() - start
+            )
+
+    async def post(self, path: str, idempotent: bool = False, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, idempotent=idempotent, **kwargs)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,9 +1,11 @@
-import json
 import asyncio
 from typing import Any, Dict, Optional
 from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from .codec import decode, encode
 from .config import settings
 from .logging import setup_logging
+from .otel import from_kafka_headers, kafka_headers, span
+from .schemas import dead_letter, get_validator
 
 log = setup_logging("common.kafka")
 
@@ -13,12 +15,22 @@ async def get_producer() -> AIOKafkaProducer:
     return producer
 
 async def publish(topic: str, message: Dict[str, Any], key: Optional[str] = None) -> None:
-    producer = await get_producer()
-    try:
-        payload = json.dumps(message).encode("utf-8")
-        await producer.send_and_wait(topic, payload, key=(key.encode("utf-8") if key else None))
-    finally:
-        await producer.stop()
+    errors = get_validator().on_publish(topic, message)
+    if errors:
+        # Never put an invalid event on its topic: consumers would choke on it
+        log.error("invalid event topic=%s errors=%s -> %s", topic, errors, settings.EVENT_DLQ_TOPIC)
+        message = dead_letter(topic, message, errors, "publish")
+        topic = settings.EVENT_DLQ_TOPIC
+    with span(f"kafka.publish {topic}", "producer",
+              correlation_id=message.get("correlation_id"), **{"messaging.destination": topic}):
+        producer = await get_producer()
+        try:
+            payload = encode(message, settings.EVENT_ENCODING.lower())
+            await producer.send_and_wait(
+                topic, payload, key=(key.encode("utf-8") if key else None), headers=kafka_headers()
+            )
+        finally:
+            await producer.stop()
 
 def consumer(topics: list[str], group_id: str) -> AIOKafkaConsumer:
     return AIOKafkaConsumer(
@@ -34,10 +46,32 @@ async def consume_forever(cons: AIOKafkaConsumer, handler):
     try:
         async for msg in cons:
             try:
-                data = json.loads(msg.value.decode("utf-8"))
-                await handler(msg.topic, data)
+                try:
+                    data = decode(msg.value)
+                except ValueError as e:
+                    raw = (msg.value or b"").decode("utf-8", "replace")
+                    await _dead_letter(msg, raw, [f"undecodable: {e}"])
+                    continue
+                errors = get_validator().on_consume(msg.topic, data)
+                if errors:
+                    await _dead_letter(msg, data, errors)
+                    continue
+                with span(
+                    f"kafka.consume {msg.topic}", "consumer",
+                    parent=from_kafka_headers(getattr(msg, "headers", None)),
+                    correlation_id=data.get("correlation_id") if isinstance(data, dict) else None,
+                    **{"messaging.source": msg.topic},
+                ):
+                    await handler(msg.topic, data)
             except Exception as e:
                 log.exception("handler error topic=%s err=%s", msg.topic, e)
                 await asyncio.sleep(0.25)
     finally:
         await cons.stop()
+
+async def _dead_letter(msg, event: Any, errors: list[str]) -> None:
+    log.error("invalid event topic=%s offset=%s errors=%s -> %s",
+              msg.topic, msg.offset, errors, settings.EVENT_DLQ_TOPIC)
+    record = dead_letter(msg.topic, event, errors, "consume",
+                         partition=msg.partition, offset=msg.offset)
+    await publish(settings.EVENT_DLQ_TOPIC, record)
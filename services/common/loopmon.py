@@ -0,0 +1,146 @@
+"""Event-loop lag monitoring and blocking-call detection.
+
+`LoopMonitor` runs a task that sleeps ``interval`` seconds and measures how
+late it wakes up: that lag is the time the loop spent on other callbacks
+instead of scheduling this one, i.e. how long a blocking call (sync psycopg2,
+``requests``, heavy CPU) stalled every coroutine of the process. Lags go to
+``event_loop_lag_seconds``; those above ``block_threshold`` also count in
+``event_loop_blocked_total``.
+
+With ``watchdog`` on (LOOP_WATCHDOG), a daemon thread watches the task's
+heartbeat and, when the loop stays stuck beyond the threshold, logs the stack
+of the loop thread at that moment, which points at the blocking code. It
+costs one thread waking every ``block_threshold / 2``; the lag task alone is
+cheap enough to keep on everywhere.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Histogram
+
+from .config import settings
+from .logging import setup_logging
+
+log = setup_logging("common.loopmon")
+
+event_loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds",
+    "Delay of a scheduled event-loop wakeup",
+    ["service"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+event_loop_blocked_total = Counter(
+    "event_loop_blocked_total",
+    "Event-loop stalls longer than the blocking threshold",
+    ["service"],
+)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        service: str,
+        interval: float = 0.25,
+        block_threshold: float = 0.1,
+        watchdog: bool = False,
+    ):
+        self.service = service
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.watchdog = watchdog
+        self.stacks_dumped = 0
+        self._lag = event_loop_lag_seconds.labels(service=service)
+        self._blocked = event_loop_blocked_total.labels(service=service)
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._beat = time.perf_counter()
+        self._loop_thread = 0
+
+    def start(self) -> None:
+        """Start on the running loop (call from a coroutine or startup hook)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.watchdog:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._watch, name=f"loop-watchdog-{self.service}", daemon=True
+            )
+            self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.perf_counter()
+            lag = max(0.0, now - start - self.interval)
+            self._lag.observe(lag)
+            if lag >= self.block_threshold:
+                self._blocked.inc()
+                log.warning("event loop blocked service=%s lag_ms=%.0f", self.service, lag * 1000)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.block_threshold / 2):
+            beat = self._beat
+            stalled = time.perf_counter() - beat - self.interval
+            if stalled < self.block_threshold or reported == beat:
+                continue
+            reported = beat  # one dump per stall
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self.stacks_dumped += 1
+            log.warning(
+                "event loop stuck for %.0f ms service=%s, loop thread stack:\n%s",
+                stalled * 1000, self.service, "".join(traceback.format_stack(frame)),
+            )
+
+
+_monitors: Dict[int, LoopMonitor] = {}
+
+
+def start_loop_monitor(service: str) -> Optional[LoopMonitor]:
+    """Start the monitor of the running loop from settings (once per loop)."""
+    if settings.LOOP_LAG_INTERVAL_MS <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    monitor = _monitors.get(id(loop))
+    if monitor is None:
+        monitor = LoopMonitor(
+            service,
+            interval=settings.LOOP_LAG_INTERVAL_MS / 1000.0,
+            block_threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000.0,
+            watchdog=settings.LOOP_WATCHDOG,
+        )
+        _monitors[id(loop)] = monitor
+    monitor.start()
+    return monitor
+
+
+def install(app, service_name: str) -> None:
+    """Run the loop monitor for the lifetime of a FastAPI app."""
+    async def _start():
+        start_loop_monitor(service_name)
+
+    async def _stop():
+        monitor = _monitors.pop(id(asyncio.get_running_loop()), None)
+        if monitor is not None:
+            await monitor.stop()
+
+    app.add_event_handler("startup", _start)
+    app.add_event_handler("shutdown", _stop)
@@ -1,6 +1,22 @@
+"""HTTP metrics for the FastAPI services.
+
+`install()` adds a plain ASGI middleware (no BaseHTTPMiddleware task/stream
+overhead). The ``path`` label is the matched route template, e.g.
+``/trade-requests/{workflow_id}``, never the raw URL, so the number of series
+is bounded by the number of routes; requests that match no route (404s, docs)
+share ``<unmatched>``. The ``method`` label is one of the standard methods or
+``OTHER``, so arbitrary client methods cannot add series either.
+``/metrics`` and ``/health`` are not measured. Label
+children are cached per (method, path, status), so a request costs a dict
+lookup plus the Prometheus updates.
+"""
+
 import time
-from fastapi import Request
-from prometheus_client import Counter, Histogram
+from typing import Any, Dict, Iterable, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from . import loopmon, otel
 
 http_requests_total = Counter(
     "http_requests_total",
@@ -13,14 +29,80 @@ http_request_duration_seconds = Histogram(
     ["service", "method", "path"],
     buckets=(0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2,5,10),
 )
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being served",
+    ["service"],
+)
+http_response_size_bytes = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size in bytes",
+    ["service", "method", "path"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+
+UNMATCHED = "<unmatched>"
+METHODS = frozenset(("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"))
+SKIP_PATHS = ("/metrics", "/health")
+
+
+class MetricsMiddleware:
+    def __init__(self, app, service: str, skip_paths: Iterable[str] = SKIP_PATHS):
+        self.app = app
+        self.service = service
+        self.skip_paths = frozenset(skip_paths)
+        self._in_flight = 0
+        # Read at scrape time: no gauge update on the request path
+        http_requests_in_flight.labels(service=service).set_function(lambda: self._in_flight)
+        self._series: Dict[Tuple[str, str, int], Tuple[Any, Any, Any]] = {}
+
+    def _children(self, method: str, path: str, status: int) -> Tuple[Any, Any, Any]:
+        key = (method, path, status)
+        children = self._series.get(key)
+        if children is None:
+            labels = {"service": self.service, "method": method, "path": path}
+            children = (
+                http_requests_total.labels(status=str(status), **labels),
+                http_request_duration_seconds.labels(**labels),
+                http_response_size_bytes.labels(**labels),
+            )
+            self._series[key] = children
+        return children
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # if the app fails before responding
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        self._in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._in_flight -= 1
+            # The router stores the matched route in the (shared) scope
+            path = getattr(scope.get("route"), "path", None) or UNMATCHED
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            count, duration, sizes = self._children(method, path, status)
+            count.inc()
+            duration.observe(elapsed)
+            sizes.observe(size)
+
 
 def install(app, service_name: str):
-    @app.middleware("http")
-    async def metrics_middleware(request: Request, call_next):
-        start = time.time()
-        response = await call_next(request)
-        elapsed = time.time() - start
-        path = request.url.path
-        http_requests_total.labels(service=service_name, method=request.method, path=path, status=str(response.status_code)).inc()
-        http_request_duration_seconds.labels(service=service_name, method=request.method, path=path).observe(elapsed)
-        return response
+    """HTTP metrics, event-loop lag monitoring (see loopmon) and tracing (see otel)."""
+    app.add_middleware(MetricsMiddleware, service=service_name)
+    loopmon.install(app, service_name)
+    otel.install(app, service_name)
@@ -1,2 +1,410 @@
-# Minimal hook: if you later plug OpenTelemetry Collector, instrument services here.
-# Kept intentionally lightweight for a portable demo.
+"""Lightweight distributed tracing, wire-compatible with OpenTelemetry.
+
+Spans carry W3C trace context (``traceparent: 00-<trace_id>-<span_id>-<flags>``)
+across HTTP calls (`inject()` / `extract()`, the tracing middleware) and Kafka
+messages (`kafka_headers()` / `from_kafka_headers()`), so an OpenTelemetry
+collector or SDK on either side joins the same trace. A workflow's trace is
+its correlation_id: the id is a fresh UUID per workflow (never derived from
+the caller's trace), and ``span(correlation_id=...)`` starts the work in that
+trace, linked to the request that triggered it; a span started for an event
+without trace headers reuses the trace of its ``correlation_id``.
+
+Sampling keeps the cost low: the head decision is a function of the trace id
+(every service agrees without coordination, TRACE_SAMPLE_RATIO), and spans of
+unsampled traces are still exported when they fail or take longer than
+TRACE_TAIL_LATENCY_MS (tail sampling, per span). Finished spans go to an
+exporter: ``file`` (JSON lines at TRACE_FILE, appended by a background
+thread; see scripts/trace_report.py), ``memory`` (in-process collector, for
+tests and offline runs) or ``none``, in which case `span()` is a no-op.
+"""
+
+import asyncio
+import atexit
+import functools
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from prometheus_client import Counter
+
+from .config import settings
+
+TRACEPARENT = "traceparent"
+
+trace_spans_total = Counter(
+    "trace_spans_total",
+    "Finished spans by sampling outcome",
+    ["outcome"],
+)
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+class Span:
+    __slots__ = (
+        "name", "kind", "service", "context", "parent_id", "attributes",
+        "start_ns", "end_ns", "error",
+    )
+
+    def __init__(self, name, kind, service, context, parent_id, attributes):
+        self.name = name
+        self.kind = kind
+        self.service = service
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = repr(exc)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.service,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class _NoopSpan:
+    context = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+# ── Exporters ────────────────────────────────────────────────────────
+
+class MemoryExporter:
+    """In-process collector: keeps finished spans as dicts."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self.spans.append(span)
+
+    def flush(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        self.spans = []
+
+
+class FileExporter:
+    """Appends spans as JSON lines from a background thread.
+
+    export() only queues the line: the writer thread appends the queued lines
+    to ``path`` as soon as ``max_buffer`` are waiting, or every ``max_wait_ms``,
+    so no file I/O happens on the event loop that finished the span. flush()
+    writes whatever is queued (also at exit).
+    """
+
+    def __init__(self, path: str, max_buffer: int = 100, max_wait_ms: float = 1000.0):
+        self.path = path
+        self.max_buffer = max(1, max_buffer)
+        self.max_wait = max_wait_ms / 1000.0
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        # Held from taking a batch to writing it, so batches land in order
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-file-exporter", daemon=True
+                )
+                self._thread.start()
+            if len(self._buffer) < self.max_buffer:
+                return
+        self._wake.set()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if lines:
+                self._write(lines)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.max_wait)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError:
+                pass  # tracing is best effort: drop the batch, keep the thread
+
+    def _write(self, lines: List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def make_exporter(kind: str, path: str = ""):
+    kind = kind.lower()
+    if kind == "file":
+        return FileExporter(path)
+    if kind == "memory":
+        return MemoryExporter()
+    if kind in ("", "none", "off"):
+        return None
+    raise ValueError(f"unknown TRACE_EXPORTER: {kind}")
+
+
+_exporter: Any = make_exporter(settings.TRACE_EXPORTER, settings.TRACE_FILE)
+_service = "unknown"
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter) -> None:
+    """Replace the exporter (None disables tracing)."""
+    global _exporter
+    _exporter = exporter
+
+
+def set_service(name: str) -> None:
+    global _service
+    _service = name
+
+
+# ── Spans ────────────────────────────────────────────────────────────
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _head_sampled(trace_id: str) -> bool:
+    # Same decision in every service for a given trace
+    return int(trace_id[:16], 16) < settings.TRACE_SAMPLE_RATIO * 2**64
+
+
+def trace_id_for(correlation_id: Optional[str]) -> Optional[str]:
+    """The trace id of a UUID correlation_id, None if it is not a UUID."""
+    if not correlation_id:
+        return None
+    try:
+        return uuid.UUID(correlation_id).hex
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def new_correlation_id() -> str:
+    """A new workflow correlation_id (random UUID, whatever the tracing config).
+
+    Run the workflow's work in ``span(..., correlation_id=...)`` so it lands in
+    the trace of that id, linked to the caller's trace.
+    """
+    return str(uuid.uuid4())
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: str = "internal",
+    parent: Optional[SpanContext] = None,
+    correlation_id: Optional[str] = None,
+    **attributes: Any,
+) -> Iterator[Any]:
+    """Run the block in a child span of ``parent``, or of the current span.
+
+    ``correlation_id`` names the business trace: when the current span belongs
+    to another trace (e.g. an approval request about an older workflow), the
+    span starts in the correlation's trace instead, with a ``link.trace_id``
+    attribute pointing back. Without parent or current span, the span starts
+    the correlation's trace (or a new one). Exceptions are recorded on the span
+    and re-raised.
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+    current = _current.get()
+    ctx = parent or (current.context if current is not None else None)
+    if parent is None and ctx is not None and correlation_id:
+        linked = trace_id_for(correlation_id)
+        if linked is not None and linked != ctx.trace_id:
+            attributes["link.trace_id"] = ctx.trace_id
+            ctx = None
+    if ctx is not None:
+        trace_id, parent_id, sampled = ctx.trace_id, ctx.span_id, ctx.sampled
+    else:
+        trace_id = trace_id_for(correlation_id) or _new_id(128)
+        parent_id, sampled = None, _head_sampled(trace_id)
+    s = Span(name, kind, _service, SpanContext(trace_id, _new_id(64), sampled), parent_id,
+             attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _finish(exporter, s)
+
+
+def _finish(exporter, s: Span) -> None:
+    if s.context.sampled:
+        outcome = "head"
+    elif s.error or (
+        settings.TRACE_TAIL_LATENCY_MS > 0 and s.duration_ms >= settings.TRACE_TAIL_LATENCY_MS
+    ):
+        outcome = "tail"
+        s.attributes["sampling"] = "tail"
+    else:
+        trace_spans_total.labels(outcome="dropped").inc()
+        return
+    trace_spans_total.labels(outcome=outcome).inc()
+    exporter.export(s.to_dict())
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """Decorator: run a function (sync or async) in a span."""
+    def wrap(fn):
+        span_name = name or fn.__qualname__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+# ── Propagation ──────────────────────────────────────────────────────
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the current span's traceparent to ``headers`` (returned for chaining)."""
+    s = _current.get()
+    if s is not None:
+        headers[TRACEPARENT] = s.context.traceparent()
+    return headers
+
+
+def extract(headers: Mapping[str, str]) -> Optional[SpanContext]:
+    return parse_traceparent(headers.get(TRACEPARENT))
+
+
+def kafka_headers() -> List[Tuple[str, bytes]]:
+    s = _current.get()
+    if s is None:
+        return []
+    return [(TRACEPARENT, s.context.traceparent().encode("ascii"))]
+
+
+def from_kafka_headers(headers: Optional[Sequence[Tuple[str, bytes]]]) -> Optional[SpanContext]:
+    for key, value in headers or ():
+        if key == TRACEPARENT and value:
+            return parse_traceparent(value.decode("ascii", "replace"))
+    return None
+
+
+# ── HTTP server spans ────────────────────────────────────────────────
+
+class TracingMiddleware:
+    """Server span per request, child of the caller's ``traceparent`` if any."""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics", "/health")):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+        parent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with span(scope["method"], "server", parent=parent) as s:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None) or scope["path"]
+                s.name = f"{scope['method']} {route}"
+                s.set_attribute("http.route", route)
+                s.set_attribute("http.status_code", status)
+                if status >= 500 and s.error is None:
+                    s.error = f"HTTP {status}"
+
+
+def install(app, service_name: str) -> None:
+    set_service(service_name)
+    app.add_middleware(TracingMiddleware)
@@ -0,0 +1,239 @@
+"""Event validation against `schemas/events/*.schema.json`.
+
+Each schema is compiled once into nested closures (one per schema node), so
+validating an event is a handful of isinstance checks and dict lookups rather
+than a walk of the schema document. The compiler covers the JSON Schema subset
+the event schemas use: ``type``, ``enum``, ``const``, ``required``,
+``properties``, ``additionalProperties``, ``items``, ``minimum`` / ``maximum``
+and ``minLength`` / ``maxLength``. ``format`` is an annotation, as in draft
+2020-12, and is not checked.
+
+`EventValidator` applies the schemas on publish (``EVENT_VALIDATION``: ``off``,
+``sample`` or ``all``) and on consume (any mode but ``off``); `dead_letter()`
+builds the record sent to ``EVENT_DLQ_TOPIC`` for an event that fails.
+"""
+
+import json
+import random
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from .config import settings
+from .logging import setup_logging
+
+log = setup_logging("common.schemas")
+
+events_validated_total = Counter(
+    "events_validated_total",
+    "Events validated against their schema",
+    ["topic", "stage", "result"],
+)
+events_dead_lettered_total = Counter(
+    "events_dead_lettered_total",
+    "Events sent to the dead-letter topic",
+    ["topic", "stage"],
+)
+
+SCHEMA_DIR = Path(__file__).resolve().parents[2] / "schemas" / "events"
+MODES = ("off", "sample", "all")
+
+# (value, path, errors) -> None; appends one message per problem to errors
+Check = Callable[[Any, str, List[str]], None]
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+# ── Compiler ─────────────────────────────────────────────────────────
+
+def _compile_type(names: List[str]) -> Check:
+    tests = [_TYPES[n] for n in names]
+    expected = " or ".join(names)
+
+    def check(value, path, errors):
+        for test in tests:
+            if test(value):
+                return
+        errors.append(f"{path}: expected {expected}, got {type(value).__name__}")
+
+    return check
+
+
+def _compile_object(schema: Dict[str, Any]) -> Check:
+    required = tuple(schema.get("required", ()))
+    props = {name: compile_schema(sub) for name, sub in schema.get("properties", {}).items()}
+    extra = schema.get("additionalProperties", True)
+    extra_check = compile_schema(extra) if isinstance(extra, dict) else None
+    closed = extra is False
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return  # reported by the type check
+        for name in required:
+            if name not in value:
+                errors.append(f"{path}: missing required property '{name}'")
+        for name, item in value.items():
+            sub = props.get(name)
+            if sub is not None:
+                sub(item, f"{path}.{name}", errors)
+            elif closed:
+                errors.append(f"{path}: unexpected property '{name}'")
+            elif extra_check is not None:
+                extra_check(item, f"{path}.{name}", errors)
+
+    return check
+
+
+def compile_schema(schema: Dict[str, Any]) -> Check:
+    """Compile one schema node into a check function."""
+    checks: List[Check] = []
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        unknown = [n for n in names if n not in _TYPES]
+        if unknown:
+            raise ValueError(f"unsupported schema type: {unknown}")
+        checks.append(_compile_type(names))
+    if "enum" in schema or "const" in schema:
+        allowed = list(schema["enum"]) if "enum" in schema else [schema["const"]]
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} is not one of {allowed}")
+
+        checks.append(check_enum)
+    if "required" in schema or "properties" in schema or "additionalProperties" in schema:
+        checks.append(_compile_object(schema))
+    if isinstance(schema.get("items"), dict):
+        item_check = compile_schema(schema["items"])
+
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    item_check(item, f"{path}[{i}]", errors)
+
+        checks.append(check_items)
+    bounds = [(k, schema[k]) for k in ("minimum", "maximum") if k in schema]
+    if bounds:
+        def check_bounds(value, path, errors):
+            if not _TYPES["number"](value):
+                return
+            for key, limit in bounds:
+                if (value < limit) if key == "minimum" else (value > limit):
+                    errors.append(f"{path}: {value} violates {key} {limit}")
+
+        checks.append(check_bounds)
+    lengths = [(k, schema[k]) for k in ("minLength", "maxLength") if k in schema]
+    if lengths:
+        def check_length(value, path, errors):
+            if not isinstance(value, str):
+                return
+            for key, limit in lengths:
+                if (len(value) < limit) if key == "minLength" else (len(value) > limit):
+                    errors.append(f"{path}: length {len(value)} violates {key} {limit}")
+
+        checks.append(check_length)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path, errors):
+        for c in checks:
+            c(value, path, errors)
+
+    return check_all
+
+
+# ── Registry ─────────────────────────────────────────────────────────
+
+class SchemaRegistry:
+    """Compiled event schemas keyed by topic (the schema file name)."""
+
+    def __init__(self, directory: Path = SCHEMA_DIR):
+        self._checks: Dict[str, Check] = {}
+        if not directory.is_dir():
+            log.warning("no event schemas found in %s: events are not validated", directory)
+            return
+        for path in sorted(directory.glob("*.schema.json")):
+            topic = path.name[: -len(".schema.json")]
+            self._checks[topic] = compile_schema(json.loads(path.read_text(encoding="utf-8")))
+
+    @property
+    def topics(self) -> List[str]:
+        return sorted(self._checks)
+
+    def validate(self, topic: str, event: Any) -> Optional[List[str]]:
+        """Errors of ``event`` (empty when valid), None if ``topic`` has no schema."""
+        check = self._checks.get(topic)
+        if check is None:
+            return None
+        errors: List[str] = []
+        check(event, "$", errors)
+        return errors
+
+
+class EventValidator:
+    """Applies a `SchemaRegistry` according to the validation mode."""
+
+    def __init__(self, registry: SchemaRegistry, mode: str = "all", sample_rate: float = 0.1):
+        if mode not in MODES:
+            raise ValueError(f"EVENT_VALIDATION must be one of {MODES}, got {mode!r}")
+        self.registry = registry
+        self.mode = mode
+        self.sample_rate = sample_rate
+
+    def _validate(self, topic: str, event: Any, stage: str) -> List[str]:
+        errors = self.registry.validate(topic, event)
+        if errors is None:
+            return []
+        events_validated_total.labels(
+            topic=topic, stage=stage, result="invalid" if errors else "valid"
+        ).inc()
+        return errors
+
+    def on_publish(self, topic: str, event: Any) -> List[str]:
+        if self.mode == "off" or (self.mode == "sample" and random.random() >= self.sample_rate):
+            return []
+        return self._validate(topic, event, "publish")
+
+    def on_consume(self, topic: str, event: Any) -> List[str]:
+        if self.mode == "off":
+            return []
+        return self._validate(topic, event, "consume")
+
+
+_validator: Optional[EventValidator] = None
+
+
+def get_validator() -> EventValidator:
+    """Process-wide validator, built from settings on first use."""
+    global _validator
+    if _validator is None:
+        _validator = EventValidator(
+            SchemaRegistry(),
+            mode=settings.EVENT_VALIDATION.lower(),
+            sample_rate=settings.EVENT_VALIDATION_SAMPLE_RATE,
+        )
+    return _validator
+
+
+def dead_letter(topic: str, event: Any, errors: List[str], stage: str, **extra: Any) -> Dict[str, Any]:
+    """Dead-letter record of an invalid ``event`` (a decoded event or its raw text)."""
+    events_dead_lettered_total.labels(topic=topic, stage=stage).inc()
+    return {
+        "topic": topic,
+        "stage": stage,
+        "errors": errors,
+        "event": event,
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+        **extra,
+    }
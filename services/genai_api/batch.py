@@ -0,0 +1,114 @@
+"""Packing several trade reviews into one structured LLM call.
+
+`pack_by_symbol()` splits the trades into packs without splitting a symbol
+when it can be avoided; `build_batch_prompt()` lists the trades of a pack with the union of their
+retrieved documents and asks for a JSON array with one object per workflow;
+`parse_batch_response()` extracts it and keeps only well-formed items, so the
+caller can fall back to individual reviews for whatever is missing.
+"""
+
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .llm import estimate_tokens, fit_context
+
+Hit = Tuple[str, str, float]
+
+BATCH_SYSTEM_PROMPT = (
+    "Tu es un assistant Risk/Compliance. Tu dois être factuel, citer les documents internes. "
+    "Réponds uniquement avec un tableau JSON valide, sans texte autour."
+)
+
+_REQUIRED = ("workflow_id", "summary", "risk_notes", "recommendation")
+
+
+def pack_by_symbol(groups: Sequence[Sequence[Any]], size: int) -> List[List[Any]]:
+    """Split per-symbol ``groups`` of trades into packs of at most ``size``.
+
+    A group that does not fit in the current pack starts a new one, so a
+    symbol's trades share a pack (and its documents) unless the symbol alone
+    has more than ``size`` trades.
+    """
+    packs: List[List[Any]] = []
+    current: List[Any] = []
+    for group in groups:
+        if current and len(current) + len(group) > size:
+            packs.append(current)
+            current = []
+        current.extend(group)
+        while len(current) > size:
+            packs.append(current[:size])
+            current = current[size:]
+    if current:
+        packs.append(current)
+    return packs
+
+
+def build_batch_prompt(
+    trades: Sequence[Any],
+    hits_by_symbol: Dict[str, List[Hit]],
+    budget_tokens: int,
+) -> Tuple[str, str, List[str]]:
+    """Return (system, user, sources) for one pack of ``trades``."""
+    lines = [
+        f"- workflow_id: {t.workflow_id} | symbol: {t.symbol} | side: {t.side} "
+        f"| qty: {t.qty} | reason: {t.reason}"
+        for t in trades
+    ]
+    # Same documents often come back for several symbols: send each once
+    docs: Dict[str, Hit] = {}
+    for t in trades:
+        for doc_id, snippet, score in hits_by_symbol.get(t.symbol, []):
+            if doc_id not in docs or docs[doc_id][2] < score:
+                docs[doc_id] = (doc_id, snippet, score)
+
+    template = _user_prompt("\n".join(lines), "")
+    hits = fit_context(
+        list(docs.values()), budget_tokens - estimate_tokens(BATCH_SYSTEM_PROMPT, template)
+    )
+    context = "\n\n".join(f"[{doc_id}]\n{snippet}" for doc_id, snippet, _ in hits)
+    return BATCH_SYSTEM_PROMPT, _user_prompt("\n".join(lines), context), [h[0] for h in hits]
+
+
+def _user_prompt(trades: str, context: str) -> str:
+    return f"""Demandes trade:
+{trades}
+
+Documents internes (extraits):
+{context}
+
+Pour CHAQUE demande, rédige une revue courte. Réponds avec un tableau JSON:
+[{{"workflow_id": "...", "summary": "...", "risk_notes": "...",
+  "recommendation": "approve|reject + justification", "sources": ["doc ids"]}}]
+"""
+
+
+def parse_batch_response(text: str, expected: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Map workflow_id -> review for every well-formed item of the JSON answer."""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        items = json.loads(text[start : end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    wanted = set(expected)
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        if not isinstance(item, dict) or not all(isinstance(item.get(k), str) for k in _REQUIRED):
+            continue
+        if item["workflow_id"] in wanted:
+            sources = item.get("sources")
+            item["sources"] = [s for s in sources if isinstance(s, str)] if isinstance(sources, list) else []
+            out[item["workflow_id"]] = item
+    return out
+
+
+def format_review(item: Dict[str, Any]) -> str:
+    return (
+        f"summary: {item['summary']}\n"
+        f"risk_notes: {item['risk_notes']}\n"
+        f"recommendation: {item['recommendation']}"
+    )
@@ -1,12 +1,67 @@
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+from prometheus_client import Histogram
 from services.common.config import settings
 
+llm_time_to_first_token_seconds = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request to first streamed token",
+    ["provider"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+llm_tokens_per_second = Histogram(
+    "llm_tokens_per_second",
+    "Streaming generation rate after the first token",
+    ["provider"],
+    buckets=(1, 5, 10, 20, 50, 100, 200, 500),
+)
+
+def estimate_tokens(*texts: str) -> int:
+    """Cheap token estimate (~4 chars per token) for budgets and rate limiting."""
+    return sum(len(t) for t in texts) // 4 + 1
+
 class LLM:
+    provider: str = "unknown"
+    model: str = "unknown"
+
     async def complete(self, system: str, user: str) -> str:
         raise NotImplementedError
 
+    async def stream(self, system: str, user: str) -> AsyncIterator[str]:
+        # Providers without native streaming deliver the whole answer as one chunk
+        yield await self.complete(system, user)
+
+# A packed review prompt (see batch.py) lists its trades and documents like this
+_BATCH_TRADE = re.compile(r"^- workflow_id: (\S+) \|", re.M)
+_DOC_ID = re.compile(r"^\[([^\]\n]+)\]$", re.M)
+
 class MockLLM(LLM):
+    provider = "mock"
+    model = "mock"
+
+    def __init__(self, first_token_delay_ms: float = 0.0, token_delay_ms: float = 0.0):
+        self.first_token_delay = first_token_delay_ms / 1000.0
+        self.token_delay = token_delay_ms / 1000.0
+
     async def complete(self, system: str, user: str) -> str:
         # Deterministic mock, useful for running without keys.
+        ids = _BATCH_TRADE.findall(user)
+        if ids:
+            # Answer packed prompts the way a real model should: one JSON review per trade
+            sources = _DOC_ID.findall(user)
+            return json.dumps([
+                {
+                    "workflow_id": wf,
+                    "summary": "Revue générée en mode dégradé (mock).",
+                    "risk_notes": "see summary",
+                    "recommendation": "approve (mock)",
+                    "sources": sources,
+                }
+                for wf in ids
+            ], ensure_ascii=False)
         return (
             "MOCK_LLM_RESPONSE\n"
             "System: " + system[:120] + "\n"
@@ -14,10 +69,78 @@ class MockLLM(LLM):
             "Conclusion: Revue générée en mode dégradé (mock)."
         )
 
-def get_llm() -> LLM:
+    async def stream(self, system: str, user: str) -> AsyncIterator[str]:
+        # Same text as complete(), one word (with its trailing whitespace) per token
+        text = await self.complete(system, user)
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for i, tok in enumerate(re.findall(r"\S+\s*", text)):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield tok
+
+async def metered_stream(
+    llm: LLM, system: str, user: str, max_tokens: int = 0
+) -> AsyncIterator[str]:
+    """Stream from ``llm``, recording TTFT / tokens-per-second, stopping at ``max_tokens``."""
+    start = time.perf_counter()
+    first: Optional[float] = None
+    n = 0
+    agen = llm.stream(system, user)
+    try:
+        async for tok in agen:
+            if first is None:
+                first = time.perf_counter()
+                llm_time_to_first_token_seconds.labels(provider=llm.provider).observe(first - start)
+            n += 1
+            yield tok
+            if max_tokens and n >= max_tokens:
+                break  # output budget spent: stop paying for generation
+    finally:
+        await agen.aclose()
+        if first is not None and n > 1:
+            elapsed = time.perf_counter() - first
+            if elapsed > 0:
+                llm_tokens_per_second.labels(provider=llm.provider).observe((n - 1) / elapsed)
+
+def fit_context(
+    hits: List[Tuple[str, str, float]], budget_tokens: int
+) -> List[Tuple[str, str, float]]:
+    """Keep the most relevant hits that fit in ``budget_tokens``.
+
+    Hits are taken by decreasing score; the first hit that does not fit is
+    truncated to the remaining budget, the rest are dropped.
+    """
+    kept: List[Tuple[str, str, float]] = []
+    left = budget_tokens
+    for doc_id, snippet, score in sorted(hits, key=lambda h: h[2], reverse=True):
+        cost = estimate_tokens(f"[{doc_id}]\n", snippet)
+        if cost <= left:
+            kept.append((doc_id, snippet, score))
+            left -= cost
+            continue
+        room = (left - estimate_tokens(f"[{doc_id}]\n")) * 4
+        if room > 0:
+            kept.append((doc_id, snippet[:room], score))
+        break
+    return kept
+
+def _provider_llm() -> LLM:
     provider = (settings.LLM_PROVIDER or "mock").lower()
     # Stubs: you can implement real calls later without changing integration contracts.
     if provider == "mock":
-        return MockLLM()
+        return MockLLM(settings.MOCK_LLM_FIRST_TOKEN_DELAY_MS, settings.MOCK_LLM_TOKEN_DELAY_MS)
     # If keys missing, fallback to mock
     return MockLLM()
+
+def get_llm() -> LLM:
+    llm = _provider_llm()
+    if not settings.LLM_CACHE_ENABLED:
+        return llm
+    from .llm_cache import CachedLLM
+    return CachedLLM(
+        llm,
+        ttl=settings.LLM_CACHE_TTL_S,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        cache_dir=settings.LLM_CACHE_DIR or None,
+    )
@@ -0,0 +1,175 @@
+"""Response cache + single-flight wrapper around an LLM provider.
+
+Responses are keyed by a hash of (provider, model, system prompt, user prompt),
+kept in an in-memory LRU with TTL and optionally persisted as one JSON file per
+key so a restart does not pay for the same reviews again. Concurrent calls with
+the same key share a single upstream request.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from services.common.cache import TTLCache
+from services.common.logging import setup_logging
+from .llm import LLM
+
+log = setup_logging("genai-api.llm-cache")
+
+llm_cache_disk_hits_total = Counter(
+    "llm_cache_disk_hits_total",
+    "LLM responses served from the on-disk cache",
+)
+llm_singleflight_shared_total = Counter(
+    "llm_singleflight_shared_total",
+    "LLM calls that joined an identical in-flight request",
+)
+llm_upstream_calls_total = Counter(
+    "llm_upstream_calls_total",
+    "Calls that reached the LLM provider",
+    ["provider"],
+)
+
+
+class _LeaderCancelled(Exception):
+    """Set on the shared future when the call that owned it was cancelled."""
+
+
+def cache_key(provider: str, model: str, system: str, user: str) -> str:
+    raw = json.dumps([provider, model, system, user], ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class CachedLLM(LLM):
+    def __init__(
+        self,
+        inner: LLM,
+        ttl: float = 3600.0,
+        max_entries: int = 1024,
+        cache_dir: Optional[str] = None,
+    ):
+        self.inner = inner
+        self.provider = inner.provider
+        self.model = inner.model
+        self.ttl = ttl
+        self._cache = TTLCache("llm_response", max_entries=max_entries, ttl=ttl)
+        self._cache_dir = cache_dir
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, system: str, user: str) -> str:
+        return cache_key(self.provider, self.model, system, user)
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        out = self._cache.get(key)
+        if out is None and self._cache_dir:
+            out = await asyncio.to_thread(self._disk_get, key)
+            if out is not None:
+                llm_cache_disk_hits_total.inc()
+                self._cache.set(key, out)
+        return out
+
+    async def _store(self, key: str, out: str) -> None:
+        self._cache.set(key, out)
+        if self._cache_dir:
+            await asyncio.to_thread(self._disk_set, key, out)
+
+    async def complete(self, system: str, user: str) -> str:
+        key = self.key(system, user)
+        out = await self._lookup(key)
+        if out is not None:
+            return out
+
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._lead(key, system, user)
+            llm_singleflight_shared_total.inc()
+            try:
+                # shield: a cancelled follower must not cancel the shared call
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                continue  # the leader's caller gave up, not us: call again
+
+    async def _lead(self, key: str, system: str, user: str) -> str:
+        fut: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            llm_upstream_calls_total.labels(provider=self.provider).inc()
+            out = await self.inner.complete(system, user)
+        except asyncio.CancelledError:
+            # Followers were not cancelled: they retry instead of inheriting it
+            fut.set_exception(_LeaderCancelled())
+            fut.exception()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved: followers may not exist
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result(out)
+        await self._store(key, out)
+        return out
+
+    async def stream(self, system: str, user: str) -> AsyncIterator[str]:
+        """Cached answers come back as a single chunk; misses stream from the provider.
+
+        Only fully consumed streams are cached. Streams are not single-flighted:
+        each caller wants its own incremental output.
+        """
+        key = self.key(system, user)
+        out = await self._lookup(key)
+        if out is not None:
+            yield out
+            return
+        llm_upstream_calls_total.labels(provider=self.provider).inc()
+        parts: List[str] = []
+        agen = self.inner.stream(system, user)
+        try:
+            async for tok in agen:
+                parts.append(tok)
+                yield tok
+            await self._store(key, "".join(parts))
+        finally:
+            await agen.aclose()
+
+    # ── On-disk persistence ─────────────────────────────────────────
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._cache_dir or "", f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl and (entry.get("expires_at") or 0) <= time.time():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return entry.get("response")
+
+    def _disk_set(self, key: str, out: str) -> None:
+        entry = {
+            "provider": self.provider,
+            "model": self.model,
+            "expires_at": time.time() + self.ttl if self.ttl else None,
+            "response": out,
+        }
+        tmp = self._path(key) + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            log.warning("LLM cache write failed key=%s err=%s", key[:12], e)
@@ -1,15 +1,23 @@
+import asyncio
 import uuid
+import zlib
 from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from services.common.logging import setup_logging
 from services.common.metrics import install
 from services.common.kafka import consumer, consume_forever, publish
 from services.common.audit import publish_audit
+from services.common.config import settings
+from services.common.otel import new_correlation_id, span
+from prometheus_client import Counter
+from .batch import build_batch_prompt, format_review, pack_by_symbol, parse_batch_response
 from .rag import SimpleRAG
-from .llm import get_llm
+from .llm import MockLLM, estimate_tokens, fit_context, get_llm, metered_stream
+from .scheduler import ReviewScheduler, limiter_for
 import os
 
 log = setup_logging("genai-api")
@@ -20,6 +28,20 @@ install(app, "genai-api")
 RAG_CORPUS_PATH = os.getenv("RAG_CORPUS_PATH", "/app/rag_corpus")
 rag = SimpleRAG(RAG_CORPUS_PATH)
 llm = get_llm()
+# Degraded mode when the provider is too slow: deterministic, never rate limited
+fallback_llm = MockLLM()
+scheduler: Optional[ReviewScheduler] = None
+
+llm_degraded_total = Counter(
+    "llm_degraded_total",
+    "LLM calls answered by the mock fallback",
+    ["provider", "reason"],
+)
+review_batch_items_total = Counter(
+    "review_batch_items_total",
+    "Reviews of /review/batch by how they were produced",
+    ["mode"],
+)
 
 class ReviewRequest(BaseModel):
     workflow_id: str
@@ -27,23 +49,41 @@ class ReviewRequest(BaseModel):
     side: str
     qty: float
     reason: str
+    # of the workflow, when known (audit_logs.correlation_id is a UUID column)
+    correlation_id: Optional[uuid.UUID] = None
+
+class BatchReviewRequest(BaseModel):
+    reviews: List[ReviewRequest] = Field(..., min_length=1, max_length=500)
+
+    @field_validator("reviews")
+    @classmethod
+    def _unique_workflows(cls, reviews: List[ReviewRequest]) -> List[ReviewRequest]:
+        # Results are keyed by workflow_id: a duplicate would be reviewed twice
+        seen, dup = set(), []
+        for t in reviews:
+            if t.workflow_id in seen:
+                dup.append(t.workflow_id)
+            seen.add(t.workflow_id)
+        if dup:
+            raise ValueError(f"duplicate workflow_id: {', '.join(sorted(set(dup)))}")
+        return reviews
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "llm_provider": os.getenv("LLM_PROVIDER", "mock")}
+    return {
+        "status": "ok",
+        "llm_provider": os.getenv("LLM_PROVIDER", "mock"),
+        "scheduler": scheduler.stats() if scheduler else {"running": False},
+    }
 
 @app.get("/metrics")
 def metrics():
     return PlainTextResponse(generate_latest().decode("utf-8"), media_type=CONTENT_TYPE_LATEST)
 
-@app.post("/review")
-async def review(req: ReviewRequest):
-    correlation_id = str(uuid.uuid4())
-    hits = rag.query(f"risk rules for {req.symbol} {req.side} qty {req.qty} because {req.reason}", top_k=3)
-    sources = [h[0] for h in hits]
-    context = "\n\n".join([f"[{doc_id}]\n{snippet}" for doc_id, snippet, _ in hits])
-    system = "Tu es un assistant Risk/Compliance. Tu dois être factuel, citer les documents internes."
-    user = f"""Demande trade:
+SYSTEM_PROMPT = "Tu es un assistant Risk/Compliance. Tu dois être factuel, citer les documents internes."
+
+def _user_prompt(req: ReviewRequest, context: str) -> str:
+    return f"""Demande trade:
 - symbol: {req.symbol}
 - side: {req.side}
 - qty: {req.qty}
@@ -58,7 +98,21 @@ Rédige une revue courte:
 - recommendation (approve/reject) + justification
 - cite sources (doc ids)
 """
-    out = await llm.complete(system=system, user=user)
+
+def _build_prompt(req: ReviewRequest) -> Tuple[str, str, List[str]]:
+    """System/user prompts within LLM_PROMPT_TOKEN_BUDGET, plus the cited sources."""
+    with span("rag.query", top_k=3):
+        hits = rag.query(f"risk rules for {req.symbol} {req.side} qty {req.qty} because {req.reason}", top_k=3)
+    # Whatever the template leaves of the budget goes to the most relevant passages
+    budget = settings.LLM_PROMPT_TOKEN_BUDGET - estimate_tokens(SYSTEM_PROMPT, _user_prompt(req, ""))
+    hits = fit_context(hits, budget)
+    sources = [h[0] for h in hits]
+    context = "\n\n".join([f"[{doc_id}]\n{snippet}" for doc_id, snippet, _ in hits])
+    return SYSTEM_PROMPT, _user_prompt(req, context), sources
+
+async def _publish_review(
+    req: ReviewRequest, correlation_id: str, out: str, sources: List[str], risk_notes: str = "see summary"
+):
     data = {"workflow_id": req.workflow_id, "summary": out[:600], "sources": sources}
     await publish_audit("genai.review", req.workflow_id, data, correlation_id)
     event = {
@@ -66,11 +120,158 @@ Rédige une revue courte:
         "event_type": "genai.review.created",
         "occurred_at": datetime.now(timezone.utc).isoformat(),
         "correlation_id": correlation_id,
-        "payload": {"workflow_id": req.workflow_id, "summary": out[:900], "risk_notes": "see summary", "sources": sources},
+        "payload": {"workflow_id": req.workflow_id, "summary": out[:900], "risk_notes": risk_notes, "sources": sources},
     }
     await publish("genai.review.created", event, key=req.workflow_id)
+
+@app.post("/review")
+async def review(req: ReviewRequest, stream: bool = False):
+    correlation_id = str(req.correlation_id or new_correlation_id())
+    with span("genai.review", correlation_id=correlation_id, workflow_id=req.workflow_id):
+        return await _review(req, correlation_id, stream)
+
+async def _review(req: ReviewRequest, correlation_id: str, stream: bool):
+    # TF-IDF retrieval is CPU work: keep it off the event loop
+    system, user, sources = await asyncio.to_thread(_build_prompt, req)
+    if stream:
+        return StreamingResponse(
+            _stream_review(req, correlation_id, system, user, sources),
+            media_type="text/plain; charset=utf-8",
+            headers={"X-Correlation-Id": correlation_id, "X-Sources": ",".join(sources)},
+        )
+    out = await _complete(system=system, user=user)
+    await _publish_review(req, correlation_id, out, sources)
     return {"correlation_id": correlation_id, "sources": sources, "review": out}
 
+@app.post("/review/batch")
+async def review_batch(req: BatchReviewRequest):
+    """Review many trades with one retrieval per symbol and one LLM call per pack.
+
+    Packs of up to REVIEW_BATCH_SIZE trades (a symbol's trades kept together
+    unless they alone exceed a pack) are reviewed by a single structured call;
+    any review missing or malformed in the answer is redone individually
+    through the regular /review path, at most REVIEW_CONCURRENCY at a time
+    (shared with the queued reviews). A review that still fails gets an
+    ``error`` in its result instead of failing the batch. Workflow ids must be
+    unique (422 otherwise).
+    """
+    by_symbol: Dict[str, List[ReviewRequest]] = {}
+    for t in req.reviews:
+        by_symbol.setdefault(t.symbol, []).append(t)
+
+    def retrieve() -> Dict[str, List[Tuple[str, str, float]]]:
+        return {
+            sym: rag.query(
+                f"risk rules for {sym} {' '.join(sorted({t.side for t in group}))} "
+                f"because {'; '.join(sorted({t.reason for t in group}))}",
+                top_k=3,
+            )
+            for sym, group in by_symbol.items()
+        }
+
+    # TF-IDF retrieval is CPU work: keep it off the event loop
+    hits_by_symbol = await asyncio.to_thread(retrieve)
+    ordered = [t for group in by_symbol.values() for t in group]
+    packs = pack_by_symbol(list(by_symbol.values()), max(1, settings.REVIEW_BATCH_SIZE))
+    results: Dict[str, dict] = {}
+
+    async def run_pack(pack: List[ReviewRequest]):
+        system, user, sent = build_batch_prompt(pack, hits_by_symbol, settings.LLM_PROMPT_TOKEN_BUDGET)
+        out = await _complete(system=system, user=user)
+        parsed = parse_batch_response(out, [t.workflow_id for t in pack])
+        for t in pack:
+            item = parsed.get(t.workflow_id)
+            if item is None:
+                continue
+            symbol_docs = {h[0] for h in hits_by_symbol[t.symbol]}
+            sources = [d for d in item["sources"] if d in sent] or [d for d in sent if d in symbol_docs]
+            text = format_review(item)
+            correlation_id = str(t.correlation_id or new_correlation_id())
+            await _publish_review(t, correlation_id, text, sources, risk_notes=item["risk_notes"])
+            results[t.workflow_id] = {
+                "workflow_id": t.workflow_id,
+                "correlation_id": correlation_id,
+                "sources": sources,
+                "review": text,
+                "mode": "batch",
+            }
+
+    outcomes = await asyncio.gather(*(run_pack(p) for p in packs), return_exceptions=True)
+    for pack, res in zip(packs, outcomes):
+        # Its reviews are redone individually below
+        if isinstance(res, Exception):
+            log.warning("batch review: pack of %d failed: %r", len(pack), res)
+    missing = [t for t in ordered if t.workflow_id not in results]
+    failed = 0
+    if missing:
+        log.warning("batch review: %d/%d reviews unparsed – falling back to individual calls",
+                    len(missing), len(ordered))
+        # Through the scheduler's REVIEW_CONCURRENCY slots, like queued reviews
+        run = scheduler.run if scheduler is not None else review
+        outcomes = await asyncio.gather(*(run(t) for t in missing), return_exceptions=True)
+        for t, res in zip(missing, outcomes):
+            if isinstance(res, Exception):
+                log.error("batch review: wf=%s failed: %r", t.workflow_id, res)
+                failed += 1
+                results[t.workflow_id] = {
+                    "workflow_id": t.workflow_id, "error": repr(res), "mode": "individual",
+                }
+            else:
+                results[t.workflow_id] = {"workflow_id": t.workflow_id, **res, "mode": "individual"}
+    review_batch_items_total.labels(mode="batch").inc(len(ordered) - len(missing))
+    review_batch_items_total.labels(mode="individual").inc(len(missing) - failed)
+    review_batch_items_total.labels(mode="error").inc(failed)
+    return {
+        "results": [results[t.workflow_id] for t in req.reviews],
+        "llm_calls": len(packs) + len(missing),
+    }
+
+async def _stream_review(
+    req: ReviewRequest, correlation_id: str, system: str, user: str, sources: List[str]
+) -> AsyncIterator[str]:
+    """Relay tokens as they arrive, then publish the review like the blocking path."""
+    limiter = limiter_for(llm.provider, settings.LLM_RPM, settings.LLM_TPM)
+    await limiter.acquire(estimate_tokens(system, user))
+    parts: List[str] = []
+    agen = metered_stream(llm, system, user, settings.LLM_MAX_OUTPUT_TOKENS)
+    try:
+        try:
+            # The timeout bounds time-to-first-token; afterwards tokens flow freely
+            first = await asyncio.wait_for(agen.__anext__(), settings.LLM_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            log.warning("LLM first token timeout provider=%s – degraded review", llm.provider)
+            llm_degraded_total.labels(provider=llm.provider, reason="timeout").inc()
+            agen = metered_stream(fallback_llm, system, user, settings.LLM_MAX_OUTPUT_TOKENS)
+            first = await agen.__anext__()
+        parts.append(first)
+        yield first
+        async for tok in agen:
+            parts.append(tok)
+            yield tok
+    except StopAsyncIteration:
+        pass  # empty answer
+    finally:
+        await agen.aclose()
+    await _publish_review(req, correlation_id, "".join(parts), sources)
+
+async def _complete(system: str, user: str) -> str:
+    """Rate-limited LLM call with timeout; degrades to the mock on timeout."""
+    limiter = limiter_for(llm.provider, settings.LLM_RPM, settings.LLM_TPM)
+    await limiter.acquire(estimate_tokens(system, user))
+    with span("llm.complete", "client", **{"llm.provider": llm.provider}) as s:
+        try:
+            return await asyncio.wait_for(llm.complete(system=system, user=user), settings.LLM_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            log.warning("LLM timeout provider=%s after %.1fs – degraded review", llm.provider, settings.LLM_TIMEOUT_S)
+            llm_degraded_total.labels(provider=llm.provider, reason="timeout").inc()
+            s.set_attribute("llm.degraded", "timeout")
+            return await fallback_llm.complete(system=system, user=user)
+
+def _notional(req: ReviewRequest) -> float:
+    # Same synthetic reference price as market-data / mcp-server (crc32, unlike
+    # hash(), is not randomized per process)
+    return req.qty * (100 + (zlib.crc32(req.symbol.upper().encode()) % 1000) / 10.0)
+
 async def _on_workflow_requested(topic: str, msg: dict):
     # Auto-trigger review on event workflow.requested
     p = msg.get("payload", {})
@@ -80,13 +281,26 @@ async def _on_workflow_requested(topic: str, msg: dict):
         side=p["side"],
         qty=float(p["qty"]),
         reason=p.get("reason",""),
+        correlation_id=msg.get("correlation_id"),
     )
-    await review(req)
+    # Blocks while the queue is full: backpressure on the consumer
+    await scheduler.submit(req, priority=_notional(req))
 
 @app.on_event("startup")
 async def startup():
+    global scheduler
+    scheduler = ReviewScheduler(
+        review,
+        concurrency=settings.REVIEW_CONCURRENCY,
+        max_queue=settings.REVIEW_QUEUE_MAX,
+    )
+    scheduler.start()
     # Consumer runs in background
     cons = consumer(["workflow.requested"], group_id="genai-reviewer")
-    import asyncio
     asyncio.create_task(consume_forever(cons, _on_workflow_requested))
     log.info("GenAI consumer started topic=workflow.requested")
+
+@app.on_event("shutdown")
+async def shutdown():
+    if scheduler is not None:
+        await scheduler.stop()
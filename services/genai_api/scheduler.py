@@ -0,0 +1,195 @@
+"""Review scheduling: bounded worker pool, priority queue and LLM rate limiting.
+
+`ReviewScheduler` runs queued reviews on a fixed number of workers, highest
+priority (largest trade notional) first. Its queue is bounded: when it is full,
+`submit()` blocks, which in turn pauses the Kafka consumer instead of piling up
+unbounded work. `RateLimiter` is a token bucket over requests/min and
+tokens/min, one per LLM provider.
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from services.common.logging import setup_logging
+
+log = setup_logging("genai-api.scheduler")
+
+review_queue_depth = Gauge("review_queue_depth", "Reviews waiting for a worker")
+reviews_in_flight = Gauge("reviews_in_flight", "Reviews currently being processed")
+review_queue_wait_seconds = Histogram(
+    "review_queue_wait_seconds",
+    "Time a review spent queued before a worker picked it up",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+reviews_total = Counter("reviews_total", "Scheduled reviews by outcome", ["outcome"])
+llm_rate_limited_seconds = Histogram(
+    "llm_rate_limited_seconds",
+    "Time spent waiting for the provider rate limiter",
+    ["provider"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class RateLimiter:
+    """Token buckets for requests per minute and tokens per minute (0 = unlimited)."""
+
+    def __init__(
+        self,
+        provider: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.provider = provider
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._last = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._req = min(self.rpm, self._req + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(self.tpm, self._tok + elapsed * self.tpm / 60.0)
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """Take capacity for one request of ``tokens`` tokens.
+
+        Returns 0 on success, otherwise the seconds to wait before retrying.
+        """
+        self._refill()
+        # A request larger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        wait = 0.0
+        if self.rpm and self._req < 1:
+            wait = max(wait, (1 - self._req) * 60.0 / self.rpm)
+        if self.tpm and self._tok < tokens:
+            wait = max(wait, (tokens - self._tok) * 60.0 / self.tpm)
+        if wait:
+            return wait
+        if self.rpm:
+            self._req -= 1
+        if self.tpm:
+            self._tok -= tokens
+        return 0.0
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if not self.rpm and not self.tpm:
+            return
+        start = self._clock()
+        async with self._lock:  # FIFO among waiters
+            while True:
+                wait = self.try_acquire(tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        llm_rate_limited_seconds.labels(provider=self.provider).observe(self._clock() - start)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def limiter_for(provider: str, rpm: int, tpm: int) -> RateLimiter:
+    if provider not in _limiters:
+        _limiters[provider] = RateLimiter(provider, rpm=rpm, tpm=tpm)
+    return _limiters[provider]
+
+
+class ReviewScheduler:
+    """Priority queue of reviews drained by ``concurrency`` workers."""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        concurrency: int = 4,
+        max_queue: int = 1000,
+    ):
+        self._handler = handler
+        self.concurrency = max(1, concurrency)
+        self._queue: "asyncio.PriorityQueue[Tuple[float, int, float, Any]]" = (
+            asyncio.PriorityQueue(maxsize=max_queue)
+        )
+        self._seq = itertools.count()  # FIFO among equal priorities
+        self._workers: List["asyncio.Task[None]"] = []
+        # Shared by the workers and run(): ``concurrency`` reviews at most
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        for i in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        log.info("review scheduler started workers=%d", self.concurrency)
+
+    async def stop(self) -> None:
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, item: Any, priority: float = 0.0) -> None:
+        """Queue ``item``; higher ``priority`` runs first. Blocks while the queue is full."""
+        await self._queue.put((-priority, next(self._seq), time.monotonic(), item))
+        review_queue_depth.set(self._queue.qsize())
+
+    async def run(self, item: Any) -> Any:
+        """Review ``item`` now (no queue) and return the result, within the same
+        concurrency limit as the queued reviews."""
+        async with self._slots:
+            return await self._handler(item)
+
+    def alive(self) -> int:
+        """Workers still running."""
+        return sum(not w.done() for w in self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self._workers),
+            "workers_alive": self.alive(),
+            "concurrency": self.concurrency,
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+        }
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            _, _, enqueued_at, item = await self._queue.get()
+            review_queue_depth.set(self._queue.qsize())
+            review_queue_wait_seconds.observe(time.monotonic() - enqueued_at)
+            reviews_in_flight.inc()
+            try:
+                async with self._slots:
+                    await self._handler(item)
+                reviews_total.labels(outcome="ok").inc()
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if task is not None and task.cancelling():
+                    raise  # stop(): this worker is being cancelled
+                # Raised by the handler (e.g. an awaited call was cancelled):
+                # a failed review, the worker keeps serving the queue
+                reviews_total.labels(outcome="error").inc()
+                log.error("review cancelled worker=%d", idx)
+            except Exception as e:
+                reviews_total.labels(outcome="error").inc()
+                log.exception("review failed worker=%d err=%s", idx, e)
+            finally:
+                reviews_in_flight.dec()
+                self._queue.task_done()
+
@@ -1,4 +1,5 @@
 import uuid
+import zlib
 from datetime import datetime, timezone
 from fastapi import FastAPI
 from fastapi.responses import PlainTextResponse
@@ -6,12 +7,17 @@ from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from services.common.logging import setup_logging
 from services.common.metrics import install
 from services.common.kafka import publish
+from services.common.otel import new_correlation_id
 
 log = setup_logging("market-data")
 
 app = FastAPI(title="Market Data API", version="0.1")
 install(app, "market-data")
 
+def synthetic_price(symbol: str) -> float:
+    # crc32, unlike hash(), gives every process (and service) the same price
+    return 100 + (zlib.crc32(symbol.upper().encode()) % 1000) / 10.0
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -23,14 +29,14 @@ def metrics():
 @app.get("/prices/{symbol}")
 def get_prices(symbol: str):
     # Demo: returns synthetic last price
-    price = 100 + (hash(symbol) % 1000) / 10.0
+    price = synthetic_price(symbol)
     return {"symbol": symbol.upper(), "last": price, "ts": datetime.now(timezone.utc).isoformat()}
 
 @app.post("/publish/{symbol}")
 async def publish_price(symbol: str):
     # Publish a market.prices event (synthetic)
-    correlation_id = str(uuid.uuid4())
-    price = 100 + (hash(symbol) % 1000) / 10.0
+    correlation_id = new_correlation_id()
+    price = synthetic_price(symbol)
     event = {
         "event_id": str(uuid.uuid4()),
         "event_type": "market.prices",
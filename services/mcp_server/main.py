@@ -8,22 +8,35 @@ that exposes the following tools:
   4) db.get_workflow(workflow_id)
   5) db.list_audit(limit)
 
-Each tool call is logged in audit_logs (kind = mcp.tool_call).
+Each tool call is logged in audit_logs (kind = mcp.tool_call). Audit rows are
+hashed on the request path but written in bulk in the background.
+POST /call/batch runs several tool calls in one request.
 """
 
+import asyncio
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI
 from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
-from services.common.audit import log_audit
+from services.common.audit import BufferedAuditWriter
+from services.common.config import settings
 from services.common.logging import setup_logging
 from services.common.metrics import install
-from services.mcp_server.tools import TOOL_REGISTRY, execute_tool
+from services.common.otel import span
+from services.mcp_server.tools import (
+    TOOL_REGISTRY,
+    cache_stats,
+    concurrency_limit,
+    execute_tool,
+    input_schema,
+    is_read_only,
+)
 from services.mcp_server.state import MCPState
 
 log = setup_logging("mcp-server")
@@ -34,6 +47,17 @@ install(app, "mcp-server")
 # Global MCP state (in-memory)
 _state = MCPState()
 
+_audit = BufferedAuditWriter(
+    max_batch=settings.AUDIT_BATCH_MAX,
+    max_wait_ms=settings.AUDIT_FLUSH_MS,
+    max_pending=settings.AUDIT_MAX_PENDING,
+)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await _audit.stop()
+
 
 # ── JSON-RPC Models ──────────────────────────────────────────────────
 
@@ -51,10 +75,21 @@ class ToolCallResponse(BaseModel):
     audit_hash: str
 
 
+class BatchCallRequest(BaseModel):
+    calls: List[ToolCallRequest] = Field(..., min_length=1, max_length=100)
+    correlation_id: Optional[str] = Field(default=None, description="Default for the calls")
+    workflow_id: Optional[str] = Field(default=None, description="Default for the calls")
+
+
+class BatchCallResponse(BaseModel):
+    results: List[ToolCallResponse]
+
+
 class ToolListItem(BaseModel):
     name: str
     description: str
     parameters: Dict[str, Any]
+    input_schema: Dict[str, Any]
 
 
 # ── Endpoints ────────────────────────────────────────────────────────
@@ -82,14 +117,21 @@ def list_tools():
                 name=name,
                 description=meta["description"],
                 parameters=meta["parameters"],
+                input_schema=input_schema(name),
             )
         )
     return {"tools": items}
 
 
+@app.get("/cache")
+def get_cache():
+    """Per-tool result cache statistics."""
+    return cache_stats()
+
+
 @app.post("/call", response_model=ToolCallResponse)
-def call_tool(req: ToolCallRequest):
-    """Execute a tool and return the result. Logs to audit_logs."""
+async def call_tool(req: ToolCallRequest):
+    """Execute a tool and return the result. Logs to audit_logs (buffered)."""
     correlation_id = req.correlation_id or str(uuid.uuid4())
     workflow_id = req.workflow_id or ""
 
@@ -97,23 +139,11 @@ def call_tool(req: ToolCallRequest):
     _state.set_correlation_id(correlation_id)
 
     # Execute the tool
-    result = execute_tool(req.tool, req.arguments)
-
-    # Determine ref_id (workflow_id or order_id if present)
-    ref_id = workflow_id
-    if isinstance(result, dict) and "order_id" in result:
-        ref_id = ref_id or str(result["order_id"])
-    if not ref_id:
-        ref_id = correlation_id
+    result = await _execute(req.tool, req.arguments)
 
     # Audit log
-    audit_data = {
-        "tool": req.tool,
-        "arguments": req.arguments,
-        "result": result,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-    }
-    audit_hash = log_audit(
+    ref_id, audit_data = _audit_entry(req.tool, req.arguments, result, correlation_id, workflow_id)
+    audit_hash = await _audit.submit(
         kind="mcp.tool_call",
         ref_id=ref_id,
         data=audit_data,
@@ -136,7 +166,117 @@ def call_tool(req: ToolCallRequest):
     )
 
 
+@app.post("/call/batch", response_model=BatchCallResponse)
+async def call_tools(req: BatchCallRequest):
+    """Execute several tools; results come back in request order.
+
+    Read-only tools run concurrently. A tool with side effects (oms.place_order)
+    is a barrier: it starts once the calls before it are done, and the calls
+    after it start once it is done. A failing call gets an ``error`` result
+    instead of failing the batch. Audit rows are written in bulk.
+    """
+    calls = []
+    for call in req.calls:
+        correlation_id = call.correlation_id or req.correlation_id or str(uuid.uuid4())
+        workflow_id = call.workflow_id or req.workflow_id or ""
+        _state.set_correlation_id(correlation_id)
+        calls.append((call, correlation_id, workflow_id))
+
+    results = await _run_calls([call for call, _, _ in calls])
+
+    hashes = []
+    for (call, correlation_id, workflow_id), result in zip(calls, results):
+        ref_id, audit_data = _audit_entry(
+            call.tool, call.arguments, result, correlation_id, workflow_id
+        )
+        hashes.append(await _audit.submit("mcp.tool_call", ref_id, audit_data, correlation_id))
+
+    log.info("tool_call batch n=%d tools=%s", len(calls), [c.tool for c in req.calls])
+    return BatchCallResponse(results=[
+        ToolCallResponse(
+            tool=call.tool, result=result, correlation_id=correlation_id, audit_hash=h,
+        )
+        for (call, correlation_id, _), result, h in zip(calls, results, hashes)
+    ])
+
+
 @app.get("/state")
 def get_state():
-    """Return current MCP server state (for debugging)."""
-    return _state.to_dict()
+    """Return current MCP server state: calls, p50/p99 and in-flight per tool."""
+    state = _state.to_dict()
+    for name, stats in state["tools"].items():
+        stats["max_concurrency"] = concurrency_limit(name)
+    return state
+
+
+# ── Helpers ──────────────────────────────────────────────────────────
+
+def _audit_entry(
+    tool: str,
+    arguments: Dict[str, Any],
+    result: Any,
+    correlation_id: str,
+    workflow_id: str,
+) -> Tuple[str, Dict[str, Any]]:
+    """Return the (ref_id, data) of the mcp.tool_call audit entry of a call."""
+    # Determine ref_id (workflow_id or order_id if present)
+    ref_id = workflow_id
+    if isinstance(result, dict) and "order_id" in result:
+        ref_id = ref_id or str(result["order_id"])
+    if not ref_id:
+        ref_id = correlation_id
+
+    return ref_id, {
+        "tool": tool,
+        "arguments": arguments,
+        "result": result,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def _execute(tool: str, arguments: Dict[str, Any]) -> Any:
+    """execute_tool(), recorded in the per-tool stats of registered tools."""
+    if tool not in TOOL_REGISTRY:
+        return await execute_tool(tool, arguments)
+    _state.tool_started(tool)
+    start = time.perf_counter()
+    error = True
+    try:
+        with span(f"mcp.tool {tool}", **{"mcp.tool": tool}) as s:
+            result = await execute_tool(tool, arguments)
+            error = isinstance(result, dict) and "error" in result
+            if error:
+                s.set_attribute("mcp.error", str(result["error"]))
+        return result
+    finally:
+        _state.tool_finished(tool, time.perf_counter() - start, error)
+
+
+async def _safe_execute(tool: str, arguments: Dict[str, Any]) -> Any:
+    try:
+        return await _execute(tool, arguments)
+    except Exception as e:
+        log.warning("tool_call failed tool=%s err=%r", tool, e)
+        return {"error": repr(e)}
+
+
+async def _run_calls(calls: List[ToolCallRequest]) -> List[Any]:
+    results: List[Any] = [None] * len(calls)
+
+    async def run(indexes: List[int]) -> None:
+        outs = await asyncio.gather(*(
+            _safe_execute(calls[i].tool, calls[i].arguments) for i in indexes
+        ))
+        for i, out in zip(indexes, outs):
+            results[i] = out
+
+    group: List[int] = []
+    for i, call in enumerate(calls):
+        if is_read_only(call.tool):
+            group.append(i)
+            continue
+        await run(group)
+        await run([i])
+        group = []
+    await run(group)
+    return results
@@ -1,23 +1,63 @@
 """Minimal in-memory state for the MCP server.
 
-Tracks the current correlation_id and a simple tool-call counter.
+Tracks the last correlation_id, a tool-call counter and per-tool statistics
+(calls, errors, in-flight, p50/p99 over the last calls), also exported to
+Prometheus. Requests run concurrently (and sync endpoints on a threadpool), so
+every update goes through a lock.
 """
 
+import threading
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Deque, Dict, List, Optional
+
+from prometheus_client import Gauge, Histogram
+
+mcp_tool_duration_seconds = Histogram(
+    "mcp_tool_duration_seconds",
+    "MCP tool call latency, waiting for a concurrency slot included",
+    ["tool", "status"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+mcp_tool_in_flight = Gauge(
+    "mcp_tool_in_flight",
+    "MCP tool calls in progress",
+    ["tool"],
+)
+
+LATENCY_WINDOW = 1024
+
+
+def _quantile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _ToolStats:
+    __slots__ = ("calls", "errors", "in_flight", "latencies")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
 
 
 class MCPState:
     """Lightweight state container for the MCP server."""
 
     def __init__(self) -> None:
+        self._lock = threading.Lock()
         self._correlation_id: Optional[str] = None
         self._call_count: int = 0
         self._started_at: str = datetime.now(timezone.utc).isoformat()
+        self._tools: Dict[str, _ToolStats] = {}
 
     def set_correlation_id(self, cid: str) -> None:
-        self._correlation_id = cid
-        self._call_count += 1
+        with self._lock:
+            self._correlation_id = cid
+            self._call_count += 1
 
     @property
     def correlation_id(self) -> Optional[str]:
@@ -27,9 +67,47 @@ class MCPState:
     def call_count(self) -> int:
         return self._call_count
 
+    def tool_started(self, tool: str) -> None:
+        with self._lock:
+            self._tools.setdefault(tool, _ToolStats()).in_flight += 1
+        mcp_tool_in_flight.labels(tool=tool).inc()
+
+    def tool_finished(self, tool: str, seconds: float, error: bool) -> None:
+        with self._lock:
+            stats = self._tools[tool]
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.errors += error
+            stats.latencies.append(seconds)
+        mcp_tool_in_flight.labels(tool=tool).dec()
+        mcp_tool_duration_seconds.labels(
+            tool=tool, status="error" if error else "ok"
+        ).observe(seconds)
+
+    def tool_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {
+                name: (s.calls, s.errors, s.in_flight, sorted(s.latencies))
+                for name, s in self._tools.items()
+            }
+        out = {}
+        for name, (calls, errors, in_flight, ordered) in snapshot.items():
+            p50, p99 = _quantile(ordered, 0.50), _quantile(ordered, 0.99)
+            out[name] = {
+                "calls": calls,
+                "errors": errors,
+                "in_flight": in_flight,
+                "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+                "p99_ms": None if p99 is None else round(p99 * 1000, 3),
+            }
+        return out
+
     def to_dict(self) -> Dict[str, Any]:
-        return {
-            "current_correlation_id": self._correlation_id,
-            "total_calls": self._call_count,
-            "started_at": self._started_at,
-        }
+        with self._lock:
+            base = {
+                "current_correlation_id": self._correlation_id,
+                "total_calls": self._call_count,
+                "started_at": self._started_at,
+            }
+        base["tools"] = self.tool_stats()
+        return base
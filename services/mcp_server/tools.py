@@ -1,25 +1,45 @@
 """MCP Tool implementations.
 
-Each tool is registered in TOOL_REGISTRY with its metadata (description, parameters).
-execute_tool() dispatches to the correct handler.
+Each tool is registered in TOOL_REGISTRY with its metadata (description, parameters,
+read_only, and optionally cache / invalidates). execute_tool() dispatches to the
+correct handler.
+
+A ``cache`` policy (``ttl`` seconds, ``max_entries``, ``key`` argument names)
+memoizes a tool's results in a TTL/LRU cache; a successful call of a tool with
+``invalidates`` clears the caches of the tools it lists.
+
+Each tool's ``parameters`` spec is compiled once, at import, into a validator
+(see validation.py): malformed calls are rejected before any cache lookup or
+DB work, and handlers receive coerced arguments with defaults filled in.
+
+Coroutine handlers run under a per-tool semaphore (``max_concurrency``, default
+MCP_TOOL_CONCURRENCY), so a flood of calls to one DB tool waits for its own
+slots instead of taking every pooled connection from the others.
+
+Handlers are either coroutines or plain functions. Plain handlers run inline on
+the event loop, so they must not block: CPU-only tools (price, risk) stay plain
+and answer in microseconds, DB tools are coroutines on the pooled connections.
 """
 
+import asyncio
+import inspect
+import json
 import uuid
+import zlib
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Hashable, Optional, Tuple
 
-from services.common.db import execute, fetchall, fetchone
+from services.common.cache import TTLCache
+from services.common.config import settings
+from services.common.db import afetchall, afetchone
 from services.common.logging import setup_logging
+from .validation import ArgumentError, Validator, compile_params, to_json_schema
 
 log = setup_logging("mcp-server.tools")
 
-# ── In-memory price cache ────────────────────────────────────────────
-_price_cache: Dict[str, Dict[str, Any]] = {}
-
-
 def _synthetic_price(symbol: str) -> float:
     """Same logic as market-data service for consistency."""
-    return 100 + (hash(symbol.upper()) % 1000) / 10.0
+    return 100 + (zlib.crc32(symbol.upper().encode()) % 1000) / 10.0
 
 
 # ── Tool implementations ─────────────────────────────────────────────
@@ -29,7 +49,6 @@ def market_get_last_price(symbol: str) -> Dict[str, Any]:
     sym = symbol.upper()
     price = _synthetic_price(sym)
     ts = datetime.now(timezone.utc).isoformat()
-    _price_cache[sym] = {"symbol": sym, "last": price, "ts": ts}
     return {"symbol": sym, "last": price, "ts": ts}
 
 
@@ -58,19 +77,42 @@ def risk_check_trade(symbol: str, side: str, qty: float) -> Dict[str, Any]:
     }
 
 
-def oms_place_order(symbol: str, side: str, qty: float) -> Dict[str, Any]:
-    """Place a paper order (writes to orders table, status=FILLED immediately in demo)."""
+async def oms_place_order(
+    symbol: str, side: str, qty: float, workflow_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Place a paper order (writes to orders table, status=FILLED immediately in demo).
+
+    ``workflow_id`` is the idempotency key: the orders table holds one order per
+    workflow, so placing it again (a caller that lost the first response)
+    returns the order already placed instead of a second one.
+    """
     sym = symbol.upper()
     order_id = str(uuid.uuid4())
     fill_price = _synthetic_price(sym)
 
-    # We need a workflow_id – in demo mode we create a placeholder if none exists
-    # The agent controller will provide the real workflow_id via the MCP call context
-    execute(
+    # Ad-hoc orders (no workflow) get a placeholder workflow_id of their own
+    placed = await afetchone(
         "INSERT INTO orders(order_id, workflow_id, status, symbol, side, qty, fill_price) "
-        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-        (order_id, str(uuid.uuid4()), "FILLED", sym, side.upper(), qty, fill_price),
+        "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+        "ON CONFLICT (workflow_id) DO NOTHING RETURNING order_id",
+        (order_id, workflow_id or str(uuid.uuid4()), "FILLED", sym, side.upper(), qty,
+         fill_price),
     )
+    if placed is None:
+        row = await afetchone(
+            "SELECT order_id, status, symbol, side, qty, fill_price "
+            "FROM orders WHERE workflow_id = %s",
+            (workflow_id,),
+        )
+        log.info("order already placed wf=%s order_id=%s", workflow_id, row["order_id"])
+        return {
+            "order_id": str(row["order_id"]),
+            "symbol": row["symbol"],
+            "side": row["side"],
+            "qty": float(row["qty"]),
+            "fill_price": float(row["fill_price"]),
+            "status": row["status"],
+        }
 
     log.info("paper order placed order_id=%s symbol=%s side=%s qty=%s fill=%s",
              order_id, sym, side, qty, fill_price)
@@ -85,9 +127,9 @@ def oms_place_order(symbol: str, side: str, qty: float) -> Dict[str, Any]:
     }
 
 
-def db_get_workflow(workflow_id: str) -> Dict[str, Any]:
+async def db_get_workflow(workflow_id: str) -> Dict[str, Any]:
     """Retrieve a workflow by ID."""
-    row = fetchone(
+    row = await afetchone(
         "SELECT workflow_id, status, payload, created_at, updated_at "
         "FROM workflows WHERE workflow_id = %s",
         (workflow_id,),
@@ -104,9 +146,9 @@ def db_get_workflow(workflow_id: str) -> Dict[str, Any]:
     return result
 
 
-def db_list_audit(limit: int = 20) -> Dict[str, Any]:
+async def db_list_audit(limit: int = 20) -> Dict[str, Any]:
     """List recent audit log entries."""
-    rows = fetchall(
+    rows = await afetchall(
         "SELECT audit_id, kind, ref_id, hash, correlation_id, created_at "
         "FROM audit_logs ORDER BY audit_id DESC LIMIT %s",
         (min(limit, 500),),
@@ -125,43 +167,169 @@ def db_list_audit(limit: int = 20) -> Dict[str, Any]:
 TOOL_REGISTRY: Dict[str, Dict[str, Any]] = {
     "market.get_last_price": {
         "description": "Get the last known price for a symbol",
-        "parameters": {"symbol": {"type": "string", "required": True}},
+        "parameters": {"symbol": {"type": "string", "required": True, "uppercase": True}},
         "handler": market_get_last_price,
+        "read_only": True,
+        "cache": {"ttl": 1.0, "max_entries": 4096, "key": ["symbol"]},
     },
     "risk.check_trade": {
         "description": "Check if a trade passes risk rules",
         "parameters": {
-            "symbol": {"type": "string", "required": True},
+            "symbol": {"type": "string", "required": True, "uppercase": True},
             "side": {"type": "string", "required": True, "enum": ["BUY", "SELL"]},
-            "qty": {"type": "number", "required": True},
+            "qty": {"type": "number", "required": True, "exclusiveMinimum": 0},
         },
         "handler": risk_check_trade,
+        "read_only": True,
     },
     "oms.place_order": {
         "description": "Place a paper order (demo – fills immediately)",
         "parameters": {
-            "symbol": {"type": "string", "required": True},
+            "symbol": {"type": "string", "required": True, "uppercase": True},
             "side": {"type": "string", "required": True, "enum": ["BUY", "SELL"]},
-            "qty": {"type": "number", "required": True},
+            "qty": {"type": "number", "required": True, "exclusiveMinimum": 0},
+            "workflow_id": {
+                "type": "string",
+                "required": False,
+                "description": "Idempotency key: one order per workflow",
+            },
         },
         "handler": oms_place_order,
+        "read_only": False,
+        "max_concurrency": 8,
+        "invalidates": ["db.get_workflow", "db.list_audit"],
     },
     "db.get_workflow": {
         "description": "Retrieve a workflow by ID",
         "parameters": {"workflow_id": {"type": "string", "required": True}},
         "handler": db_get_workflow,
+        "read_only": True,
+        "max_concurrency": 8,
+        "cache": {"ttl": 2.0, "max_entries": 1024, "key": ["workflow_id"]},
     },
     "db.list_audit": {
         "description": "List recent audit log entries",
         "parameters": {"limit": {"type": "integer", "required": False, "default": 20}},
         "handler": db_list_audit,
+        "read_only": True,
+        "max_concurrency": 4,
+        "cache": {"ttl": 1.0, "max_entries": 64, "key": ["limit"]},
     },
 }
 
 
-def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Any:
+# ── Argument validation ──────────────────────────────────────────────
+
+_validators: Dict[str, Validator] = {
+    name: compile_params(meta["parameters"]) for name, meta in TOOL_REGISTRY.items()
+}
+
+
+def input_schema(tool_name: str) -> Dict[str, Any]:
+    """JSON Schema of a tool's arguments."""
+    return to_json_schema(TOOL_REGISTRY[tool_name]["parameters"])
+
+
+# ── Concurrency limits ───────────────────────────────────────────────
+
+_semaphores: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+
+
+def concurrency_limit(tool_name: str) -> Optional[int]:
+    """Max concurrent calls of a tool; None for plain handlers (run inline)."""
+    meta = TOOL_REGISTRY[tool_name]
+    if not inspect.iscoroutinefunction(meta["handler"]):
+        return None
+    return max(1, meta.get("max_concurrency", settings.MCP_TOOL_CONCURRENCY))
+
+
+def _semaphore(tool_name: str) -> asyncio.Semaphore:
+    # One per event loop: a semaphore is bound to the loop it first waits on
+    loop = asyncio.get_running_loop()
+    entry = _semaphores.get(tool_name)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, asyncio.Semaphore(concurrency_limit(tool_name)))
+        _semaphores[tool_name] = entry
+    return entry[1]
+
+
+# ── Result caches ────────────────────────────────────────────────────
+
+def _build_caches() -> Dict[str, TTLCache]:
+    return {
+        name: TTLCache(
+            f"mcp.{name}",
+            max_entries=meta["cache"].get("max_entries", 1024),
+            ttl=meta["cache"].get("ttl", 1.0),
+        )
+        for name, meta in TOOL_REGISTRY.items()
+        if meta.get("cache")
+    }
+
+
+_caches = _build_caches()
+
+
+def _cache_key(tool_name: str, arguments: Dict[str, Any]) -> Hashable:
+    names = TOOL_REGISTRY[tool_name]["cache"].get("key")
+    if names is None:
+        return json.dumps(arguments, sort_keys=True, default=str)
+    params = TOOL_REGISTRY[tool_name]["parameters"]
+    return tuple(arguments.get(n, params.get(n, {}).get("default")) for n in names)
+
+
+def _copy(value: Any) -> Any:
+    # Cached results are shared: callers get their own dicts and lists
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def invalidate(tool_name: str) -> None:
+    """Drop every cached result of ``tool_name``."""
+    cache = _caches.get(tool_name)
+    if cache is not None:
+        cache.clear()
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def is_read_only(tool_name: str) -> bool:
+    """Unknown tools count as read-only: they only return an error."""
+    return TOOL_REGISTRY.get(tool_name, {}).get("read_only", True)
+
+
+async def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Any:
     """Dispatch a tool call to the appropriate handler."""
     if tool_name not in TOOL_REGISTRY:
         return {"error": f"unknown tool: {tool_name}", "available": list(TOOL_REGISTRY.keys())}
-    handler = TOOL_REGISTRY[tool_name]["handler"]
-    return handler(**arguments)
+    meta = TOOL_REGISTRY[tool_name]
+    try:
+        arguments = _validators[tool_name](arguments)
+    except ArgumentError as e:
+        return {"error": "invalid arguments", "tool": tool_name, "details": e.errors}
+    cache = _caches.get(tool_name)
+    if cache is not None:
+        key = _cache_key(tool_name, arguments)
+        result = cache.get(key)
+        if result is not None:
+            return _copy(result)
+
+    handler = meta["handler"]
+    if inspect.iscoroutinefunction(handler):
+        async with _semaphore(tool_name):
+            result = await handler(**arguments)
+    else:
+        result = handler(**arguments)
+
+    failed = isinstance(result, dict) and "error" in result
+    if cache is not None and not failed:
+        cache.set(key, _copy(result))
+    if not failed:
+        for name in meta.get("invalidates", ()):
+            invalidate(name)
+    return result
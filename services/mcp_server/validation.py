@@ -0,0 +1,180 @@
+"""Tool argument validation compiled from the TOOL_REGISTRY parameter specs.
+
+`compile_params()` turns a spec such as
+``{"qty": {"type": "number", "required": True}}`` into a validator built once
+at registration: one small checker per parameter, so a call only pays for a
+few dict lookups and type checks. Validators coerce what agents commonly send
+(numeric strings, integral floats, lower-case enum values, ``uppercase``
+strings such as symbols), fill defaults,
+and reject unknown, missing, ill-typed, non-finite or out-of-bounds arguments with an `ArgumentError`
+listing every problem. `to_json_schema()` exports the same spec as JSON Schema.
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Tuple
+
+Checker = Callable[[Any], Any]
+Validator = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+_JSON_TYPES = {"string": "string", "number": "number", "integer": "integer", "boolean": "boolean"}
+
+
+class ArgumentError(ValueError):
+    """Invalid tool arguments; ``errors`` lists one message per problem."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _string(value: Any) -> str:
+    if not isinstance(value, str):
+        raise TypeError("expected a string")
+    return value
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool):
+        raise TypeError("expected a number")
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise TypeError("expected a number") from None
+    if not isinstance(value, (int, float)):
+        raise TypeError("expected a number")
+    # NaN compares False against every limit, so it would slip past risk checks
+    if not math.isfinite(value):
+        raise TypeError("expected a finite number")
+    return value
+
+
+def _integer(value: Any) -> int:
+    if isinstance(value, bool):
+        raise TypeError("expected an integer")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise TypeError("expected an integer")
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise TypeError("expected a boolean")
+
+
+_TYPE_CHECKERS: Dict[str, Checker] = {
+    "string": _string,
+    "number": _number,
+    "integer": _integer,
+    "boolean": _boolean,
+}
+
+
+def _with_upper(check: Checker) -> Checker:
+    def checker(value: Any) -> Any:
+        return check(value).upper()
+
+    return checker
+
+
+def _with_enum(check: Checker, enum: List[Any]) -> Checker:
+    # Case-insensitive for strings, normalised to the declared spelling
+    canonical = {v.upper() if isinstance(v, str) else v: v for v in enum}
+
+    def checker(value: Any) -> Any:
+        value = check(value)
+        key = value.upper() if isinstance(value, str) else value
+        if key not in canonical:
+            raise TypeError(f"expected one of {enum}")
+        return canonical[key]
+
+    return checker
+
+
+_BOUNDS = (
+    ("minimum", lambda v, b: v >= b, ">="),
+    ("exclusiveMinimum", lambda v, b: v > b, ">"),
+    ("maximum", lambda v, b: v <= b, "<="),
+    ("exclusiveMaximum", lambda v, b: v < b, "<"),
+)
+
+
+def _with_bounds(check: Checker, param: Dict[str, Any]) -> Checker:
+    bounds = [(param[key], test, op) for key, test, op in _BOUNDS if key in param]
+
+    def checker(value: Any) -> Any:
+        value = check(value)
+        for bound, test, op in bounds:
+            if not test(value, bound):
+                raise TypeError(f"must be {op} {bound}")
+        return value
+
+    return checker
+
+
+def compile_params(spec: Dict[str, Dict[str, Any]]) -> Validator:
+    """Build the validator for one tool's ``parameters`` spec."""
+    fields: List[Tuple[str, Checker, bool, bool, Any]] = []
+    for name, param in spec.items():
+        type_name = param.get("type", "string")
+        if type_name not in _TYPE_CHECKERS:
+            raise ValueError(f"parameter {name}: unsupported type {type_name!r}")
+        check = _TYPE_CHECKERS[type_name]
+        if param.get("uppercase"):
+            check = _with_upper(check)
+        if "enum" in param:
+            check = _with_enum(check, list(param["enum"]))
+        if any(key in param for key, _, _ in _BOUNDS):
+            check = _with_bounds(check, param)
+        fields.append(
+            (name, check, bool(param.get("required")), "default" in param, param.get("default"))
+        )
+    known = frozenset(spec)
+
+    def validate(arguments: Dict[str, Any]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        errors: List[str] = []
+        for name, check, required, has_default, default in fields:
+            if name in arguments:
+                try:
+                    out[name] = check(arguments[name])
+                except TypeError as e:
+                    errors.append(f"{name}: {e}")
+            elif has_default:
+                out[name] = default
+            elif required:
+                errors.append(f"{name}: required")
+        if not known.issuperset(arguments):
+            errors.extend(f"{name}: unknown argument" for name in arguments if name not in known)
+        if errors:
+            raise ArgumentError(errors)
+        return out
+
+    return validate
+
+
+def to_json_schema(spec: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """JSON Schema (draft 2020-12 subset) of a ``parameters`` spec."""
+    properties: Dict[str, Any] = {}
+    for name, param in spec.items():
+        prop: Dict[str, Any] = {"type": _JSON_TYPES[param.get("type", "string")]}
+        for key in ("enum", "default", "description", *(key for key, _, _ in _BOUNDS)):
+            if key in param:
+                prop[key] = param[key]
+        properties[name] = prop
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [name for name, param in spec.items() if param.get("required")],
+        "additionalProperties": False,
+    }
@@ -1,5 +1,7 @@
 from services.common.logging import setup_logging
 from services.common.kafka import consumer, consume_forever
+from services.common.loopmon import start_loop_monitor
+from services.common.otel import set_service
 
 log = setup_logging("notifier")
 
@@ -8,6 +10,8 @@ async def handler(topic: str, msg: dict):
         log.info("NOTIFY topic=%s payload=%s", topic, msg.get("payload"))
 
 async def main():
+    set_service("notifier")
+    start_loop_monitor("notifier")
     cons = consumer(
         ["workflow.requested","genai.review.created","workflow.approved","orders.filled","risk.breach","audit.logged"],
         group_id="notifier"
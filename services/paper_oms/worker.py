@@ -1,9 +1,12 @@
 import random
 import uuid
+import zlib
 from datetime import datetime, timezone
 from services.common.logging import setup_logging
 from services.common.kafka import consumer, consume_forever, publish
-from services.common.db import execute, fetchone
+from services.common.loopmon import start_loop_monitor
+from services.common.otel import set_service
+from services.common.db import fetchone
 from services.common.audit import publish_audit
 
 log = setup_logging("paper-oms")
@@ -21,13 +24,19 @@ async def handler(topic: str, msg: dict):
     symbol = payload["symbol"]
     side = payload["side"]
     qty = float(payload["qty"])
-    fill_price = 100 + (hash(symbol) % 1000) / 10.0 + random.uniform(-0.2, 0.2)
+    # Around the market-data synthetic price
+    fill_price = 100 + (zlib.crc32(symbol.upper().encode()) % 1000) / 10.0 + random.uniform(-0.2, 0.2)
 
     order_id = str(uuid.uuid4())
-    execute(
-        "INSERT INTO orders(order_id, workflow_id, status, symbol, side, qty, fill_price) VALUES (%s,%s,%s,%s,%s,%s,%s)",
+    # One order per workflow (unique index): a redelivered approval fills nothing
+    placed = fetchone(
+        "INSERT INTO orders(order_id, workflow_id, status, symbol, side, qty, fill_price) VALUES (%s,%s,%s,%s,%s,%s,%s) "
+        "ON CONFLICT (workflow_id) DO NOTHING RETURNING order_id",
         (order_id, workflow_id, "FILLED", symbol, side, qty, fill_price),
     )
+    if placed is None:
+        log.info("order already placed workflow_id=%s", workflow_id)
+        return
 
     correlation_id = msg.get("correlation_id") or str(uuid.uuid4())
     data = {"order_id": order_id, "workflow_id": workflow_id, "symbol": symbol, "side": side, "qty": qty, "fill_price": fill_price}
@@ -44,6 +53,8 @@ async def handler(topic: str, msg: dict):
     log.info("paper filled order_id=%s workflow_id=%s", order_id, workflow_id)
 
 async def main():
+    set_service("paper-oms")
+    start_loop_monitor("paper-oms")
     cons = consumer(["workflow.approved"], group_id="paper-oms")
     await consume_forever(cons, handler)
 
@@ -0,0 +1,90 @@
+"""Request micro-batcher.
+
+Coalesces items submitted concurrently from the event loop into a single call of
+a batch function, run on a dedicated executor. A batch is flushed when it reaches
+``max_batch`` items or ``max_wait_ms`` after its first item, whichever comes first,
+so an isolated request waits at most ``max_wait_ms`` while a burst of agent
+queries costs one ``encode`` call instead of one per query.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Generic, List, Optional, Tuple, TypeVar
+
+from prometheus_client import Histogram
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+batch_size = Histogram(
+    "microbatch_size",
+    "Number of items per flushed batch",
+    ["batcher"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+batch_duration_seconds = Histogram(
+    "microbatch_duration_seconds",
+    "Time spent running one batch on the executor",
+    ["batcher"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects ``submit()`` calls and runs ``fn(items) -> results`` per batch."""
+
+    def __init__(
+        self,
+        fn: Callable[[List[T]], List[R]],
+        executor: Optional[Executor] = None,
+        max_batch: int = 32,
+        max_wait_ms: float = 2.0,
+        name: str = "default",
+    ):
+        self._fn = fn
+        self._executor = executor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._pending: List[Tuple[T, "asyncio.Future[R]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: "set[asyncio.Task[Any]]" = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        fut: "asyncio.Future[R]" = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            self._pending = self._pending[self.max_batch :]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, "asyncio.Future[R]"]]) -> None:
+        loop = asyncio.get_running_loop()
+        batch_size.labels(batcher=self.name).observe(len(batch))
+        items = [item for item, _ in batch]
+        start = loop.time()
+        try:
+            results = await loop.run_in_executor(self._executor, self._fn, items)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            batch_duration_seconds.labels(batcher=self.name).observe(loop.time() - start)
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():  # caller may have been cancelled
+                fut.set_result(res)
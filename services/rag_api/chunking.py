@@ -0,0 +1,190 @@
+"""Structure-aware markdown chunker.
+
+Splits documents along markdown sections and paragraphs instead of fixed word
+windows, so a rule is never cut away from its heading. Chunks are bounded in
+tokens (as counted by the embedding model's tokenizer when available), may
+overlap by a few tokens inside a section, and every chunk is prefixed with its
+heading path to give the embedding some context.
+
+Input is an iterable of lines (e.g. an open file), consumed lazily: only the
+chunk being built is held in memory.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+TokenCounter = Callable[[str], int]
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s{0,3}([-*+]|\d+[.)])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str
+    tokens: int
+
+
+def word_count(text: str) -> int:
+    """Fallback token counter when no tokenizer is available."""
+    return len(text.split())
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield ``(section, paragraph)`` pairs from markdown lines.
+
+    ``section`` is the heading path (``"Title > Subtitle"``). Top-level list
+    items are blocks of their own; fenced code blocks are kept whole (an
+    oversized one is later split on line boundaries).
+    """
+    headings: List[str] = []
+    buf: List[str] = []
+    in_fence = False
+
+    def section() -> str:
+        return " > ".join(headings)
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            buf.append(line)
+            continue
+        if in_fence:
+            buf.append(line)
+            continue
+        m = _HEADING.match(line)
+        if m:
+            if buf:
+                yield section(), "\n".join(buf)
+                buf = []
+            level = len(m.group(1))
+            headings = headings[: level - 1] + [m.group(2)]
+            continue
+        if not line.strip() or _LIST_ITEM.match(line):
+            if buf:
+                yield section(), "\n".join(buf)
+                buf = []
+            if not line.strip():
+                continue
+        buf.append(line)
+    if buf:
+        yield section(), "\n".join(buf)
+
+
+def _split_words(text: str, budget: int, count_tokens: TokenCounter) -> Iterator[Tuple[str, int]]:
+    """Split an oversized paragraph on word boundaries into <= budget pieces."""
+    words: List[str] = []
+    used = 0
+    for w in text.split():
+        n = count_tokens(w) or 1
+        if words and used + n > budget:
+            yield " ".join(words), used
+            words, used = [], 0
+        words.append(w)
+        used += n
+    if words:
+        yield " ".join(words), used
+
+
+def _split_lines(text: str, budget: int, count_tokens: TokenCounter) -> Iterator[Tuple[str, int]]:
+    """Split an oversized code block on line boundaries into <= budget pieces.
+
+    Line breaks are kept; only a single line over budget is split on words.
+    """
+    lines: List[str] = []
+    used = 0
+    for line in text.split("\n"):
+        n = count_tokens(line)
+        if n > budget:
+            if lines:
+                yield "\n".join(lines), used
+                lines, used = [], 0
+            yield from _split_words(line, budget, count_tokens)
+            continue
+        if lines and used + n > budget:
+            yield "\n".join(lines), used
+            lines, used = [], 0
+        lines.append(line)
+        used += n
+    if lines:
+        yield "\n".join(lines), used
+
+
+def _tail(parts: List[Tuple[str, int]], overlap: int, count_tokens: TokenCounter):
+    """Trailing parts (or words of the last part) fitting in ``overlap`` tokens."""
+    if overlap <= 0 or not parts:
+        return []
+    kept: List[Tuple[str, int]] = []
+    used = 0
+    for text, n in reversed(parts):
+        if used + n <= overlap:
+            kept.insert(0, (text, n))
+            used += n
+            continue
+        if not kept:
+            words = text.split()
+            tail_words: List[str] = []
+            for w in reversed(words):
+                wn = count_tokens(w) or 1
+                if used + wn > overlap:
+                    break
+                tail_words.insert(0, w)
+                used += wn
+            if tail_words:
+                kept.append((" ".join(tail_words), used))
+        break
+    return kept
+
+
+def chunk_markdown(
+    lines: Iterable[str],
+    max_tokens: int = 256,
+    overlap: int = 0,
+    count_tokens: Optional[TokenCounter] = None,
+) -> Iterator[Chunk]:
+    """Stream chunks of at most ``max_tokens`` tokens from markdown lines."""
+    count = count_tokens or word_count
+    overlap = min(overlap, max_tokens // 2)
+
+    current: Optional[str] = None
+    parts: List[Tuple[str, int]] = []
+    used = 0
+    budget = max_tokens
+    fresh = 0  # parts added since the last emitted chunk (overlap excluded)
+
+    def emit() -> Chunk:
+        body = "\n".join(t for t, _ in parts)
+        text = f"{current}\n\n{body}" if current else body
+        return Chunk(text=text, section=current or "", tokens=max_tokens - budget + used)
+
+    for section, para in iter_blocks(lines):
+        if section != current:
+            if fresh:
+                yield emit()
+            current, parts, used, fresh = section, [], 0, 0
+            budget = max(1, max_tokens - (count(section) if section else 0))
+        n = count(para)
+        if n <= budget:
+            pieces = [(para, n)]
+        elif _FENCE.match(para):
+            pieces = list(_split_lines(para, budget, count))
+        else:
+            pieces = list(_split_words(para, budget, count))
+        for piece, pn in pieces:
+            if fresh and used + pn > budget:
+                yield emit()
+                parts = _tail(parts, overlap, count)
+                used = sum(k for _, k in parts)
+                fresh = 0
+                # Drop overlap that would not leave room for the new piece
+                while parts and used + pn > budget:
+                    used -= parts.pop(0)[1]
+            parts.append((piece, pn))
+            used += pn
+            fresh += 1
+    if fresh:
+        yield emit()
@@ -3,13 +3,21 @@
 Provides:
   POST /ingest  – ingest documents from docs/knowledge_base/* or rag_corpus/*
   POST /query   – semantic search returning top-k passages + scores
-  GET  /health  – liveness / readiness probe
+  GET  /health  – liveness probe (+ readiness flag)
+  GET  /health/ready – readiness probe (503 until the model is loaded and warm)
+  GET  /cache   – embedding / result cache statistics
+
+Encoding never runs on the event loop: model load, warm-up, ingestion and
+searches go to a dedicated worker pool, and concurrent /query calls are
+coalesced by a micro-batcher into a single encode + Qdrant batch.
 """
 
+import asyncio
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import PlainTextResponse
@@ -18,6 +26,8 @@ from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 from services.common.logging import setup_logging
 from services.common.metrics import install
+from services.rag_api.batcher import MicroBatcher
+from services.rag_api.chunking import TokenCounter, chunk_markdown
 from services.rag_api.vectorstore import VectorStore
 
 log = setup_logging("rag-api")
@@ -27,26 +37,87 @@ install(app, "rag-api")
 
 # Global vector store instance – initialised on startup
 _store: Optional[VectorStore] = None
+# Set once the model is loaded and a warm-up encode/search has run
+_ready = False
+
+CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "32"))
+INGEST_BATCH_SIZE = 64
+# Start-up retries (Qdrant may come up after us): 1 s, doubling up to this
+WARM_UP_RETRY_MAX_S = float(os.getenv("RAG_WARM_UP_RETRY_MAX_S", "30"))
+
+# Dedicated encode pool. torch releases the GIL inside encode, so threads give
+# real parallelism without loading one model copy per process.
+_pool: Optional[ThreadPoolExecutor] = None
+_batcher: Optional[MicroBatcher[Tuple[str, int], List[Dict]]] = None
+
+
+def _build_store() -> VectorStore:
+    """Load the model (once; the Qdrant client connects lazily)."""
+    return VectorStore(
+        qdrant_url=os.getenv("QDRANT_URL", "http://qdrant:6333"),
+        collection=os.getenv("QDRANT_COLLECTION", "tradeops_kb"),
+        embedding_model=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        cache_ttl=float(os.getenv("RAG_CACHE_TTL_S", "300")),
+        embedding_cache_bytes=int(os.getenv("RAG_EMBEDDING_CACHE_BYTES", str(16 * 1024 * 1024))),
+        result_cache_bytes=int(os.getenv("RAG_RESULT_CACHE_BYTES", str(8 * 1024 * 1024))),
+    )
+
+
+def _prepare_store(store: VectorStore) -> None:
+    store.ensure_collection()
+    store.warm_up()
+    log.info("VectorStore ready collection=%s", store.collection)
+
+
+async def _warm_up():
+    """Build and warm the store, retrying with backoff until it succeeds."""
+    global _store, _batcher, _ready
+    loop = asyncio.get_running_loop()
+    store: Optional[VectorStore] = None
+    delay = 1.0
+    while True:
+        try:
+            if store is None:
+                store = await loop.run_in_executor(_pool, _build_store)
+            await loop.run_in_executor(_pool, _prepare_store, store)
+            break
+        except Exception as e:
+            log.warning("VectorStore initialisation failed (%r) – unready, retrying in %.0fs",
+                        e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_UP_RETRY_MAX_S)
+    _store = store
+    _batcher = MicroBatcher(
+        store.search_many,
+        _pool,
+        max_batch=int(os.getenv("RAG_BATCH_MAX_SIZE", "32")),
+        max_wait_ms=float(os.getenv("RAG_BATCH_MAX_WAIT_MS", "2")),
+        name="rag-query",
+    )
+    _ready = True
 
 
 @app.on_event("startup")
 async def _startup():
-    global _store
-    qdrant_url = os.getenv("QDRANT_URL", "http://qdrant:6333")
-    collection = os.getenv("QDRANT_COLLECTION", "tradeops_kb")
-    embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    _store = VectorStore(
-        qdrant_url=qdrant_url,
-        collection=collection,
-        embedding_model=embedding_model,
-    )
-    _store.ensure_collection()
-    log.info(
-        "VectorStore ready qdrant=%s collection=%s model=%s",
-        qdrant_url,
-        collection,
-        embedding_model,
+    global _pool
+    _pool = ThreadPoolExecutor(
+        max_workers=int(os.getenv("RAG_ENCODE_WORKERS", "2")),
+        thread_name_prefix="rag-encode",
     )
+    # Load + warm the model in the background so liveness answers meanwhile
+    app.state.warm_up_task = asyncio.create_task(_warm_up())
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    global _ready
+    _ready = False
+    task = getattr(app.state, "warm_up_task", None)
+    if task is not None:
+        task.cancel()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
 
 
 # ── Schemas ──────────────────────────────────────────────────────────
@@ -56,6 +127,8 @@ class IngestRequest(BaseModel):
         default="/app/rag_corpus",
         description="Path inside the container to scan for .md / .txt files",
     )
+    max_tokens: Optional[int] = Field(default=None, ge=16, description="Chunk size in tokens")
+    overlap: Optional[int] = Field(default=None, ge=0, description="Overlap between chunks")
 
 
 class IngestResponse(BaseModel):
@@ -82,7 +155,14 @@ class QueryResponse(BaseModel):
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "rag-api"}
+    return {"status": "ok", "service": "rag-api", "ready": _ready}
+
+
+@app.get("/health/ready")
+def readiness():
+    if not _ready:
+        raise HTTPException(503, "warming up")
+    return {"status": "ready", "service": "rag-api"}
 
 
 @app.get("/metrics")
@@ -93,27 +173,55 @@ def metrics():
     )
 
 
+@app.get("/cache")
+def cache_stats():
+    if _store is None:
+        return {}
+    return _store.cache_stats()
+
+
 @app.post("/ingest", response_model=IngestResponse)
-def ingest(req: IngestRequest):
+async def ingest(req: IngestRequest):
     """Ingest markdown / text files from a directory into Qdrant."""
-    assert _store is not None
     base = Path(req.directory)
     if not base.is_dir():
         raise HTTPException(400, f"directory not found: {req.directory}")
+    if _store is None:
+        raise HTTPException(503, "warming up")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, _ingest_directory, _store, base, req)
+
+
+def _ingest_directory(store: VectorStore, base: Path, req: IngestRequest) -> IngestResponse:
+    max_tokens = req.max_tokens or CHUNK_MAX_TOKENS
+    # Never build chunks the embedding model would silently truncate
+    if store.max_seq_length:
+        max_tokens = min(max_tokens, store.max_seq_length - 2)
+    overlap = CHUNK_OVERLAP_TOKENS if req.overlap is None else req.overlap
 
     files_ingested: List[str] = []
     total = 0
     for fp in sorted(base.rglob("*")):
         if fp.suffix.lower() not in (".md", ".txt"):
             continue
-        text = fp.read_text(encoding="utf-8", errors="replace").strip()
-        if not text:
+        # A shorter new version would otherwise leave its old trailing chunks behind
+        store.delete_source(fp.name)
+        n = 0
+        batch: List[Tuple[str, str, Dict]] = []
+        with fp.open(encoding="utf-8", errors="replace") as fh:
+            for chunk in chunk_markdown(fh, max_tokens, overlap, store.count_tokens):
+                doc_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{fp.name}:{n}"))
+                batch.append(
+                    (doc_id, chunk.text, {"source": fp.name, "chunk": n, "section": chunk.section})
+                )
+                n += 1
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    store.upsert_many(batch)
+                    batch = []
+        store.upsert_many(batch)
+        if not n:
             continue
-        chunks = _chunk_text(text, max_tokens=256)
-        for i, chunk in enumerate(chunks):
-            doc_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{fp.name}:{i}"))
-            _store.upsert(doc_id=doc_id, text=chunk, metadata={"source": fp.name, "chunk": i})
-            total += 1
+        total += n
         files_ingested.append(fp.name)
 
     log.info("ingested %d chunks from %d files", total, len(files_ingested))
@@ -121,10 +229,13 @@ def ingest(req: IngestRequest):
 
 
 @app.post("/query", response_model=QueryResponse)
-def query(req: QueryRequest):
+async def query(req: QueryRequest):
     """Semantic search over the knowledge base."""
-    assert _store is not None
-    results = _store.search(req.question, top_k=req.top_k)
+    if not _ready or _store is None or _batcher is None:
+        raise HTTPException(503, "warming up")
+    results = _store.cached_search(req.question, top_k=req.top_k)
+    if results is None:
+        results = await _batcher.submit((req.question, req.top_k))
     hits = [
         PassageHit(source=r["source"], text=r["text"], score=round(r["score"], 4))
         for r in results
@@ -134,16 +245,12 @@ def query(req: QueryRequest):
 
 # ── Helpers ──────────────────────────────────────────────────────────
 
-def _chunk_text(text: str, max_tokens: int = 256) -> List[str]:
-    """Naive sentence-boundary chunking (good enough for demo)."""
-    words = text.split()
-    chunks: List[str] = []
-    buf: List[str] = []
-    for w in words:
-        buf.append(w)
-        if len(buf) >= max_tokens:
-            chunks.append(" ".join(buf))
-            buf = []
-    if buf:
-        chunks.append(" ".join(buf))
-    return chunks
+def _chunk_text(
+    text: str,
+    max_tokens: int = 256,
+    overlap: int = 0,
+    count_tokens: Optional[TokenCounter] = None,
+) -> List[str]:
+    """Chunk an in-memory document along markdown sections / paragraphs."""
+    chunks = chunk_markdown(text.splitlines(), max_tokens, overlap, count_tokens)
+    return [c.text for c in chunks]
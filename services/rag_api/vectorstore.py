@@ -3,10 +3,16 @@
 Provides a *no-embeddings* fallback when sentence-transformers is unavailable
 (e.g. CI environment) – in that mode, /ingest and /query still respond but
 return empty results with a clear warning.
+
+Queries go through two caches: query embeddings keyed by normalised text, and
+search results keyed by (query, top_k, collection version). Any upsert bumps the
+collection version, so results cached before an ingest are never served after it.
 """
 
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.common.cache import TTLCache
 
 log = logging.getLogger("rag-api.vectorstore")
 
@@ -22,7 +28,12 @@ try:
     from qdrant_client import QdrantClient  # type: ignore[import-untyped]
     from qdrant_client.models import (  # type: ignore[import-untyped]
         Distance,
+        FieldCondition,
+        Filter,
+        FilterSelector,
+        MatchValue,
         PointStruct,
+        SearchRequest,
         VectorParams,
     )
     _QDRANT_AVAILABLE = True
@@ -31,6 +42,9 @@ except ImportError:
     log.warning("qdrant-client not installed – running in no-embeddings fallback mode")
 
 
+WARM_UP_QUERY = "What is the maximum exposure per symbol?"
+
+
 class VectorStore:
     """Abstraction over Qdrant for document ingestion and semantic search."""
 
@@ -40,11 +54,21 @@ class VectorStore:
         collection: str = "tradeops_kb",
         embedding_model: str = "all-MiniLM-L6-v2",
         vector_size: int = 384,
+        cache_ttl: float = 300.0,
+        embedding_cache_bytes: int = 16 * 1024 * 1024,
+        result_cache_bytes: int = 8 * 1024 * 1024,
     ):
         self.collection = collection
         self.vector_size = vector_size
         self._client: Optional[Any] = None
         self._model: Optional[Any] = None
+        self._version = 0
+        self._embedding_cache = TTLCache(
+            "rag_embedding", max_entries=0, max_bytes=embedding_cache_bytes, ttl=cache_ttl
+        )
+        self._result_cache = TTLCache(
+            "rag_result", max_entries=0, max_bytes=result_cache_bytes, ttl=cache_ttl
+        )
 
         if _QDRANT_AVAILABLE:
             self._client = QdrantClient(url=qdrant_url, timeout=10)
@@ -66,17 +90,56 @@ class VectorStore:
             )
             log.info("Created Qdrant collection %s (dim=%d)", self.collection, self.vector_size)
 
+    # ── Tokenizer ────────────────────────────────────────────────────
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        """Longest input (in tokens) the embedding model encodes without truncating."""
+        return getattr(self._model, "max_seq_length", None) if self._model else None
+
+    def count_tokens(self, text: str) -> int:
+        """Token count with the embedding model's tokenizer (word count as fallback)."""
+        tokenizer = getattr(self._model, "tokenizer", None) if self._model else None
+        if tokenizer is None:
+            return len(text.split())
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
     # ── Write ────────────────────────────────────────────────────────
 
     def upsert(self, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
-        if self._client is None or self._model is None:
+        self.upsert_many([(doc_id, text, metadata or {})])
+
+    def upsert_many(self, docs: Sequence[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Encode and upsert ``(doc_id, text, metadata)`` triples in one batch."""
+        if self._client is None or self._model is None or not docs:
+            return
+        vecs = self._model.encode([text for _, text, _ in docs])
+        points = [
+            PointStruct(id=doc_id, vector=vec.tolist(), payload={"text": text, **metadata})
+            for (doc_id, text, metadata), vec in zip(docs, vecs)
+        ]
+        self._client.upsert(collection_name=self.collection, points=points)
+        self.invalidate()
+
+    def delete_source(self, source: str) -> None:
+        """Delete every point ingested from ``source`` (the payload's file name)."""
+        if self._client is None:
             return
-        vec = self._model.encode(text).tolist()
-        payload = {"text": text, **(metadata or {})}
-        self._client.upsert(
+        self._client.delete(
             collection_name=self.collection,
-            points=[PointStruct(id=doc_id, vector=vec, payload=payload)],
+            points_selector=FilterSelector(
+                filter=Filter(must=[FieldCondition(key="source", match=MatchValue(value=source))])
+            ),
         )
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Bump the collection version and drop cached search results.
+
+        Embeddings only depend on the model, so that cache is kept.
+        """
+        self._version += 1
+        self._result_cache.clear()
 
     # ── Read ─────────────────────────────────────────────────────────
 
@@ -84,19 +147,90 @@ class VectorStore:
         if self._client is None or self._model is None:
             log.warning("no-embeddings mode – returning empty results for query: %s", query[:80])
             return []
-        vec = self._model.encode(query).tolist()
-        hits = self._client.search(
-            collection_name=self.collection,
-            query_vector=vec,
-            limit=top_k,
-        )
-        results: List[Dict[str, Any]] = []
-        for h in hits:
-            results.append(
-                {
-                    "source": (h.payload or {}).get("source", "unknown"),
-                    "text": (h.payload or {}).get("text", ""),
-                    "score": h.score,
-                }
+        return self.search_many([(query, top_k)])[0]
+
+    def cached_search(self, query: str, top_k: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """Result-cache lookup only; cheap enough to call from the event loop."""
+        return self._result_cache.get((normalize_query(query), top_k, self._version))
+
+    def search_many(self, queries: Sequence[Tuple[str, int]]) -> List[List[Dict[str, Any]]]:
+        """Search several ``(query, top_k)`` pairs with one encode and one Qdrant call."""
+        if self._client is None or self._model is None:
+            log.warning("no-embeddings mode – returning empty results for %d queries", len(queries))
+            return [[] for _ in queries]
+        version = self._version
+        keys = [normalize_query(q) for q, _ in queries]
+        out: List[Optional[List[Dict[str, Any]]]] = [
+            self._result_cache.get((key, top_k, version)) for key, (_, top_k) in zip(keys, queries)
+        ]
+        todo = [i for i, res in enumerate(out) if res is None]
+        if not todo:
+            return out  # type: ignore[return-value]
+
+        vecs = self._embed_queries([keys[i] for i in todo])
+        if len(todo) == 1:
+            hits_per_query = [
+                self._client.search(
+                    collection_name=self.collection,
+                    query_vector=vecs[0].tolist(),
+                    limit=queries[todo[0]][1],
+                )
+            ]
+        else:
+            hits_per_query = self._client.search_batch(
+                collection_name=self.collection,
+                requests=[
+                    SearchRequest(vector=vec.tolist(), limit=queries[i][1], with_payload=True)
+                    for i, vec in zip(todo, vecs)
+                ],
+            )
+        for i, hits in zip(todo, hits_per_query):
+            results = [_to_result(h) for h in hits]
+            self._result_cache.set((keys[i], queries[i][1], version), results)
+            out[i] = results
+        return out  # type: ignore[return-value]
+
+    def _embed_queries(self, keys: List[str]) -> List[Any]:
+        """Embeddings for normalised queries, encoding cache misses in one batch."""
+        vecs = [self._embedding_cache.get(key) for key in keys]
+        missing = sorted({key for key, vec in zip(keys, vecs) if vec is None})
+        if missing:
+            encoded = dict(zip(missing, self._model.encode(missing)))  # type: ignore[union-attr]
+            for key, vec in encoded.items():
+                self._embedding_cache.set(key, vec)
+            vecs = [vec if vec is not None else encoded[key] for key, vec in zip(keys, vecs)]
+        return vecs
+
+    def warm_up(self) -> None:
+        """Encode a real query and search the collection with it, so the first
+        /query doesn't pay lazy init costs (caches are left untouched)."""
+        if self._model is None:
+            return
+        vec = self._model.encode([normalize_query(WARM_UP_QUERY)])[0]
+        if self._client is not None:
+            self._client.search(
+                collection_name=self.collection,
+                query_vector=vec.tolist(),
+                limit=1,
             )
-        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "collection_version": self._version,
+            "embedding": self._embedding_cache.stats(),
+            "result": self._result_cache.stats(),
+        }
+
+
+def _to_result(hit: Any) -> Dict[str, Any]:
+    payload = hit.payload or {}
+    return {
+        "source": payload.get("source", "unknown"),
+        "text": payload.get("text", ""),
+        "score": hit.score,
+    }
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: collapse whitespace so templated prompts coincide."""
+    return " ".join(query.split())
@@ -2,6 +2,8 @@ import uuid
 from datetime import datetime, timezone
 from services.common.logging import setup_logging
 from services.common.kafka import consumer, consume_forever, publish
+from services.common.loopmon import start_loop_monitor
+from services.common.otel import set_service
 from services.common.audit import publish_audit
 
 log = setup_logging("risk-engine")
@@ -29,6 +31,8 @@ async def handler(topic: str, msg: dict):
         log.warning("risk breach %s", data)
 
 async def main():
+    set_service("risk-engine")
+    start_loop_monitor("risk-engine")
     cons = consumer(["signals.generated"], group_id="risk-engine")
     await consume_forever(cons, handler)
 
@@ -2,6 +2,8 @@ import uuid
 from datetime import datetime, timezone
 from services.common.logging import setup_logging
 from services.common.kafka import consumer, consume_forever, publish
+from services.common.loopmon import start_loop_monitor
+from services.common.otel import set_service
 
 log = setup_logging("signal-engine")
 
@@ -26,6 +28,8 @@ async def handler(topic: str, msg: dict):
     log.info("signal generated symbol=%s side=%s price=%s corr=%s", symbol, side, last, correlation_id)
 
 async def main():
+    set_service("signal-engine")
+    start_loop_monitor("signal-engine")
     cons = consumer(["market.prices"], group_id="signal-engine")
     await consume_forever(cons, handler)
 
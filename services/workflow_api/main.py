@@ -9,6 +9,7 @@ from services.common.logging import setup_logging
 from services.common.metrics import install
 from services.common.db import execute, fetchone, fetchall
 from services.common.kafka import publish
+from services.common.otel import new_correlation_id, span
 
 log = setup_logging("workflow-api")
 
@@ -36,40 +37,47 @@ def metrics():
 @app.post("/trade-requests")
 async def create_trade_request(req: TradeRequest):
     workflow_id = str(uuid.uuid4())
-    correlation_id = str(uuid.uuid4())
+    # A fresh business id; the work runs in its trace, linked to the caller's
+    correlation_id = new_correlation_id()
     payload = req.model_dump()
-    execute(
-        "INSERT INTO workflows(workflow_id,status,payload) VALUES (%s,%s,%s)",
-        (workflow_id, "REQUESTED", json.dumps(payload)),
-    )
-    event = {
-        "event_id": str(uuid.uuid4()),
-        "event_type": "workflow.requested",
-        "occurred_at": datetime.now(timezone.utc).isoformat(),
-        "correlation_id": correlation_id,
-        "payload": {"workflow_id": workflow_id, **payload},
-    }
-    await publish("workflow.requested", event, key=workflow_id)
+    with span("workflow.create", correlation_id=correlation_id, workflow_id=workflow_id):
+        execute(
+            "INSERT INTO workflows(workflow_id,status,payload,correlation_id) VALUES (%s,%s,%s,%s)",
+            (workflow_id, "REQUESTED", json.dumps(payload), correlation_id),
+        )
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "workflow.requested",
+            "occurred_at": datetime.now(timezone.utc).isoformat(),
+            "correlation_id": correlation_id,
+            "payload": {"workflow_id": workflow_id, **payload},
+        }
+        await publish("workflow.requested", event, key=workflow_id)
     log.info("workflow created id=%s corr=%s", workflow_id, correlation_id)
     return {"workflow_id": workflow_id, "correlation_id": correlation_id}
 
 @app.post("/trade-requests/{workflow_id}/approve")
 async def approve_trade_request(workflow_id: str, req: ApproveRequest):
-    row = fetchone("SELECT workflow_id,status,payload FROM workflows WHERE workflow_id=%s", (workflow_id,))
+    row = fetchone(
+        "SELECT workflow_id,status,payload,correlation_id FROM workflows WHERE workflow_id=%s",
+        (workflow_id,),
+    )
     if not row:
         raise HTTPException(404, "workflow not found")
     if row["status"] != "REQUESTED":
         raise HTTPException(409, f"cannot approve status={row['status']}")
-    execute("UPDATE workflows SET status=%s, updated_at=now() WHERE workflow_id=%s", ("APPROVED", workflow_id))
-    correlation_id = str(uuid.uuid4())
-    event = {
-        "event_id": str(uuid.uuid4()),
-        "event_type": "workflow.approved",
-        "occurred_at": datetime.now(timezone.utc).isoformat(),
-        "correlation_id": correlation_id,
-        "payload": {"workflow_id": workflow_id, "approver": req.approver, "comment": req.comment},
-    }
-    await publish("workflow.approved", event, key=workflow_id)
+    # Same correlation as the request, so the fill lands in the workflow's trace
+    correlation_id = str(row["correlation_id"]) if row.get("correlation_id") else new_correlation_id()
+    with span("workflow.approve", correlation_id=correlation_id, workflow_id=workflow_id):
+        execute("UPDATE workflows SET status=%s, updated_at=now() WHERE workflow_id=%s", ("APPROVED", workflow_id))
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "workflow.approved",
+            "occurred_at": datetime.now(timezone.utc).isoformat(),
+            "correlation_id": correlation_id,
+            "payload": {"workflow_id": workflow_id, "approver": req.approver, "comment": req.comment},
+        }
+        await publish("workflow.approved", event, key=workflow_id)
     log.info("workflow approved id=%s by=%s corr=%s", workflow_id, req.approver, correlation_id)
     return {"status": "APPROVED", "workflow_id": workflow_id, "correlation_id": correlation_id}
 
@@ -1,8 +1,16 @@
 """Smoke tests for the Agent Controller (unit-level, no Docker needed)."""
 
+import asyncio
 from unittest.mock import patch
 
 
+def _batched(fake_mcp):
+    """Serve graph._mcp_calls with a per-tool fake, concurrently like /call/batch."""
+    async def calls(items, state):
+        return list(await asyncio.gather(*(fake_mcp(tool, args, state) for tool, args in items)))
+    return calls
+
+
 def test_agent_state_init():
     """AgentState initialises with correct defaults."""
     from services.agent_controller.graph import AgentState
@@ -21,18 +29,18 @@ def test_agent_state_init():
 
 
 def test_node_plan_creates_plan():
-    """node_plan populates state.plan and calls log_audit."""
+    """node_plan populates state.plan and queues its audit row."""
     from services.agent_controller.graph import AgentState, node_plan
 
     state = AgentState(
         symbol="MSFT", side="SELL", qty=50, reason="rebalance",
         workflow_id="wf-2", correlation_id="corr-2",
     )
-    with patch("services.agent_controller.graph.log_audit") as mock_audit:
-        result = node_plan(state)
-        assert result.plan["symbol"] == "MSFT"
-        assert len(result.plan["steps"]) == 5
-        mock_audit.assert_called_once()
+    result = node_plan(state)
+    assert result.plan["symbol"] == "MSFT"
+    assert len(result.plan["steps"]) == 5
+    assert len(result.pending_writes) == 1
+    assert result.pending_writes[0][1][0] == "agent.plan"
 
 
 def test_node_evaluate_high_confidence():
@@ -47,9 +55,8 @@ def test_node_evaluate_high_confidence():
     state.rag_hits = [{"score": 0.85, "source": "test.md", "text": "rule"}]
     state.price_result = {"last": 150.0}
 
-    with patch("services.agent_controller.graph.log_audit"):
-        result = node_evaluate(state)
-        assert result.confidence_score >= 0.7
+    result = node_evaluate(state)
+    assert result.confidence_score >= 0.7
 
 
 def test_node_evaluate_low_confidence():
@@ -64,9 +71,8 @@ def test_node_evaluate_low_confidence():
     state.rag_hits = []
     state.price_result = {"last": 150.0}
 
-    with patch("services.agent_controller.graph.log_audit"):
-        result = node_evaluate(state)
-        assert result.confidence_score < 0.7
+    result = node_evaluate(state)
+    assert result.confidence_score < 0.7
 
 
 def test_node_decide_approve():
@@ -80,10 +86,7 @@ def test_node_decide_approve():
     state.confidence_score = 0.85
     state.risk_result = {"passed": True}
 
-    with (
-        patch("services.agent_controller.graph.execute"),
-        patch("services.agent_controller.graph.log_audit"),
-    ):
+    with patch("services.agent_controller.graph.execute_transaction"):
         result = node_decide(state)
         assert result.decision == "APPROVE"
 
@@ -99,10 +102,7 @@ def test_node_decide_needs_human():
     state.confidence_score = 0.5
     state.risk_result = {"passed": True}
 
-    with (
-        patch("services.agent_controller.graph.execute"),
-        patch("services.agent_controller.graph.log_audit"),
-    ):
+    with patch("services.agent_controller.graph.execute_transaction"):
         result = node_decide(state)
         assert result.decision == "NEEDS_HUMAN"
 
@@ -116,3 +116,419 @@ def test_health_endpoint():
     resp = client.get("/health")
     assert resp.status_code == 200
     assert resp.json()["status"] == "ok"
+
+
+def test_graph_runs_retrieve_and_tool_calls_concurrently():
+    """RETRIEVE and both MCP calls overlap: latency ~ slowest dependency, not the sum."""
+    import asyncio
+    import time
+    from services.agent_controller import graph
+
+    async def slow_rag(question, top_k=3):
+        await asyncio.sleep(0.2)
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    async def slow_mcp(tool, arguments, state):
+        await asyncio.sleep(0.2)
+        if tool == "risk.check_trade":
+            return {"passed": True, "violations": [], "notional": 1000.0}
+        if tool == "oms.place_order":
+            return {"order_id": "ord-1", "fill_price": 100.0}
+        return {"last": 100.0}
+
+    with (
+        patch.object(graph, "_rag_query", slow_rag),
+        patch.object(graph, "_mcp_call", slow_mcp),
+        patch.object(graph, "_mcp_calls", _batched(slow_mcp)),
+        patch("services.agent_controller.graph.execute_transaction"),
+    ):
+        start = time.perf_counter()
+        state = asyncio.run(graph.run_agent_graph("AAPL", "BUY", 10, "test", "wf-7", "corr-7"))
+        elapsed = time.perf_counter() - start
+
+    assert state.decision == "APPROVE"
+    assert state.order_result["order_id"] == "ord-1"
+    # 0.2s retrieve ∥ tool calls, then 0.2s execute; sequential would be 0.8s
+    assert elapsed < 0.6
+
+
+def test_graph_optional_node_timeout_is_tolerated():
+    """A RETRIEVE node exceeding its timeout is cancelled and the graph goes on."""
+    import asyncio
+    import dataclasses
+    from services.agent_controller import graph
+
+    async def hanging_rag(question, top_k=3):
+        await asyncio.sleep(10)
+
+    async def fast_mcp(tool, arguments, state):
+        return {"passed": False, "violations": ["qty too high"]}
+
+    nodes = [dataclasses.replace(n, timeout=0.05) for n in graph.GRAPH_NODES]
+    with (
+        patch.object(graph, "GRAPH_NODES", nodes),
+        patch.object(graph, "_rag_query", hanging_rag),
+        patch.object(graph, "_mcp_call", fast_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fast_mcp)),
+        patch("services.agent_controller.graph.execute_transaction"),
+    ):
+        state = asyncio.run(graph.run_agent_graph("AAPL", "BUY", 50000, "t", "wf-8", "corr-8"))
+
+    assert state.rag_hits == []
+    assert state.decision == "NEEDS_HUMAN"
+
+
+def test_graph_skips_execute_unless_approved():
+    """EXECUTE is a conditional node: no order is placed on NEEDS_HUMAN."""
+    import asyncio
+    from services.agent_controller import graph
+
+    calls = []
+
+    async def fake_mcp(tool, arguments, state):
+        calls.append(tool)
+        return {"passed": False, "violations": ["qty too high"]}
+
+    async def fake_rag(question, top_k=3):
+        return []
+
+    with (
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute_transaction"),
+    ):
+        state = asyncio.run(graph.run_agent_graph("AAPL", "BUY", 50000, "t", "wf-9", "corr-9"))
+
+    assert state.decision == "NEEDS_HUMAN"
+    assert "oms.place_order" not in calls
+    assert state.order_result == {}
+
+
+def test_graph_resumes_from_checkpoint_without_replaying_nodes():
+    """A run failing at DECIDE resumes after TOOL_CALLS: RAG and MCP are not called again."""
+    import asyncio
+    from services.agent_controller import graph
+    from services.agent_controller.engine import MemoryCheckpointer
+
+    calls = []
+
+    async def fake_rag(question, top_k=3):
+        calls.append("rag")
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    async def fake_mcp(tool, arguments, state):
+        calls.append(tool)
+        if tool == "oms.place_order":
+            return {"order_id": "ord-2", "fill_price": 100.0}
+        return {"passed": True, "violations": [], "last": 100.0}
+
+    db_calls = {"n": 0}
+
+    def flaky_execute(statements):
+        db_calls["n"] += 1
+        if db_calls["n"] == 1:
+            raise RuntimeError("db down")
+
+    store = MemoryCheckpointer()
+    with (
+        patch.object(graph, "checkpointer", store),
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute_transaction", flaky_execute),
+        patch("services.agent_controller.graph.fetchone", return_value={"decision": None}),
+    ):
+        try:
+            asyncio.run(graph.run_agent_graph("AAPL", "BUY", 10, "t", "wf-10", "corr-10"))
+            raise AssertionError("DECIDE should have failed")
+        except RuntimeError as e:
+            assert str(e) == "db down"
+
+        completed, data = store.load("wf-10")
+        # EVALUATE is not checkpointed on its own; its outputs are recomputed
+        assert set(completed) == {"PLAN", "RETRIEVE", "TOOL_CALLS"}
+        assert data["risk_result"]["passed"] is True
+        assert [row[1][0] for row in data["pending_writes"]] == ["agent.plan", "rag.retrieve"]
+        calls.clear()
+
+        state = asyncio.run(graph.resume_agent_graph("wf-10"))
+
+    assert calls == ["oms.place_order"]
+    assert state.decision == "APPROVE"
+    assert state.correlation_id == "corr-10"
+    assert store.load("wf-10") is None  # cleared once the run completes
+
+
+def test_graph_resume_does_not_place_the_order_twice():
+    """A run failing after the order was placed resumes by recording the fill only."""
+    import asyncio
+    from services.agent_controller import graph
+    from services.agent_controller.engine import MemoryCheckpointer
+
+    orders = []
+
+    async def fake_rag(question, top_k=3):
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    async def fake_mcp(tool, arguments, state):
+        if tool == "oms.place_order":
+            orders.append(arguments["workflow_id"])  # the OMS idempotency key
+            return {"order_id": "ord-12", "fill_price": 100.0}
+        return {"passed": True, "violations": [], "last": 100.0}
+
+    transactions = []
+
+    def flaky_execute(statements):
+        transactions.append(statements)
+        if len(transactions) == 2:  # the fill's commit
+            raise RuntimeError("db down")
+
+    store = MemoryCheckpointer()
+    with (
+        patch.object(graph, "checkpointer", store),
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute_transaction", flaky_execute),
+    ):
+        try:
+            asyncio.run(graph.run_agent_graph("AAPL", "BUY", 10, "t", "wf-12", "corr-12"))
+            raise AssertionError("EXECUTE should have failed")
+        except RuntimeError as e:
+            assert str(e) == "db down"
+
+        completed, data = store.load("wf-12")
+        assert "EXECUTE" not in completed and data["order_result"]["order_id"] == "ord-12"
+
+        state = asyncio.run(graph.resume_agent_graph("wf-12"))
+
+    assert orders == ["wf-12"]
+    assert state.order_result["order_id"] == "ord-12"
+    assert [sql.split()[0] for sql, _ in transactions[-1]] == ["UPDATE", "INSERT"]
+    assert store.load("wf-12") is None
+
+
+def test_graph_resume_does_not_commit_decide_twice():
+    """A run dying after DECIDE committed but before its checkpoint resumes without rewriting it."""
+    import asyncio
+    from services.agent_controller import graph
+    from services.agent_controller.engine import MemoryCheckpointer
+
+    async def fake_rag(question, top_k=3):
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    class Crash(Exception):
+        pass
+
+    class CrashAfterDecide(MemoryCheckpointer):
+        """Loses every checkpoint written after DECIDE while ``crashed``."""
+
+        crashed = True
+
+        def save(self, run_id, completed, state):
+            if not (self.crashed and "DECIDE" in completed):
+                super().save(run_id, completed, state)
+
+    store = CrashAfterDecide()
+
+    async def fake_mcp(tool, arguments, state):
+        if tool == "oms.place_order":
+            if store.crashed:
+                raise Crash()
+            return {"order_id": "ord-13", "fill_price": 100.0}
+        return {"passed": True, "violations": [], "last": 100.0}
+
+    rows = {}
+
+    def fake_execute(sql, params):
+        assert "ON CONFLICT (workflow_id) DO NOTHING" in sql
+        rows.setdefault(params[0], {"decision": None})
+
+    transactions = []
+
+    def fake_transaction(statements):
+        transactions.append([sql.split()[0] for sql, _ in statements])
+        for sql, params in statements:
+            if sql.startswith("UPDATE workflows SET status = %s, confidence_score"):
+                rows[params[-1]]["decision"] = params[2]
+
+    with (
+        patch.object(graph, "checkpointer", store),
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute", fake_execute),
+        patch("services.agent_controller.graph.execute_transaction", fake_transaction),
+        patch("services.agent_controller.graph.fetchone",
+              lambda sql, params: rows.get(params[0])),
+    ):
+        try:
+            asyncio.run(graph.run_agent_graph(
+                "AAPL", "BUY", 10, "t", "wf-13", "corr-13", payload={"symbol": "AAPL"},
+            ))
+            raise AssertionError("the run should have crashed")
+        except Crash:
+            pass
+        assert rows["wf-13"]["decision"] == "APPROVE" and len(transactions) == 1
+        assert "DECIDE" not in store.load("wf-13")[0]
+        store.crashed = False
+
+        state = asyncio.run(graph.resume_agent_graph("wf-13"))
+
+    assert state.decision == "APPROVE" and state.order_result["order_id"] == "ord-13"
+    # Only the fill is committed on resume: no second decision or audit trail
+    assert transactions[1:] == [["UPDATE", "INSERT"]]
+    assert store.load("wf-13") is None
+
+
+def test_engine_rejects_inputs_not_produced_upstream():
+    import pytest
+    from services.agent_controller.engine import Node, validate
+
+    nodes = [
+        Node("A", lambda s: s, outputs=("x",)),
+        Node("B", lambda s: s, inputs=("y",), deps=("A",)),
+    ]
+    with pytest.raises(ValueError):
+        validate(nodes, initial=())
+    validate(nodes, initial=("y",))
+
+
+def _post_basket(trades, execute_transaction, calls=None):
+    """POST /agent/trades with faked RAG/MCP; returns (response, calls, bulk, single_execute)."""
+    from fastapi.testclient import TestClient
+    from services.agent_controller import graph
+    from services.agent_controller.main import app
+
+    calls = [] if calls is None else calls
+
+    async def fake_rag(question, top_k=3):
+        calls.append(("rag", question))
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    async def fake_mcp(tool, arguments, state):
+        calls.append((tool, arguments.get("symbol")))
+        if tool == "risk.check_trade":
+            return {"passed": arguments["qty"] < 1000, "violations": []}
+        if tool == "oms.place_order":
+            calls.append(("order", state.workflow_id))
+            return {"order_id": f"ord-{state.workflow_id[:4]}", "fill_price": 100.0}
+        return {"last": 100.0}
+
+    bulk = []
+
+    def transaction(statements):
+        execute_transaction(statements)
+        bulk.append(("TX", list(statements)))
+
+    with (
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute_transaction") as single_execute,
+        patch("services.agent_controller.batch.execute_values",
+              lambda sql, rows, **kw: bulk.append((sql.split()[0], list(rows)))),
+        patch("services.agent_controller.batch.execute_transaction", transaction),
+    ):
+        resp = TestClient(app).post("/agent/trades", json={"trades": trades})
+    return resp, calls, bulk, single_execute
+
+
+def _updates(bulk):
+    """(workflow_id, status) of every bulk UPDATE, in commit order."""
+    return [
+        (params[i], params[i + 1])
+        for op, statements in bulk if op == "TX"
+        for sql, params in statements if sql.startswith("UPDATE workflows")
+        for i in range(0, len(params), 4)
+    ]
+
+
+def test_agent_trades_shares_lookups_and_bulk_writes():
+    """POST /agent/trades: one RAG/price lookup per symbol, one bulk INSERT, bulk UPDATEs."""
+    trades = [
+        {"symbol": sym, "side": "BUY", "qty": qty, "reason": "basket"}
+        for sym in ("AAPL", "MSFT") for qty in (10, 5000)
+    ]
+    resp, calls, bulk, single_execute = _post_basket(trades, lambda statements: None)
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status"] for r in results] == ["FILLED", "NEEDS_HUMAN", "FILLED", "NEEDS_HUMAN"]
+    kinds = [c[0] for c in calls]
+    assert kinds.count("rag") == 2
+    assert kinds.count("market.get_last_price") == 2
+    assert kinds.count("risk.check_trade") == 4
+    single_execute.assert_not_called()
+    assert bulk[0][0] == "INSERT" and all(op == "TX" for op, _ in bulk[1:])
+    assert sorted(status for _, status in _updates(bulk)) == [
+        "APPROVE", "APPROVE", "FILLED", "FILLED", "NEEDS_HUMAN", "NEEDS_HUMAN",
+    ]
+    # plan, retrieve, evaluate, decision per leg + order.filled for the two fills
+    audits = [sql for _, statements in bulk[1:] for sql, _ in statements
+              if not sql.startswith("UPDATE")]
+    assert len(audits) == 4 * 4 + 2
+
+
+def test_agent_trades_stores_decision_before_order():
+    """A leg's decision is committed before its order is placed; a failed commit is that leg's error."""
+    trades = [
+        {"symbol": sym, "side": "BUY", "qty": 10, "reason": "basket"}
+        for sym in ("AAPL", "MSFT", "NVDA")
+    ]
+    timeline = []
+
+    def execute_transaction(statements):
+        if any("NVDA" in str(params) for _, params in statements):
+            raise RuntimeError("db down")
+        timeline.extend(("commit", *update) for update in _updates([("TX", statements)]))
+
+    resp, _, _, _ = _post_basket(trades, execute_transaction, calls=timeline)
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status"] for r in results] == ["FILLED", "FILLED", "ERROR"]
+    assert "db down" in results[2]["error"]
+    placed = [event[1] for event in timeline if event[0] == "order"]
+    assert len(placed) == 2 and results[2]["workflow_id"] not in placed
+    for wf in placed:
+        order = timeline.index(("order", wf))
+        assert timeline.index(("commit", wf, "APPROVE")) < order
+        assert timeline.index(("commit", wf, "FILLED")) > order
+
+
+def test_graph_commits_twice_per_approved_trade():
+    """The workflow is created upfront; audits and decision share one transaction, the fill is the second."""
+    import asyncio
+    from services.agent_controller import graph
+
+    async def fake_rag(question, top_k=3):
+        return [{"score": 0.9, "source": "risk_rules.md", "text": "rule"}]
+
+    async def fake_mcp(tool, arguments, state):
+        if tool == "oms.place_order":
+            return {"order_id": "ord-3", "fill_price": 100.0}
+        return {"passed": True, "violations": [], "last": 100.0}
+
+    transactions = []
+    with (
+        patch.object(graph, "_rag_query", fake_rag),
+        patch.object(graph, "_mcp_call", fake_mcp),
+        patch.object(graph, "_mcp_calls", _batched(fake_mcp)),
+        patch("services.agent_controller.graph.execute",
+              lambda sql, params: transactions.append([sql.split()[0]])),
+        patch("services.agent_controller.graph.execute_transaction",
+              lambda statements: transactions.append([sql.split()[0] for sql, _ in statements])),
+    ):
+        state = asyncio.run(graph.run_agent_graph(
+            "AAPL", "BUY", 10, "t", "wf-11", "corr-11", payload={"symbol": "AAPL"},
+        ))
+
+    assert state.decision == "APPROVE"
+    assert transactions == [
+        ["INSERT"],
+        ["INSERT", "INSERT", "INSERT", "UPDATE", "INSERT"],
+        ["UPDATE", "INSERT"],
+    ]
+    assert state.pending_writes == []
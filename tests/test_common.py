@@ -0,0 +1,548 @@
+"""Unit tests for services.common helpers (no Docker needed)."""
+
+
+def test_ttl_cache_lru_eviction():
+    from services.common.cache import TTLCache
+
+    cache = TTLCache("test_lru", max_entries=2, ttl=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+
+
+def test_ttl_cache_expiry_and_byte_bound():
+    from services.common.cache import TTLCache
+
+    now = [0.0]
+    cache = TTLCache("test_ttl", max_entries=0, max_bytes=100, ttl=10, sizeof=len, clock=lambda: now[0])
+    cache.set("k", "x" * 60)
+    cache.set("j", "y" * 60)  # exceeds 100 bytes -> evicts "k"
+    assert cache.get("k") is None
+    assert cache.size_bytes == 60
+    now[0] = 11.0
+    assert cache.get("j") is None
+    assert len(cache) == 0
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    from services.common.http import CircuitBreaker
+
+    now = [0.0]
+    breaker = CircuitBreaker("test_breaker", failure_threshold=2, reset_timeout=5, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    now[0] = 6.0
+    assert breaker.allow()  # single trial call
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_recovers_from_cancelled_trial():
+    import asyncio
+
+    import httpx
+    from services.common.http import CircuitBreaker, CircuitOpenError, ServiceClient
+
+    now = [0.0]
+    slow = [True]
+
+    async def handler(request):
+        if slow[0]:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    breaker = CircuitBreaker("test_cancelled_trial", failure_threshold=1, reset_timeout=5,
+                             clock=lambda: now[0])
+    client = ServiceClient("trial", "http://trial", breaker=breaker,
+                           transport=httpx.MockTransport(handler))
+
+    async def run():
+        breaker.record_failure()  # open
+        now[0] = 6.0
+        try:
+            await asyncio.wait_for(client.post("/x"), 0.05)  # the trial, cancelled
+        except asyncio.TimeoutError:
+            pass
+        assert breaker.state == CircuitBreaker.OPEN  # trial counted as a failure
+        try:
+            await client.post("/x")
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("breaker should reject until the next trial")
+        now[0] = 12.0
+        slow[0] = False
+        return (await client.post("/x")).status_code
+
+    assert asyncio.run(run()) == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_service_client_retries_only_idempotent_calls():
+    import asyncio
+
+    import httpx
+    from services.common.http import CircuitBreaker, CircuitOpenError, ServiceClient
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503 if len(calls) % 3 else 200, json={})
+
+    client = ServiceClient(
+        "test_target", "http://svc", retries=2, backoff_base=0,
+        breaker=CircuitBreaker("test_target", failure_threshold=3),
+        transport=httpx.MockTransport(handler),
+    )
+
+    async def run():
+        ok = await client.post("/query", idempotent=True)
+        failed = await client.post("/call")
+        await client.aclose()
+        return ok, failed
+
+    ok, failed = asyncio.run(run())
+    assert ok.status_code == 200 and len(calls) == 4  # 503, 503, 200 then a single 503
+    assert failed.status_code == 503
+
+    client.breaker.record_failure()
+    client.breaker.record_failure()  # third consecutive failure opens it
+    try:
+        asyncio.run(client.post("/query", idempotent=True))
+        raise AssertionError("breaker should reject")
+    except CircuitOpenError:
+        pass
+    assert len(calls) == 4
+
+
+def _event(event_type, payload):
+    import uuid
+    return {
+        "event_id": str(uuid.uuid4()),
+        "event_type": event_type,
+        "occurred_at": "2024-01-01T00:00:00+00:00",
+        "correlation_id": str(uuid.uuid4()),
+        "payload": payload,
+    }
+
+
+def test_event_schemas_compile_and_validate():
+    from services.common.schemas import SchemaRegistry
+
+    reg = SchemaRegistry()
+    assert "workflow.requested" in reg.topics and "orders.filled" in reg.topics
+    ok = _event("workflow.requested", {
+        "workflow_id": "wf", "symbol": "AAPL", "side": "BUY", "qty": 10, "reason": "x",
+    })
+    assert reg.validate("workflow.requested", ok) == []
+    assert reg.validate("market.prices", ok) is None  # no schema
+
+    bad = dict(ok, payload=dict(ok["payload"], side="HOLD", qty="10"), extra=1)
+    del bad["event_id"]
+    assert sorted(reg.validate("workflow.requested", bad)) == [
+        "$.payload.qty: expected number, got str",
+        "$.payload.side: 'HOLD' is not one of ['BUY', 'SELL']",
+        "$: missing required property 'event_id'",
+        "$: unexpected property 'extra'",
+    ]
+    review = _event("genai.review.created", {"workflow_id": "wf", "sources": ["a.md", 3]})
+    assert reg.validate("genai.review.created", review) == [
+        "$.payload.sources[1]: expected string, got int",
+    ]
+
+
+def test_publish_and_consume_route_invalid_events_to_dlq():
+    import asyncio
+    import json
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock, patch
+    from services.common import kafka
+    from services.common.schemas import EventValidator, SchemaRegistry
+
+    sent = []
+
+    class FakeProducer:
+        async def send_and_wait(self, topic, payload, key=None, headers=None):
+            sent.append((topic, json.loads(payload)))
+
+        async def stop(self):
+            pass
+
+    class FakeConsumer:
+        def __init__(self, messages):
+            self.messages = messages
+
+        async def start(self):
+            pass
+
+        async def stop(self):
+            pass
+
+        def __aiter__(self):
+            async def gen():
+                for m in self.messages:
+                    yield m
+            return gen()
+
+    good = _event("orders.filled", {"order_id": "o", "qty": 1.0, "fill_price": 100.0})
+    bad = _event("orders.filled", {"order_id": "o", "qty": "one"})
+    msgs = [
+        SimpleNamespace(topic="orders.filled", partition=0, offset=i, value=v)
+        for i, v in enumerate([json.dumps(good).encode(), json.dumps(bad).encode(), b"{oops"])
+    ]
+    handler = AsyncMock()
+
+    async def run():
+        await kafka.publish("orders.filled", good)
+        await kafka.publish("orders.filled", bad)
+        await kafka.consume_forever(FakeConsumer(msgs), handler)
+
+    with (
+        patch.object(kafka, "get_producer", AsyncMock(return_value=FakeProducer())),
+        patch.object(kafka, "get_validator", lambda: EventValidator(SchemaRegistry(), "all")),
+    ):
+        asyncio.run(run())
+
+    handler.assert_awaited_once_with("orders.filled", good)
+    assert [topic for topic, _ in sent] == ["orders.filled", "events.dlq", "events.dlq", "events.dlq"]
+    publish_dlq, consume_dlq, raw_dlq = (record for _, record in sent[1:])
+    assert publish_dlq["stage"] == "publish" and publish_dlq["event"] == bad
+    assert consume_dlq["stage"] == "consume" and consume_dlq["offset"] == 1
+    assert raw_dlq["event"] == "{oops" and raw_dlq["errors"][0].startswith("undecodable")
+
+
+def test_event_validator_modes():
+    from services.common.schemas import EventValidator, SchemaRegistry
+
+    reg = SchemaRegistry()
+    bad = {"event_type": "orders.filled"}
+    assert EventValidator(reg, "off").on_consume("orders.filled", bad) == []
+    assert EventValidator(reg, "sample", sample_rate=0.0).on_publish("orders.filled", bad) == []
+    assert EventValidator(reg, "sample", sample_rate=1.0).on_publish("orders.filled", bad)
+    assert EventValidator(reg, "sample", sample_rate=0.0).on_consume("orders.filled", bad)
+
+
+def test_codec_json_and_msgpack_envelope():
+    import json
+    import pytest
+    from services.common import codec
+
+    event = _event("orders.filled", {"order_id": "o", "qty": 1.5, "fill_price": 100.0})
+    raw_json = codec.encode(event)
+    assert raw_json == json.dumps(event).encode("utf-8")
+    assert codec.decode(raw_json) == event
+    with pytest.raises(ValueError):
+        codec.decode(b"\x00\x07\x01...")  # unknown envelope version
+    with pytest.raises(ValueError):
+        codec.decode(b"{oops")
+    with pytest.raises(ValueError):
+        codec.encode(event, "xml")
+
+    pytest.importorskip("msgpack")
+    raw = codec.encode(event, "msgpack")
+    assert raw[:3] == b"\x00\x01\x01" and len(raw) < len(raw_json)
+    assert codec.decode(raw) == event
+    with pytest.raises(ValueError):
+        codec.decode(raw[:10])
+
+
+def test_audit_row_hash_matches_legacy_serialization():
+    """One serialization per record, byte-compatible with the historical hash."""
+    import hashlib
+    import json
+    import uuid
+    from datetime import datetime, timezone
+    from decimal import Decimal
+    from services.common.audit import _hash, audit_row, canonical_json
+
+    data = {"tool": "risk.check_trade", "qty": 10.5, "note": "prix élevé – ok",
+            "nested": {"b": [1, {"z": None, "a": True}], "a": "x"}}
+    for ref_id in ("wf-1", "réf \"quoted\"", ""):
+        legacy = hashlib.sha256(json.dumps(
+            {"kind": "mcp.tool_call", "ref_id": ref_id, "data": data},
+            sort_keys=True, ensure_ascii=False,
+        ).encode("utf-8")).hexdigest()
+        row = audit_row("mcp.tool_call", ref_id, data, "corr")
+        assert row[3] == legacy
+        assert json.loads(row[2]) == data
+
+    uid = uuid.UUID(int=1)
+    when = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    db_row = {"id": uid, "at": when, "px": Decimal("101.50")}
+    assert json.loads(canonical_json(db_row)) == {
+        "id": str(uid), "at": "2024-01-02T03:04:05+00:00", "px": "101.50",
+    }
+    assert audit_row("k", "r", db_row, "c")[3] == _hash({"kind": "k", "ref_id": "r", "data": db_row})
+
+
+def test_http_metrics_use_route_templates():
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+    from fastapi.testclient import TestClient
+    from prometheus_client import REGISTRY
+    from services.common.metrics import install
+
+    app = FastAPI()
+    install(app, "metrics-test")
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        return PlainTextResponse("x" * 10)
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    client = TestClient(app)
+    for i in range(3):
+        assert client.get(f"/items/{i}").status_code == 200
+    client.get("/nope/123")
+    client.request("FOO", "/nope/123")
+    client.get("/health")
+
+    def value(name, **labels):
+        return REGISTRY.get_sample_value(name, {"service": "metrics-test", **labels})
+
+    assert value("http_requests_total", method="GET", path="/items/{item_id}", status="200") == 3
+    assert value("http_requests_total", method="GET", path="<unmatched>", status="404") == 1
+    assert value("http_requests_total", method="GET", path="/items/1", status="200") is None
+    assert value("http_requests_total", method="OTHER", path="<unmatched>", status="404") == 1
+    assert value("http_requests_total", method="FOO", path="<unmatched>", status="404") is None
+    assert value("http_requests_total", method="GET", path="/health", status="200") is None
+    assert value("http_response_size_bytes_sum", method="GET", path="/items/{item_id}") == 30
+    assert value("http_request_duration_seconds_count", method="GET", path="/items/{item_id}") == 3
+    assert value("http_requests_in_flight") == 0
+
+
+def test_loop_monitor_measures_lag_and_dumps_blocking_stack():
+    import asyncio
+    import logging
+    import time
+    from prometheus_client import REGISTRY
+    from services.common import loopmon
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.WARNING)
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    def blocking_db_call():
+        time.sleep(0.2)
+
+    async def run():
+        monitor = loopmon.LoopMonitor(
+            "loopmon-test", interval=0.01, block_threshold=0.05, watchdog=True
+        )
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_db_call()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    labels = {"service": "loopmon-test"}
+    blocked_before = REGISTRY.get_sample_value("event_loop_blocked_total", labels) or 0
+    capture = Capture()
+    loopmon.log.addHandler(capture)  # the service loggers do not propagate
+    try:
+        monitor = asyncio.run(run())
+    finally:
+        loopmon.log.removeHandler(capture)
+
+    # Timing-dependent counts: a slow runner may see the stall more than once
+    assert monitor.stacks_dumped >= 1
+    assert REGISTRY.get_sample_value("event_loop_blocked_total", labels) - blocked_before >= 1
+    assert REGISTRY.get_sample_value("event_loop_lag_seconds_count", labels) >= 3
+    dumps = [m for m in capture.messages if "loop thread stack" in m]
+    assert len(dumps) == monitor.stacks_dumped
+    assert "blocking_db_call" in dumps[0]
+
+
+def test_trace_context_crosses_kafka_and_http_hops():
+    import asyncio
+    import json
+    import uuid
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock, patch
+    import httpx
+    from services.common import kafka, otel
+    from services.common.http import ServiceClient
+    from services.common.schemas import EventValidator, SchemaRegistry
+
+    collector = otel.MemoryExporter()
+    sent, seen_headers = [], []
+
+    class FakeProducer:
+        async def send_and_wait(self, topic, payload, key=None, headers=None):
+            sent.append(SimpleNamespace(
+                topic=topic, partition=0, offset=len(sent), value=payload, headers=headers,
+            ))
+
+        async def stop(self):
+            pass
+
+    class FakeConsumer:
+        async def start(self):
+            pass
+
+        async def stop(self):
+            pass
+
+        def __aiter__(self):
+            async def gen():
+                for m in sent:
+                    yield m
+            return gen()
+
+    def downstream(request):
+        seen_headers.append(request.headers.get("traceparent"))
+        return httpx.Response(200, json={})
+
+    client = ServiceClient("rag", "http://rag", transport=httpx.MockTransport(downstream))
+
+    async def handler(topic, event):
+        with otel.span("db.fetchone"):
+            pass
+        await client.post("/query", json={})
+
+    corr = str(uuid.uuid4())
+    event = _event("orders.filled", {"order_id": "o", "qty": 1.0, "fill_price": 1.0})
+    event["correlation_id"] = corr
+
+    async def run():
+        await kafka.publish("orders.filled", event)
+        await kafka.consume_forever(FakeConsumer(), handler)
+
+    with (
+        patch.object(otel, "_exporter", collector),
+        patch.object(otel.settings, "TRACE_SAMPLE_RATIO", 1.0),
+        patch.object(kafka, "get_producer", AsyncMock(return_value=FakeProducer())),
+        patch.object(kafka, "get_validator", lambda: EventValidator(SchemaRegistry(), "off")),
+    ):
+        asyncio.run(run())
+
+    spans = {s["name"]: s for s in collector.spans}
+    assert set(spans) == {
+        "kafka.publish orders.filled", "kafka.consume orders.filled",
+        "db.fetchone", "POST rag/query",
+    }
+    assert {s["traceId"] for s in collector.spans} == {uuid.UUID(corr).hex}
+    producer, consumer = spans["kafka.publish orders.filled"], spans["kafka.consume orders.filled"]
+    assert producer["parentSpanId"] is None
+    assert consumer["parentSpanId"] == producer["spanId"]
+    assert spans["db.fetchone"]["parentSpanId"] == consumer["spanId"]
+    http_span = spans["POST rag/query"]
+    assert seen_headers == [f"00-{http_span['traceId']}-{http_span['spanId']}-01"]
+    assert json.loads(sent[0].value) == event
+
+
+def test_tracing_middleware_joins_caller_trace_and_samples():
+    from unittest.mock import patch
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from services.common import otel
+    from services.common.metrics import install
+
+    app = FastAPI()
+    install(app, "trace-test")
+
+    @app.post("/trade-requests")
+    def create():
+        correlation_id = otel.new_correlation_id()
+        with otel.span("workflow.create", correlation_id=correlation_id):
+            with otel.span("db.execute"):
+                return {"correlation_id": correlation_id}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    collector = otel.MemoryExporter()
+    caller = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    with patch.object(otel, "_exporter", collector):
+        client = TestClient(app, raise_server_exceptions=False)
+        with patch.object(otel.settings, "TRACE_SAMPLE_RATIO", 1.0):
+            first = client.post("/trade-requests", headers={"traceparent": caller}).json()
+            again = client.post("/trade-requests", headers={"traceparent": caller}).json()
+        del collector.spans[3:]
+        with patch.object(otel.settings, "TRACE_SAMPLE_RATIO", 0.0):
+            client.post("/trade-requests")  # unsampled, fast: dropped
+            client.get("/boom")  # unsampled but failed: kept by tail sampling
+
+    # A fresh business id per workflow, whatever trace the caller sent
+    assert first["correlation_id"] != again["correlation_id"]
+    assert first["correlation_id"].replace("-", "") != "0af7651916cd43dd8448eb211c80319c"
+    db_span, workflow, server = collector.spans[:3]
+    assert server["name"] == "POST /trade-requests"
+    assert server["service"] == "trace-test" and server["kind"] == "server"
+    assert server["traceId"] == "0af7651916cd43dd8448eb211c80319c"
+    assert server["parentSpanId"] == "b7ad6b7169203331"
+    # The work runs in the workflow's trace, linked back to the caller's
+    assert workflow["traceId"] == first["correlation_id"].replace("-", "")
+    assert workflow["parentSpanId"] is None
+    assert workflow["attributes"]["link.trace_id"] == "0af7651916cd43dd8448eb211c80319c"
+    assert db_span["parentSpanId"] == workflow["spanId"]
+    assert len(collector.spans) == 4
+    failed = collector.spans[3]
+    assert failed["name"] == "GET /boom" and failed["status"]["code"] == "ERROR"
+    assert failed["attributes"]["sampling"] == "tail"
+
+
+def test_file_exporter_writes_off_the_calling_thread(tmp_path):
+    import json
+    import threading
+    from services.common.otel import FileExporter
+
+    exporter = FileExporter(str(tmp_path / "traces.jsonl"), max_buffer=2, max_wait_ms=60_000)
+    writers, written = [], threading.Event()
+    write = exporter._write
+
+    def record(lines):
+        writers.append(threading.current_thread().name)
+        write(lines)
+        written.set()
+
+    exporter._write = record
+    exporter.export({"name": "a"})
+    assert not writers  # below max_buffer: only queued
+    exporter.export({"name": "b"})
+    assert written.wait(5)
+    assert writers == ["trace-file-exporter"]
+
+    exporter.export({"name": "c"})
+    exporter.flush()
+    lines = (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["a", "b", "c"]
+
+
+def test_span_follows_correlation_trace_and_links_current():
+    import uuid
+    from unittest.mock import patch
+    from services.common import otel
+
+    collector = otel.MemoryExporter()
+    corr = str(uuid.uuid4())
+    with (
+        patch.object(otel, "_exporter", collector),
+        patch.object(otel.settings, "TRACE_SAMPLE_RATIO", 1.0),
+    ):
+        with otel.span("POST /approve") as request_span:
+            with otel.span("kafka.publish workflow.approved", correlation_id=corr):
+                pass
+    publish = collector.spans[0]
+    assert publish["traceId"] == uuid.UUID(corr).hex and publish["parentSpanId"] is None
+    assert publish["attributes"]["link.trace_id"] == request_span.context.trace_id
+    assert otel.parse_traceparent("00-xyz-b7ad6b7169203331-01") is None
+    with otel.span("disabled") as s:
+        assert s is otel.NOOP_SPAN  # default exporter: none
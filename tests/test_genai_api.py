@@ -0,0 +1,374 @@
+"""Unit tests for the GenAI service (no Docker / LLM keys needed)."""
+
+import asyncio
+import uuid
+
+from services.genai_api.llm import LLM
+
+
+class CountingLLM(LLM):
+    provider = "test"
+    model = "test-model"
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def complete(self, system: str, user: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"review of {user}"
+
+
+def test_cached_llm_reuses_response():
+    from services.genai_api.llm_cache import CachedLLM
+
+    inner = CountingLLM()
+    llm = CachedLLM(inner, ttl=60)
+
+    async def run():
+        a = await llm.complete("sys", "AAPL BUY 100")
+        b = await llm.complete("sys", "AAPL BUY 100")
+        c = await llm.complete("sys", "MSFT SELL 10")
+        return a, b, c
+
+    a, b, c = asyncio.run(run())
+    assert a == b and a != c
+    assert inner.calls == 2
+
+
+def test_cached_llm_single_flight():
+    """Concurrent identical prompts share one upstream call."""
+    from services.genai_api.llm_cache import CachedLLM
+
+    inner = CountingLLM(delay=0.05)
+    llm = CachedLLM(inner, ttl=60)
+
+    async def run():
+        return await asyncio.gather(*(llm.complete("sys", "same") for _ in range(5)))
+
+    outs = asyncio.run(run())
+    assert len(set(outs)) == 1
+    assert inner.calls == 1
+
+
+def test_cached_llm_follower_survives_leader_cancellation():
+    """A follower is not cancelled with the leader: it makes the call itself."""
+    from services.genai_api.llm_cache import CachedLLM
+
+    inner = CountingLLM(delay=0.05)
+    llm = CachedLLM(inner, ttl=60)
+
+    async def run():
+        leader = asyncio.create_task(llm.complete("sys", "same"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(llm.complete("sys", "same"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "review of same"
+    assert inner.calls == 2
+
+
+def test_cached_llm_disk_persistence(tmp_path):
+    from services.genai_api.llm_cache import CachedLLM
+
+    first = CountingLLM()
+    asyncio.run(CachedLLM(first, cache_dir=str(tmp_path)).complete("sys", "u"))
+    second = CountingLLM()
+    out = asyncio.run(CachedLLM(second, cache_dir=str(tmp_path)).complete("sys", "u"))
+    assert out == "review of u"
+    assert second.calls == 0
+
+
+def test_scheduler_runs_highest_notional_first():
+    from services.genai_api.scheduler import ReviewScheduler
+
+    done = []
+
+    async def handler(item):
+        done.append(item)
+
+    async def run():
+        sched = ReviewScheduler(handler, concurrency=1, max_queue=10)
+        for name, notional in [("small", 1_000), ("large", 900_000), ("mid", 50_000)]:
+            await sched.submit(name, priority=notional)
+        sched.start()
+        await sched.join()
+        await sched.stop()
+
+    asyncio.run(run())
+    assert done == ["large", "mid", "small"]
+
+
+def test_notional_uses_the_process_independent_reference_price():
+    import os
+    import subprocess
+    import sys
+    from services.genai_api.main import ReviewRequest, _notional
+    from services.mcp_server.tools import _synthetic_price
+
+    req = ReviewRequest(workflow_id="wf-1", symbol="msft", side="BUY", qty=10, reason="r")
+    assert _notional(req) == 10 * _synthetic_price("MSFT")
+    # hash() of a str changes with PYTHONHASHSEED; the reference price must not
+    code = "from services.mcp_server.tools import _synthetic_price; print(_synthetic_price('MSFT'))"
+    prices = {
+        subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed},
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert prices == {str(_synthetic_price("MSFT"))}
+
+
+def test_scheduler_worker_survives_cancelled_review():
+    from services.genai_api.scheduler import ReviewScheduler
+
+    done = []
+
+    async def handler(item):
+        if item == "cancelled":
+            raise asyncio.CancelledError  # e.g. a shared LLM call was cancelled
+        done.append(item)
+
+    async def run():
+        sched = ReviewScheduler(handler, concurrency=2, max_queue=10)
+        sched.start()
+        for item in ("cancelled", "a", "b", "c"):
+            await sched.submit(item)
+        await sched.join()
+        alive = sched.alive()
+        await sched.stop()
+        return alive, sched.alive()
+
+    assert asyncio.run(run()) == (2, 0)
+    assert sorted(done) == ["a", "b", "c"]
+
+
+def test_rate_limiter_token_bucket():
+    from services.genai_api.scheduler import RateLimiter
+
+    now = [0.0]
+    limiter = RateLimiter("test", rpm=2, tpm=300, clock=lambda: now[0])
+    assert limiter.try_acquire(100) == 0
+    assert limiter.try_acquire(100) == 0
+    assert limiter.try_acquire(100) == 30.0  # out of requests: one refills every 30s
+    now[0] = 30.0
+    assert limiter.try_acquire(290) == 8.0  # request available, 40 tokens short
+    now[0] = 38.0
+    assert limiter.try_acquire(290) == 0
+
+
+def test_review_llm_timeout_degrades_to_mock():
+    from unittest.mock import patch
+    from services.genai_api import main
+
+    with (
+        patch.object(main, "llm", CountingLLM(delay=1.0)),
+        patch.object(main.settings, "LLM_TIMEOUT_S", 0.01),
+    ):
+        out = asyncio.run(main._complete("sys", "user"))
+    assert out.startswith("MOCK_LLM_RESPONSE")
+
+
+def test_mock_llm_stream_matches_complete():
+    from services.genai_api.llm import MockLLM, metered_stream
+
+    llm = MockLLM(token_delay_ms=1)
+
+    async def run():
+        full = await llm.complete("sys", "user prompt")
+        streamed = [t async for t in llm.stream("sys", "user prompt")]
+        capped = [t async for t in metered_stream(llm, "sys", "user prompt", max_tokens=3)]
+        return full, streamed, capped
+
+    full, streamed, capped = asyncio.run(run())
+    assert "".join(streamed) == full and len(streamed) > 3
+    assert capped == streamed[:3]
+
+
+def test_fit_context_keeps_most_relevant_hits():
+    from services.genai_api.llm import fit_context
+
+    hits = [("low.md", "x" * 400, 0.1), ("high.md", "y" * 400, 0.9), ("mid.md", "z" * 400, 0.5)]
+    kept = fit_context(hits, budget_tokens=150)
+    assert [h[0] for h in kept] == ["high.md", "mid.md"]
+    assert len(kept[1][1]) < 400  # second hit truncated to the remaining budget
+
+
+def test_review_streaming_response():
+    from unittest.mock import AsyncMock, patch
+    from fastapi.testclient import TestClient
+    from services.genai_api import main
+    from services.genai_api.llm import MockLLM
+
+    with (
+        patch.object(main, "llm", MockLLM()),
+        patch.object(main.rag, "query", return_value=[("risk_rules.md", "max 10 000", 0.8)]),
+        patch.object(main, "publish_audit", new=AsyncMock()) as audit,
+        patch.object(main, "publish", new=AsyncMock()),
+    ):
+        client = TestClient(main.app)
+        trade = {"workflow_id": "wf-1", "symbol": "AAPL", "side": "BUY", "qty": 10, "reason": "test"}
+        resp = client.post("/review?stream=true", json=trade)
+        # audit_logs.correlation_id is a UUID column: reject anything else up front
+        bad = client.post("/review", json={**trade, "correlation_id": "not-a-uuid"})
+    assert resp.status_code == 200
+    assert resp.text.startswith("MOCK_LLM_RESPONSE")
+    assert resp.headers["x-sources"] == "risk_rules.md"
+    assert str(uuid.UUID(resp.headers["x-correlation-id"])) == resp.headers["x-correlation-id"]
+    audit.assert_awaited_once()
+    assert bad.status_code == 422
+
+
+class JSONBatchLLM(LLM):
+    """Answers packed prompts with a JSON array, skipping workflow ids in ``skip``."""
+
+    provider = "test"
+    model = "json"
+
+    def __init__(self, skip=()):
+        self.calls = 0
+        self.skip = set(skip)
+
+    async def complete(self, system: str, user: str) -> str:
+        import json
+        import re
+
+        self.calls += 1
+        ids = re.findall(r"workflow_id: (\S+)", user)
+        return json.dumps([
+            {"workflow_id": wf, "summary": f"ok {wf}", "risk_notes": "none",
+             "recommendation": "approve", "sources": ["risk_rules.md"]}
+            for wf in ids if wf not in self.skip
+        ])
+
+
+def _batch_body():
+    trades = [("wf-1", "AAPL"), ("wf-2", "MSFT"), ("wf-3", "AAPL")]
+    return {"reviews": [
+        {"workflow_id": wf, "symbol": sym, "side": "BUY", "qty": 10, "reason": "rebalance"}
+        for wf, sym in trades
+    ]}
+
+
+def _post_batch(llm, body=None):
+    from unittest.mock import AsyncMock, patch
+    from fastapi.testclient import TestClient
+    from services.genai_api import main
+
+    with (
+        patch.object(main, "llm", llm),
+        patch.object(main.rag, "query", return_value=[("risk_rules.md", "max 10 000", 0.8)]) as rq,
+        patch.object(main, "publish_audit", new=AsyncMock()),
+        patch.object(main, "publish", new=AsyncMock()),
+    ):
+        resp = TestClient(main.app).post("/review/batch", json=body or _batch_body())
+    return resp, rq
+
+
+def test_review_batch_packs_reviews_in_one_call():
+    llm = JSONBatchLLM()
+    resp, rag_query = _post_batch(llm)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [r["workflow_id"] for r in body["results"]] == ["wf-1", "wf-2", "wf-3"]
+    assert all(r["mode"] == "batch" for r in body["results"])
+    assert body["results"][0]["sources"] == ["risk_rules.md"]
+    assert llm.calls == 1 and body["llm_calls"] == 1
+    assert rag_query.call_count == 2  # one retrieval per symbol
+
+
+def test_review_batch_falls_back_for_unparsed_items():
+    llm = JSONBatchLLM(skip={"wf-2"})
+    resp, _ = _post_batch(llm)
+    modes = {r["workflow_id"]: r["mode"] for r in resp.json()["results"]}
+    assert modes == {"wf-1": "batch", "wf-2": "individual", "wf-3": "batch"}
+    assert llm.calls == 2
+
+
+def test_review_batch_rejects_duplicate_workflows():
+    from fastapi.testclient import TestClient
+    from services.genai_api import main
+
+    body = _batch_body()
+    body["reviews"].append(dict(body["reviews"][0]))
+    resp = TestClient(main.app).post("/review/batch", json=body)
+    assert resp.status_code == 422
+    assert "duplicate workflow_id: wf-1" in resp.text
+
+
+def test_review_batch_fallback_runs_within_review_concurrency():
+    from unittest.mock import patch
+    from services.genai_api import main
+    from services.genai_api.scheduler import ReviewScheduler
+
+    active, peak = 0, 0
+
+    async def slow_review(req):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return {"correlation_id": "c", "sources": [], "review": "ok"}
+
+    body = {"reviews": [
+        {"workflow_id": f"wf-{i}", "symbol": "AAPL", "side": "BUY", "qty": 10, "reason": "r"}
+        for i in range(6)
+    ]}
+    with patch.object(main, "scheduler", ReviewScheduler(slow_review, concurrency=2)):
+        resp, _ = _post_batch(JSONBatchLLM(skip={f"wf-{i}" for i in range(6)}), body)
+    assert resp.status_code == 200
+    assert {r["mode"] for r in resp.json()["results"]} == {"individual"}
+    assert peak == 2
+
+
+def test_review_batch_mock_llm_answers_packs():
+    """The default provider answers packed prompts: no review falls back."""
+    from services.genai_api.llm import MockLLM
+
+    resp, _ = _post_batch(MockLLM())
+    assert resp.status_code == 200
+    body = resp.json()
+    assert {r["mode"] for r in body["results"]} == {"batch"}
+    assert body["llm_calls"] == 1
+    assert body["results"][0]["sources"] == ["risk_rules.md"]
+
+
+def test_pack_by_symbol_keeps_a_symbols_trades_together():
+    from services.genai_api.batch import pack_by_symbol
+
+    groups = [["a1", "a2"], ["b1", "b2", "b3"], ["c1"], ["d1", "d2", "d3", "d4", "d5"]]
+    assert pack_by_symbol(groups, 4) == [
+        ["a1", "a2"], ["b1", "b2", "b3", "c1"], ["d1", "d2", "d3", "d4"], ["d5"],
+    ]
+    assert pack_by_symbol([["a1"], ["b1"], ["c1"]], 8) == [["a1", "b1", "c1"]]
+
+
+def test_review_batch_reports_failed_reviews_per_item():
+    from unittest.mock import patch
+    from services.genai_api import main
+    from services.genai_api.scheduler import ReviewScheduler
+
+    async def flaky_review(req):
+        if req.workflow_id == "wf-2":
+            raise RuntimeError("provider down")
+        return {"correlation_id": "c", "sources": [], "review": "ok"}
+
+    with patch.object(main, "scheduler", ReviewScheduler(flaky_review, concurrency=2)):
+        resp, _ = _post_batch(JSONBatchLLM(skip={"wf-2", "wf-3"}))
+    assert resp.status_code == 200
+    results = {r["workflow_id"]: r for r in resp.json()["results"]}
+    assert results["wf-1"]["mode"] == "batch"
+    assert results["wf-3"]["review"] == "ok"
+    assert "provider down" in results["wf-2"]["error"]
+
+
+def test_parse_batch_response_rejects_garbage():
+    from services.genai_api.batch import parse_batch_response
+
+    assert parse_batch_response("MOCK_LLM_RESPONSE no json here", ["wf-1"]) == {}
+    assert parse_batch_response('[{"workflow_id": "wf-1"}]', ["wf-1"]) == {}
@@ -0,0 +1,65 @@
+"""Tests for the load generator's stand-ins and a short in-process run."""
+
+import asyncio
+import json
+
+from services.common import db
+from scripts.loadgen.main import parse_args, run
+from scripts.loadgen.report import compare
+from scripts.loadgen.standins import LocalKafka, LocalPostgres, installed
+
+
+def test_local_postgres_through_db_helpers():
+    pg = LocalPostgres(rtt_ms=0, connect_ms=0)
+    with installed(pg, LocalKafka(latency_ms=0)):
+        db.execute_values(
+            "INSERT INTO workflows(workflow_id, status, payload, correlation_id) VALUES %s",
+            [("w1", "REQUESTED", json.dumps({"symbol": "AAPL"}), "c1"),
+             ("w2", "REQUESTED", "{}", "c2")],
+        )
+        db.execute_transaction([
+            ("UPDATE workflows SET status = %s, decision = %s, updated_at = now() "
+             "WHERE workflow_id = %s", ("APPROVED", "APPROVE", "w1")),
+            ("UPDATE workflows AS w SET status = v.status, updated_at = now() "
+             "FROM (VALUES (%s::uuid, %s)) AS v(workflow_id, status) "
+             "WHERE w.workflow_id = v.workflow_id", ["w2", "DENY"]),
+            ("INSERT INTO audit_logs(kind, ref_id, data, hash, correlation_id) "
+             "VALUES (%s,%s,%s,%s,%s)", ("k", "w1", '{"a": 1}', "h", "c1")),
+        ])
+        row = db.fetchone("SELECT workflow_id,status,payload FROM workflows WHERE workflow_id=%s",
+                          ("w1",))
+        other = db.fetchone("SELECT status FROM workflows WHERE workflow_id = %s", ("w2",))
+        audit = db.fetchall("SELECT audit_id,kind FROM audit_logs ORDER BY audit_id DESC LIMIT %s",
+                            (5,))
+        missing = asyncio.run(db.afetchone("SELECT status FROM workflows WHERE workflow_id=%s",
+                                           ("nope",)))
+
+    assert row == {"workflow_id": "w1", "status": "APPROVED", "payload": {"symbol": "AAPL"}}
+    assert other == {"status": "DENY"}
+    assert audit == [{"audit_id": 1, "kind": "k"}]
+    assert missing is None
+    # execute_values and the transaction are one round trip each
+    assert pg.round_trips == 6 and pg.statements["UPDATE"] == 2
+
+
+def test_loadgen_runs_every_scenario_end_to_end():
+    args = parse_args(["--requests", "12", "--concurrency", "4", "--warmup", "0",
+                       "--db-latency-ms", "0", "--db-connect-ms", "0",
+                       "--kafka-latency-ms", "0", "--rag-latency-ms", "0"])
+    report = asyncio.run(run(args))
+
+    assert report["failures"] == {}
+    assert set(report["scenarios"]) == {"workflow", "agent", "market", "mcp"}
+    assert sum(s["count"] for s in report["scenarios"].values()) == 12
+    assert all(s["errors"] == 0 for s in report["steps"].values())
+    # Spans from the services and from the workers fed by the local broker
+    assert "db.transaction" in report["stages"]
+    assert "kafka.consume workflow.approved" in report["stages"]
+    assert report["stand_ins"]["kafka"]["messages"]["workflow.requested"] >= 1
+    assert compare(report, report) == []
+    slower = json.loads(json.dumps(report))
+    slower["scenarios"]["agent"]["latency_ms"]["p99"] *= 2
+    assert compare(slower, report) == [
+        f"scenarios/agent p99 {report['scenarios']['agent']['latency_ms']['p99']:.2f} -> "
+        f"{slower['scenarios']['agent']['latency_ms']['p99']:.2f} ms (+100%)"
+    ]
@@ -0,0 +1,337 @@
+"""Smoke tests for the MCP Server (unit-level, no Docker needed)."""
+
+from unittest.mock import patch
+
+
+def test_call_batch_orders_results_and_bulk_audits():
+    """POST /call/batch returns results in order, errors per call, one audit INSERT."""
+    import asyncio
+    from fastapi.testclient import TestClient
+    from services.common.audit import BufferedAuditWriter
+    from services.mcp_server.main import app
+
+    audits = []
+    writer = BufferedAuditWriter(max_wait_ms=60_000, writer=lambda rows: audits.append(rows))
+
+    async def fake_fetchone(sql, params=None):
+        return {"order_id": "ord-1"}
+
+    with (
+        patch("services.mcp_server.main._audit", writer),
+        patch("services.mcp_server.tools.afetchone", fake_fetchone),
+    ):
+        resp = TestClient(app).post("/call/batch", json={
+            "correlation_id": "corr-1",
+            "workflow_id": "wf-1",
+            "calls": [
+                {"tool": "market.get_last_price", "arguments": {"symbol": "aapl"}},
+                {"tool": "risk.check_trade",
+                 "arguments": {"symbol": "AAPL", "side": "BUY", "qty": 20000}},
+                {"tool": "oms.place_order", "arguments": {"symbol": "AAPL", "side": "BUY"}},
+                {"tool": "nope.tool", "arguments": {}},
+            ],
+        })
+        asyncio.run(writer.flush())
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["tool"] for r in results] == [
+        "market.get_last_price", "risk.check_trade", "oms.place_order", "nope.tool",
+    ]
+    assert results[0]["result"]["symbol"] == "AAPL"
+    assert results[1]["result"]["passed"] is False
+    assert "error" in results[2]["result"]  # missing qty
+    assert "unknown tool" in results[3]["result"]["error"]
+    assert len(audits) == 1 and len(audits[0]) == 4
+    assert all(r["correlation_id"] == "corr-1" for r in results)
+    assert [r["audit_hash"] for r in results] == [row[3] for row in audits[0]]
+
+
+def test_call_batch_side_effect_tool_is_a_barrier():
+    import asyncio
+    from services.mcp_server import main
+
+    order = []
+
+    async def fake_execute(tool, arguments):
+        order.append(("start", tool))
+        await asyncio.sleep(0.01)
+        order.append(("end", tool))
+        return {"ok": tool}
+
+    calls = [
+        main.ToolCallRequest(tool=t)
+        for t in ("market.get_last_price", "oms.place_order", "db.list_audit")
+    ]
+    with patch.object(main, "execute_tool", fake_execute):
+        results = asyncio.run(main._run_calls(calls))
+
+    assert [r["ok"] for r in results] == [c.tool for c in calls]
+    assert order == [
+        ("start", "market.get_last_price"), ("end", "market.get_last_price"),
+        ("start", "oms.place_order"), ("end", "oms.place_order"),
+        ("start", "db.list_audit"), ("end", "db.list_audit"),
+    ]
+
+
+def test_read_only_tool_runs_inline_without_db():
+    """market.get_last_price is a plain handler: no thread hop, no database."""
+    import asyncio
+    import time
+    from services.mcp_server.tools import execute_tool
+
+    async def run():
+        await execute_tool("market.get_last_price", {"symbol": "AAPL"})  # warm up
+        start = time.perf_counter()
+        for _ in range(1000):
+            out = await execute_tool("market.get_last_price", {"symbol": "AAPL"})
+        return out, (time.perf_counter() - start) / 1000
+
+    with patch("services.mcp_server.tools.afetchone") as db:
+        out, per_call = asyncio.run(run())
+    assert out["symbol"] == "AAPL"
+    db.assert_not_called()
+    assert per_call < 0.001
+
+
+def test_buffered_audit_writer_batches_and_keeps_rows_on_failure():
+    import asyncio
+    from services.common.audit import BufferedAuditWriter
+
+    written = []
+    fail = [True]
+
+    def writer(rows):
+        if fail[0]:
+            raise RuntimeError("db down")
+        written.append(list(rows))
+
+    buf = BufferedAuditWriter(max_batch=2, max_wait_ms=60_000, writer=writer)
+
+    async def run():
+        hashes = [await buf.submit("k", str(i), {"i": i}, "corr") for i in range(3)]
+        assert buf._flushes  # the flushes started at max_batch are held until done
+        await asyncio.sleep(0.05)
+        assert not buf._flushes
+        try:
+            await buf.flush()
+        except RuntimeError:
+            pass
+        assert buf.pending == 3
+        fail[0] = False
+        await buf.stop()
+        return hashes
+
+    hashes = asyncio.run(run())
+    assert [len(b) for b in written] == [2, 1]
+    assert [row[3] for batch in written for row in batch] == hashes
+
+
+def test_tool_cache_hits_and_invalidation():
+    """db.get_workflow is cached per workflow_id; oms.place_order invalidates it."""
+    import asyncio
+    from services.mcp_server import tools
+
+    queries = []
+
+    async def fake_fetchone(sql, params=None):
+        if "FROM workflows" in sql:
+            queries.append(params)
+        return {"workflow_id": params[0], "status": "APPROVE", "payload": {}}
+
+    async def run():
+        tools.invalidate("db.get_workflow")
+        await tools.execute_tool("db.get_workflow", {"workflow_id": "wf-1"})
+        await tools.execute_tool("db.get_workflow", {"workflow_id": "wf-1"})
+        await tools.execute_tool("db.get_workflow", {"workflow_id": "wf-2"})
+        await tools.execute_tool("oms.place_order", {"symbol": "AAPL", "side": "BUY", "qty": 1})
+        await tools.execute_tool("db.get_workflow", {"workflow_id": "wf-1"})
+
+    with patch("services.mcp_server.tools.afetchone", fake_fetchone):
+        asyncio.run(run())
+
+    assert queries == [("wf-1",), ("wf-2",), ("wf-1",)]
+    assert tools.cache_stats()["db.get_workflow"]["hits"] >= 1
+
+
+def test_price_cache_ignores_symbol_case_and_returns_copies():
+    import asyncio
+    from services.mcp_server import tools
+
+    async def run():
+        tools.invalidate("market.get_last_price")
+        first = await tools.execute_tool("market.get_last_price", {"symbol": "msft"})
+        first["last"] = -1.0
+        second = await tools.execute_tool("market.get_last_price", {"symbol": "MSFT"})
+        return first, second
+
+    misses = tools.cache_stats()["market.get_last_price"]["misses"]
+    first, second = asyncio.run(run())
+    assert second["symbol"] == "MSFT" and second["last"] > 0
+    assert second is not first
+    assert tools.cache_stats()["market.get_last_price"]["misses"] == misses + 1
+
+
+def test_arguments_validated_and_coerced_before_execution():
+    import asyncio
+    from services.mcp_server import tools
+
+    with patch("services.mcp_server.tools.afetchone") as db:
+        bad = asyncio.run(tools.execute_tool(
+            "oms.place_order", {"symbol": 1, "side": "HOLD", "extra": True},
+        ))
+        db.assert_not_called()
+    assert bad["error"] == "invalid arguments"
+    assert sorted(bad["details"]) == [
+        "extra: unknown argument",
+        "qty: required",
+        "side: expected one of ['BUY', 'SELL']",
+        "symbol: expected a string",
+    ]
+
+    ok = asyncio.run(tools.execute_tool(
+        "risk.check_trade", {"symbol": "AAPL", "side": "sell", "qty": "10"},
+    ))
+    assert ok["side"] == "SELL" and ok["qty"] == 10.0 and ok["passed"] is True
+
+    validate = tools._validators["db.list_audit"]
+    assert validate({}) == {"limit": 20}
+    assert validate({"limit": 5.0}) == {"limit": 5}
+    for value in (True, 2.5, "x"):
+        try:
+            validate({"limit": value})
+        except ValueError as e:
+            assert "limit" in str(e)
+        else:
+            raise AssertionError(value)
+
+
+def test_quantity_must_be_finite_and_positive():
+    import asyncio
+    from services.mcp_server import tools
+
+    for tool in ("risk.check_trade", "oms.place_order"):
+        validate = tools._validators[tool]
+        for qty in ("nan", "inf", "-inf", float("nan"), float("inf"), 0, "0", -5):
+            try:
+                validate({"symbol": "AAPL", "side": "BUY", "qty": qty})
+            except ValueError as e:
+                assert str(e).startswith("qty: "), (tool, qty, e)
+            else:
+                raise AssertionError((tool, qty))
+        assert validate({"symbol": "AAPL", "side": "BUY", "qty": "0.5"})["qty"] == 0.5
+
+    with patch("services.mcp_server.tools.afetchone") as db:
+        res = asyncio.run(tools.execute_tool(
+            "oms.place_order", {"symbol": "AAPL", "side": "BUY", "qty": "nan"},
+        ))
+        db.assert_not_called()
+    assert res["details"] == ["qty: expected a finite number"]
+
+
+def test_place_order_is_idempotent_per_workflow():
+    """A second oms.place_order for the same workflow returns the first order."""
+    import asyncio
+    from decimal import Decimal
+    from services.mcp_server import tools
+
+    orders = {}
+
+    async def fake_fetchone(sql, params=None):
+        if sql.startswith("INSERT"):
+            if params[1] in orders:
+                return None  # ON CONFLICT (workflow_id) DO NOTHING
+            orders[params[1]] = {
+                "order_id": params[0], "status": params[2], "symbol": params[3],
+                "side": params[4], "qty": Decimal(str(params[5])),
+                "fill_price": Decimal(str(params[6])),
+            }
+            return {"order_id": params[0]}
+        return orders[params[0]]
+
+    args = {"symbol": "aapl", "side": "BUY", "qty": 10, "workflow_id": "wf-1"}
+
+    async def run():
+        first = await tools.execute_tool("oms.place_order", args)
+        again = await tools.execute_tool("oms.place_order", args)
+        other = await tools.execute_tool("oms.place_order", {**args, "workflow_id": "wf-2"})
+        adhoc = await tools.execute_tool(
+            "oms.place_order", {"symbol": "AAPL", "side": "SELL", "qty": 1},
+        )
+        return first, again, other, adhoc
+
+    with patch("services.mcp_server.tools.afetchone", fake_fetchone):
+        first, again, other, adhoc = asyncio.run(run())
+
+    assert again == first and again["qty"] == 10.0 and again["symbol"] == "AAPL"
+    assert len({first["order_id"], other["order_id"], adhoc["order_id"]}) == 3
+    assert len(orders) == 3
+
+
+def test_tools_exports_json_schema():
+    from fastapi.testclient import TestClient
+    from services.mcp_server.main import app
+
+    tools = {t["name"]: t for t in TestClient(app).get("/tools").json()["tools"]}
+    schema = tools["oms.place_order"]["input_schema"]
+    assert schema["type"] == "object" and schema["additionalProperties"] is False
+    assert schema["required"] == ["symbol", "side", "qty"]
+    assert schema["properties"]["side"] == {"type": "string", "enum": ["BUY", "SELL"]}
+    assert schema["properties"]["qty"] == {"type": "number", "exclusiveMinimum": 0}
+    assert tools["db.list_audit"]["input_schema"]["properties"]["limit"]["default"] == 20
+    assert tools["db.list_audit"]["input_schema"]["required"] == []
+
+
+def test_db_tool_concurrency_is_limited_per_tool():
+    import asyncio
+    from services.mcp_server import tools
+
+    active, peak = [0], [0]
+
+    async def slow_list_audit(limit=20):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return {"items": [], "count": 0}
+
+    async def run():
+        tools.invalidate("db.list_audit")
+        # Distinct limits: no cache hits
+        await asyncio.gather(*(
+            tools.execute_tool("db.list_audit", {"limit": i}) for i in range(1, 13)
+        ))
+
+    entry = dict(tools.TOOL_REGISTRY["db.list_audit"], handler=slow_list_audit)
+    with patch.dict(tools.TOOL_REGISTRY, {"db.list_audit": entry}):
+        asyncio.run(run())
+        assert tools.concurrency_limit("db.list_audit") == 4
+    assert peak[0] == 4
+    assert tools.concurrency_limit("market.get_last_price") is None
+
+
+def test_state_reports_per_tool_stats():
+    from fastapi.testclient import TestClient
+    from services.common.audit import BufferedAuditWriter
+    from services.mcp_server import main
+
+    client = TestClient(main.app)
+    writer = BufferedAuditWriter(max_wait_ms=60_000, writer=lambda rows: None)
+    with (
+        patch.object(main, "_state", main.MCPState()),
+        patch.object(main, "_audit", writer),
+    ):
+        for _ in range(3):
+            client.post("/call", json={"tool": "market.get_last_price",
+                                       "arguments": {"symbol": "AAPL"}})
+        client.post("/call", json={"tool": "risk.check_trade", "arguments": {}})
+        client.post("/call", json={"tool": "nope.tool"})
+        state = client.get("/state").json()
+
+    assert state["total_calls"] == 5
+    price = state["tools"]["market.get_last_price"]
+    assert price["calls"] == 3 and price["errors"] == 0 and price["in_flight"] == 0
+    assert 0 <= price["p50_ms"] <= price["p99_ms"]
+    assert price["max_concurrency"] is None
+    assert state["tools"]["risk.check_trade"]["errors"] == 1
+    assert "nope.tool" not in state["tools"]
@@ -0,0 +1,47 @@
+"""Smoke test of the microbenchmark suite and its baseline check."""
+
+import json
+
+from scripts import microbench
+
+
+def test_every_case_runs_and_baseline_is_current():
+    report = microbench.run_suite(min_time=0.001, repeats=1)
+    measured = set(report["results"]) | set(report["skipped"])
+    assert measured == {c.name for c in microbench.CASES}
+    assert report["results"][microbench.CALIBRATION]["relative"] == 1.0
+    with open(microbench.BASELINE, encoding="utf-8") as f:
+        baseline = json.load(f)
+    # Every case the baseline knows is still defined, and it was taken with all of them
+    assert set(baseline["results"]) <= measured
+    assert baseline["skipped"] == {}
+
+
+def test_compare_flags_relative_slowdowns_only():
+    baseline = {"results": {
+        microbench.CALIBRATION: {"relative": 1.0},
+        "a": {"relative": 0.10},
+        "b": {"relative": 2.00},
+    }}
+    report = {"results": {
+        microbench.CALIBRATION: {"relative": 1.0},
+        "a": {"relative": 0.14},  # +40%
+        "b": {"relative": 2.20},  # +10%, within tolerance
+        "new": {"relative": 5.0},  # no baseline yet
+    }}
+    assert microbench.compare(report, baseline, 0.25) == [
+        "a: 0.100 -> 0.140 x calibration (+40%)"
+    ]
+
+
+def test_every_event_topic_has_a_validation_case():
+    from services.common.schemas import SchemaRegistry
+
+    names = {c.name for c in microbench.CASES}
+    assert {f"event.validate {t}" for t in SchemaRegistry().topics} <= names
+
+
+def test_compare_flags_encoded_size_growth():
+    baseline = {"results": {"enc": {"relative": 0.1, "bytes": 200}}}
+    report = {"results": {"enc": {"relative": 0.1, "bytes": 201}}}
+    assert microbench.compare(report, baseline, 0.25) == ["enc: 200 -> 201 bytes"]
@@ -21,6 +21,71 @@ def test_chunk_text_short():
     assert chunks[0] == "hello world"
 
 
+def test_chunk_text_respects_sections():
+    """Chunks never span two markdown sections and carry their heading path."""
+    from services.rag_api.main import _chunk_text
+
+    text = (
+        "# Policies\n\n## Limits\n\n- max 10,000 units\n- max $1M notional\n\n"
+        "## Compliance\n\nNo trading during blackout periods.\n"
+    )
+    chunks = _chunk_text(text, max_tokens=256)
+    assert len(chunks) == 2
+    assert chunks[0].startswith("Policies > Limits")
+    assert "max $1M notional" in chunks[0] and "blackout" not in chunks[0]
+    assert chunks[1].startswith("Policies > Compliance")
+
+
+def test_chunk_markdown_overlap_and_budget():
+    """Oversized sections are split within budget, consecutive chunks overlap."""
+    from services.rag_api.chunking import chunk_markdown
+
+    lines = iter(["# Rules\n", "\n"] + [f"- rule number {i}\n" for i in range(40)])
+    chunks = list(chunk_markdown(lines, max_tokens=32, overlap=8))
+    assert len(chunks) > 1
+    assert all(c.tokens <= 32 for c in chunks)
+    last_line = chunks[0].text.splitlines()[-1]
+    assert last_line in chunks[1].text
+
+
+def test_chunk_markdown_splits_code_fences_on_lines():
+    """An oversized fenced block is split between lines, keeping its line breaks."""
+    from services.rag_api.chunking import chunk_markdown
+
+    code = [f"x{i} = compute({i}, limit)\n" for i in range(30)]
+    lines = iter(["# Example\n", "\n", "```python\n", *code, "```\n"])
+    chunks = list(chunk_markdown(lines, max_tokens=24))
+    assert len(chunks) > 1
+    assert all(c.tokens <= 24 for c in chunks)
+    body = [line for c in chunks for line in c.text.splitlines()[2:]]
+    assert body == ["```python", *(line.rstrip("\n") for line in code), "```"]
+
+
+def test_ingest_deletes_stale_chunks_of_a_file(tmp_path):
+    """Re-ingesting a file removes its old points before upserting the new ones."""
+    from services.rag_api.main import IngestRequest, _ingest_directory
+
+    (tmp_path / "rules.md").write_text("# Rules\n\nmax 10 000 units\n", encoding="utf-8")
+    store = MagicMock(max_seq_length=None, count_tokens=lambda t: len(t.split()))
+    calls = []
+    store.delete_source.side_effect = lambda source: calls.append(("delete", source))
+    store.upsert_many.side_effect = lambda docs: calls.append(("upsert", len(docs)))
+
+    resp = _ingest_directory(store, tmp_path, IngestRequest(directory=str(tmp_path)))
+    assert resp.files == ["rules.md"]
+    assert calls == [("delete", "rules.md"), ("upsert", 1)]
+
+
+def test_vectorstore_delete_source_filters_on_source():
+    from services.rag_api.vectorstore import FieldCondition
+
+    store = _store_with_mocks()
+    store.delete_source("rules.md")
+    selector = store._client.delete.call_args.kwargs["points_selector"]
+    assert selector.filter.must == [FieldCondition(key="source", match={"value": "rules.md"})]
+    assert store.cache_stats()["collection_version"] == 1
+
+
 def test_vectorstore_fallback_mode():
     """VectorStore in fallback mode (no qdrant, no sentence-transformers) returns empty."""
     from services.rag_api.vectorstore import VectorStore
@@ -59,3 +124,124 @@ def test_health_endpoint():
     resp = client.get("/health")
     assert resp.status_code == 200
     assert resp.json()["status"] == "ok"
+    assert client.get("/health/ready").status_code == 503
+
+
+def _store_with_mocks():
+    """Real VectorStore (caches included) with mocked Qdrant client and model."""
+    import numpy as np
+    from services.rag_api.vectorstore import VectorStore
+
+    with (
+        patch("services.rag_api.vectorstore._QDRANT_AVAILABLE", False),
+        patch("services.rag_api.vectorstore._EMBEDDINGS_AVAILABLE", False),
+    ):
+        store = VectorStore()
+    store._model = MagicMock()
+    store._model.encode.side_effect = lambda texts: np.ones((len(texts), 4), dtype=np.float32)
+    store._client = MagicMock()
+    store._client.search.return_value = [
+        MagicMock(payload={"source": "risk_rules.md", "text": "max exposure"}, score=0.9)
+    ]
+    return store
+
+
+def test_vectorstore_search_is_cached():
+    store = _store_with_mocks()
+    first = store.search("max  exposure AAPL", top_k=3)
+    second = store.search(" max exposure AAPL ", top_k=3)
+    assert first == second
+    assert store._model.encode.call_count == 1
+    assert store._client.search.call_count == 1
+
+    # A different top_k reuses the embedding but needs a new search
+    store.search("max exposure AAPL", top_k=5)
+    assert store._model.encode.call_count == 1
+    assert store._client.search.call_count == 2
+
+
+def test_vectorstore_upsert_invalidates_results():
+    store = _store_with_mocks()
+    store.search("max exposure", top_k=3)
+    with patch("services.rag_api.vectorstore.PointStruct", MagicMock(), create=True):
+        store.upsert("doc-1", "new rule", {"source": "new.md"})
+    store.search("max exposure", top_k=3)
+    assert store._client.search.call_count == 2
+    assert store.cache_stats()["collection_version"] == 1
+
+
+def test_search_many_batches_encode_and_search():
+    """Several uncached queries cost one encode call and one Qdrant batch call."""
+    store = _store_with_mocks()
+    store.search("cached question", top_k=3)
+    hit = MagicMock(payload={"source": "a.md", "text": "t"}, score=0.5)
+    store._client.search_batch.return_value = [[hit], [hit]]
+    with patch("services.rag_api.vectorstore.SearchRequest", MagicMock(), create=True):
+        out = store.search_many([("q1", 3), ("cached question", 3), ("q2", 2)])
+    assert len(out) == 3 and out[0][0]["source"] == "a.md"
+    assert store._model.encode.call_count == 2  # first search + one batch
+    store._client.search_batch.assert_called_once()
+
+
+def test_microbatcher_coalesces_concurrent_calls():
+    import asyncio
+    from services.rag_api.batcher import MicroBatcher
+
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    async def run():
+        batcher = MicroBatcher(double, max_batch=8, max_wait_ms=5)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    assert asyncio.run(run()) == [i * 2 for i in range(10)]
+    assert [len(c) for c in calls] == [8, 2]
+
+
+def test_query_not_ready_returns_503():
+    from fastapi.testclient import TestClient
+    from services.rag_api.main import app
+
+    with patch("services.rag_api.main._ready", False):
+        resp = TestClient(app).post("/query", json={"question": "max exposure"})
+    assert resp.status_code == 503
+
+
+def test_warm_up_retries_until_qdrant_is_ready():
+    """Start-up keeps retrying with backoff; the model is loaded once; warm-up searches a real query."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    import numpy as np
+    from services.rag_api import main, vectorstore
+
+    with patch.object(vectorstore, "_EMBEDDINGS_AVAILABLE", False), \
+            patch.object(vectorstore, "_QDRANT_AVAILABLE", False):
+        store = vectorstore.VectorStore(collection="warm")
+    store._model = MagicMock()
+    store._model.encode.return_value = np.array([[0.6, 0.8]], dtype=np.float32)
+    store._client = MagicMock()
+    store._client.get_collections.side_effect = [
+        ConnectionError("qdrant down"), ConnectionError("qdrant down"), MagicMock(collections=[]),
+    ]
+    built = MagicMock(return_value=store)
+
+    with (
+        patch.object(main, "VectorStore", built),
+        patch.object(main, "_pool", None),  # default executor
+        patch.object(main, "_ready", False),
+        patch.object(main, "_store", None),
+        patch.object(main, "_batcher", None),
+        patch("services.rag_api.main.asyncio.sleep", new=AsyncMock()) as sleep,
+    ):
+        asyncio.run(main._warm_up())
+        assert main._ready and main._store is store
+
+    built.assert_called_once()
+    assert [c.args[0] for c in sleep.await_args_list] == [1.0, 2.0]
+    query = store._model.encode.call_args.args[0][0]
+    assert "exposure" in query
+    vector = store._client.search.call_args.kwargs["query_vector"]
+    assert vector == store._model.encode.return_value[0].tolist()  # not a zero vector